@@ -0,0 +1,215 @@
+"""
+投资组合交易分析
+把交易记录转成列式NumPy数组，向量化计算已实现盈亏、胜率、最大盈亏和换手；
+按股票回放FIFO批次得到剩余持仓成本，结合当前价格得到未实现盈亏
+"""
+
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+CACHE_SIZE = 32
+
+
+def transaction_columns(transactions):
+    """交易记录 -> 列式数组（按日期稳定排序，日期相同保持原顺序）"""
+    count = len(transactions)
+    tx_type = np.array([str(t.get('type', '')) for t in transactions], dtype=object)
+    symbol = np.array([str(t.get('stockSymbol') or '').upper() for t in transactions], dtype=object)
+    dates = np.array([str(t.get('date') or '')[:10] for t in transactions], dtype=object)
+
+    def numeric(field):
+        return np.fromiter((_to_float(t.get(field)) for t in transactions), dtype=float, count=count)
+
+    shares = numeric('shares')
+    price = numeric('price')
+    value = numeric('totalValue')
+    value = np.where(np.isnan(value), shares * price, value)
+
+    order = np.argsort(dates, kind='stable')
+    columns = {
+        'type': tx_type,
+        'symbol': symbol,
+        'date': dates,
+        'shares': np.nan_to_num(shares),
+        'price': np.nan_to_num(price),
+        'fee': np.nan_to_num(numeric('totalFee')),
+        'value': np.nan_to_num(value),
+        'realized': np.nan_to_num(numeric('realizedProfit')),
+    }
+    return {name: column[order] for name, column in columns.items()}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def fifo_positions(columns):
+    """
+    按股票回放买卖，先买入的批次先卖出
+
+    返回 {symbol: {'shares', 'cost_basis', 'fifo_realized'}} 和每笔交易后的总持仓成本
+    （买入成本含手续费，卖出收入扣除手续费）
+    """
+    lots = {}
+    positions = {}
+    open_cost = np.zeros(len(columns['type']))
+    total_cost = 0.0
+
+    for i, (tx_type, symbol) in enumerate(zip(columns['type'], columns['symbol'])):
+        if tx_type in ('buy', 'sell') and symbol:
+            queue = lots.setdefault(symbol, deque())
+            position = positions.setdefault(symbol, {'fifo_realized': 0.0})
+            shares = columns['shares'][i]
+
+            if tx_type == 'buy' and shares > 0:
+                cost = columns['value'][i] + columns['fee'][i]
+                queue.append([shares, cost / shares])
+                total_cost += cost
+            elif tx_type == 'sell' and shares > 0:
+                remaining = shares
+                consumed = 0.0
+                while remaining > 1e-9 and queue:
+                    lot = queue[0]
+                    take = min(lot[0], remaining)
+                    consumed += take * lot[1]
+                    lot[0] -= take
+                    remaining -= take
+                    if lot[0] <= 1e-9:
+                        queue.popleft()
+                position['fifo_realized'] += columns['value'][i] - columns['fee'][i] - consumed
+                total_cost -= consumed
+
+        open_cost[i] = total_cost
+
+    for symbol, queue in lots.items():
+        positions[symbol]['shares'] = sum(lot[0] for lot in queue)
+        positions[symbol]['cost_basis'] = sum(lot[0] * lot[1] for lot in queue)
+
+    return positions, open_cost
+
+
+def compute_analytics(transactions):
+    """只依赖交易记录的统计（可按文档版本缓存）"""
+    columns = transaction_columns(transactions)
+    tx_type = columns['type']
+
+    is_buy = tx_type == 'buy'
+    is_sell = tx_type == 'sell'
+    is_stock = is_buy | is_sell
+    sell_profit = columns['realized'][is_sell]
+
+    total_bought = float(columns['value'][is_buy].sum())
+    total_sold = float(columns['value'][is_sell].sum())
+
+    positions, open_cost = fifo_positions(columns)
+    average_cost = float(open_cost[is_stock].mean()) if is_stock.any() else 0.0
+
+    # 按股票分组求和（bincount 一次完成，不对每只股票重新扫描整张表）
+    names, codes = np.unique(columns['symbol'], return_inverse=True)
+    size = len(names)
+
+    def group_sum(weights, mask):
+        return np.bincount(codes, weights=np.where(mask, weights, 0.0), minlength=size)
+
+    realized_by = group_sum(columns['realized'], is_sell)
+    bought_by = group_sum(columns['value'], is_buy)
+    sold_by = group_sum(columns['value'], is_sell)
+    trades_by = np.bincount(codes, weights=is_stock, minlength=size)
+    index = {name: i for i, name in enumerate(names)}
+
+    by_symbol = {}
+    for symbol, position in positions.items():
+        i = index[symbol]
+        shares = position['shares']
+        by_symbol[symbol] = {
+            'shares': round(shares, 6),
+            'cost_basis': round(position['cost_basis'], 2),
+            'avg_cost': round(position['cost_basis'] / shares, 4) if shares > 1e-9 else None,
+            'realized_profit': round(float(realized_by[i]), 2),
+            'fifo_realized_profit': round(position['fifo_realized'], 2),
+            'trades': int(trades_by[i]),
+            'bought': round(float(bought_by[i]), 2),
+            'sold': round(float(sold_by[i]), 2)
+        }
+
+    return {
+        'realized_profit': round(float(sell_profit.sum()), 2),
+        'fifo_realized_profit': round(sum(p['fifo_realized'] for p in positions.values()), 2),
+        'total_fees': round(float(columns['fee'].sum()), 2),
+        'transaction_count': int(is_stock.sum()),
+        'sell_count': int(is_sell.sum()),
+        'win_rate': round(float((sell_profit > 0).mean() * 100), 2) if sell_profit.size else 0.0,
+        'max_profit': round(float(sell_profit.max(initial=0.0)), 2),
+        'max_loss': round(float(sell_profit.min(initial=0.0)), 2),
+        'total_bought': round(total_bought, 2),
+        'total_sold': round(total_sold, 2),
+        'turnover': round(total_bought + total_sold, 2),
+        # 换手率：买卖中较小的一边 / 交易期间的平均持仓成本
+        'turnover_ratio': round(min(total_bought, total_sold) / average_cost, 4) if average_cost > 0 else 0.0,
+        'symbols': by_symbol
+    }
+
+
+def with_market_prices(analytics, prices):
+    """在缓存的统计结果上叠加当前价格，计算市值和未实现盈亏（不修改原结果）"""
+    result = dict(analytics)
+    symbols = {}
+    market_value = 0.0
+    unrealized = 0.0
+    priced = True
+
+    for symbol, position in analytics['symbols'].items():
+        position = dict(position)
+        price = prices.get(symbol)
+        if position['shares'] > 1e-9:
+            if price is None:
+                priced = False
+                position.update(price=None, market_value=None, unrealized_profit=None)
+            else:
+                value = position['shares'] * price
+                position.update(
+                    price=price,
+                    market_value=round(value, 2),
+                    unrealized_profit=round(value - position['cost_basis'], 2)
+                )
+                market_value += value
+                unrealized += value - position['cost_basis']
+        symbols[symbol] = position
+
+    result.update(
+        symbols=symbols,
+        market_value=round(market_value, 2),
+        unrealized_profit=round(unrealized, 2),
+        # 有持仓没取到价格时，合计值不完整
+        prices_complete=priced
+    )
+    return result
+
+
+class AnalyticsCache:
+    """按 (用户, 文档版本) 缓存统计结果"""
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version_key):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] == version_key:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        return None
+
+    def put(self, user_id, version_key, analytics):
+        with self._lock:
+            self._entries[user_id] = (version_key, analytics)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
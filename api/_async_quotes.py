@@ -0,0 +1,93 @@
+"""
+异步价格服务 - 并发获取多只股票/多个接口的上游数据
+上游调用（yfinance）是阻塞的，放到线程中执行；并发数由信号量限制，
+同一股票同时只有一个上游请求在执行（single-flight），其余请求等待同一结果
+"""
+
+import asyncio
+
+from _quote_cache import QuoteCache
+from _upstream import fetch_quote
+from _scheduler import REFRESH, current_priority
+
+MAX_CONCURRENCY = 8
+
+
+class SingleFlight:
+    """同一key同时只执行一次，其余调用方等待同一个结果"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, make_coro):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coro())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 某个调用方被取消时不影响共享的上游请求
+        return await asyncio.shield(task)
+
+    def __len__(self):
+        return len(self._inflight)
+
+
+class AsyncQuoteService:
+    """报价缓存 + 有上限的并发上游请求 + single-flight"""
+
+    def __init__(self, cache=None, fetch=fetch_quote, max_concurrency=MAX_CONCURRENCY):
+        self.cache = cache or QuoteCache()
+        self.fetch = fetch
+        self.flight = SingleFlight()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._background = set()
+
+    async def run_blocking(self, fn, *args):
+        """在线程中执行阻塞的上游调用，同时执行的数量受信号量限制"""
+        async with self._semaphore:
+            return await asyncio.to_thread(fn, *args)
+
+    async def run_once(self, key, fn, *args):
+        """相同key的调用合并为一次 run_blocking"""
+        return await self.flight.do(key, lambda: self.run_blocking(fn, *args))
+
+    async def fetch_one(self, symbol):
+        try:
+            return await self.run_once(('quote', symbol), self.fetch, symbol)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'获取股价失败: {str(e)}'
+            }
+
+    async def fetch_many(self, symbols):
+        """并发获取多只股票报价，结果写入缓存"""
+        results = await asyncio.gather(*(self.fetch_one(s) for s in symbols))
+        quotes = dict(zip(symbols, results))
+        await asyncio.to_thread(self.cache.put_many, quotes)
+        return quotes
+
+    async def refresh(self, symbols):
+        """后台刷新过期报价（任务有独立的上下文，优先级设置只影响本任务）"""
+        current_priority.set(REFRESH)
+        await self.fetch_many(symbols)
+
+    async def get_many(self, symbols):
+        """
+        批量获取报价：新鲜缓存直接返回；过期缓存先返回旧值并在后台刷新；
+        其余并发向上游获取
+        """
+        quotes, stale, missing = await asyncio.to_thread(self.cache.lookup, symbols)
+
+        if stale:
+            task = asyncio.ensure_future(self.refresh(stale))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        if missing:
+            quotes.update(await self.fetch_many(missing))
+
+        return quotes
+
+    async def get(self, symbol):
+        return (await self.get_many([symbol]))[symbol]
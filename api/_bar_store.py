@@ -0,0 +1,246 @@
+"""
+日线数据存储 - 按股票代码持久化OHLCV日线
+只向上游请求本地缺失的日期区间，再与已存数据合并；
+上游返回复权价，每次增量请求都与一根已存的已收盘K线重叠，价格变了（拆股、分红）就重新获取整个区间
+"""
+
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from _kv import redis_client, REDIS_AVAILABLE
+from _metrics import timed
+from _codec import encode, decode
+from _quote_cache import quote_ttl
+from _symbol_meta import check_symbol
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+KEY_PREFIX = 'bars:'
+BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR', '/tmp/bars')
+ROW_CHUNK = 500
+# 重叠K线收盘价的相对误差（上游浮点舍入）超过该值时视为复权价已变化
+ADJUST_TOLERANCE = 1e-4
+
+
+class BarStore:
+    """
+    日线存储后端接口
+
+    记录为列式dict：
+    {'start': 覆盖起始日期, 'synced_at': 上次同步时间戳,
+     'dates': [...], 'open': [...], 'high': [...], 'low': [...],
+     'close': [...], 'volume': [...]}
+    """
+
+    def load(self, symbol):
+        raise NotImplementedError
+
+    def save(self, symbol, record):
+        raise NotImplementedError
+
+
+class RedisBarStore(BarStore):
+    """存储在Redis中（key: bars:{symbol}，压缩编码）"""
+
+    @timed('store_seconds', store='bars', backend='redis')
+    def load(self, symbol):
+        return decode(redis_client.get(KEY_PREFIX + symbol))
+
+    @timed('store_seconds', store='bars', backend='redis')
+    def save(self, symbol, record):
+        redis_client.set(KEY_PREFIX + symbol, encode(record))
+
+
+class FileBarStore(BarStore):
+    """存储在本地目录中（每只股票一个JSON文件）"""
+
+    def __init__(self, directory=BAR_STORE_DIR):
+        self.directory = directory
+
+    def _path(self, symbol):
+        return os.path.join(self.directory, f'{check_symbol(symbol)}.json')
+
+    def load(self, symbol):
+        try:
+            with open(self._path(symbol)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, symbol, record):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(symbol)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+
+def get_bar_store():
+    """优先使用Redis，未配置时退回本地文件"""
+    if REDIS_AVAILABLE:
+        return RedisBarStore()
+    return FileBarStore()
+
+
+def normalize_history(hist):
+    """把yfinance返回的数据整理为按日期（无时区）索引的OHLCV"""
+    if hist.empty:
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+    frame = hist[COLUMNS].copy()
+    frame.index = pd.DatetimeIndex(pd.to_datetime(hist.index.date), name='Date')
+    return frame
+
+
+def frame_from_record(record):
+    """列式记录 -> DataFrame"""
+    return pd.DataFrame({
+        'Open': record['open'],
+        'High': record['high'],
+        'Low': record['low'],
+        'Close': record['close'],
+        'Volume': record['volume']
+    }, index=pd.DatetimeIndex(pd.to_datetime(record['dates']), name='Date'))
+
+
+def frame_to_columns(frame):
+    """DataFrame -> 并行数组（整列转换，不逐行处理）"""
+    return {
+        'dates': frame.index.strftime('%Y-%m-%d').tolist(),
+        'open': frame['Open'].astype(float).tolist(),
+        'high': frame['High'].astype(float).tolist(),
+        'low': frame['Low'].astype(float).tolist(),
+        'close': frame['Close'].astype(float).tolist(),
+        'volume': frame['Volume'].fillna(0).astype('int64').tolist()
+    }
+
+
+def frame_to_rows(frame):
+    """DataFrame -> [{date, open, high, low, close, volume}, ...]"""
+    columns = frame_to_columns(frame)
+    keys = ('date', 'open', 'high', 'low', 'close', 'volume')
+    return [
+        dict(zip(keys, values))
+        for values in zip(columns['dates'], columns['open'], columns['high'],
+                          columns['low'], columns['close'], columns['volume'])
+    ]
+
+
+def iter_rows(frame, chunk_size=ROW_CHUNK):
+    """逐块把DataFrame转换为行，任一时刻只有一块行dict在内存中"""
+    for i in range(0, len(frame), chunk_size):
+        yield from frame_to_rows(frame.iloc[i:i + chunk_size])
+
+
+def record_from_frame(frame, start, synced_at):
+    """DataFrame -> 列式记录"""
+    record = frame_to_columns(frame)
+    record['start'] = start.isoformat()
+    record['synced_at'] = synced_at
+    return record
+
+
+def merge_frames(existing, fetched):
+    """合并新旧数据，同一日期以新数据为准（当日未收盘的K线会被更新）"""
+    if fetched.empty:
+        return existing
+    if existing.empty:
+        return fetched
+    merged = pd.concat([existing, fetched])
+    merged = merged[~merged.index.duplicated(keep='last')]
+    return merged.sort_index()
+
+
+def adjustment_changed(existing, fetched, day):
+    """
+    day 当天的已收盘K线在新旧数据中的收盘价不同：拆股或分红后上游的整段复权价都会变化，
+    只合并新数据会在合并点留下永久的跳变
+    """
+    ts = pd.Timestamp(day)
+    if ts not in existing.index or ts not in fetched.index:
+        return False
+    old = float(existing.at[ts, 'Close'])
+    new = float(fetched.at[ts, 'Close'])
+    return abs(new - old) > ADJUST_TOLERANCE * abs(old)
+
+
+class BarHistory:
+    """
+    增量日线历史
+
+    fetch(symbol, start, end) 从上游获取 [start, end) 区间的日线
+    """
+
+    def __init__(self, store, fetch):
+        self.store = store
+        self.fetch = fetch
+
+    def _fetch(self, symbol, start, end):
+        return normalize_history(self.fetch(symbol, start, end))
+
+    def get_bars(self, symbol, start):
+        """返回从start（date）到今天的日线，只向上游请求缺失部分"""
+        tomorrow = date.today() + timedelta(days=1)
+
+        try:
+            record = self.store.load(symbol)
+        except Exception as e:
+            print(f"Bar store LOAD error: {e}")
+            record = None
+
+        changed = False
+        if record:
+            frame = frame_from_record(record)
+            covered_from = date.fromisoformat(record['start'])
+            synced_at = record['synced_at']
+
+            # 向前回补：请求的起点早于已覆盖范围，多取已存的第一根K线用于检查复权价
+            if start < covered_from:
+                first = frame.index[0].date() if not frame.empty else None
+                older = self._fetch(symbol, start, first + timedelta(days=1) if first else covered_from)
+                covered_from = start
+                changed = True
+                if first and adjustment_changed(frame, older, first):
+                    frame = self._fetch(symbol, covered_from, tomorrow)
+                    synced_at = time.time()
+                else:
+                    frame = merge_frames(older, frame)
+
+            # 向后增量：从倒数第二根K线开始补到今天（最后一根可能是未收盘数据），倒数第二根用于检查复权价
+            if time.time() - synced_at >= quote_ttl():
+                check = frame.index[-2].date() if len(frame) > 1 else None
+                since = check or (frame.index[-1].date() if not frame.empty else covered_from)
+                recent = self._fetch(symbol, since, tomorrow)
+                if check and adjustment_changed(frame, recent, check):
+                    frame = self._fetch(symbol, covered_from, tomorrow)
+                else:
+                    frame = merge_frames(frame, recent)
+                synced_at = time.time()
+                changed = True
+        else:
+            frame = self._fetch(symbol, start, tomorrow)
+            covered_from = start
+            synced_at = time.time()
+            changed = not frame.empty
+
+        if changed:
+            try:
+                self.store.save(symbol, record_from_frame(frame, covered_from, synced_at))
+            except Exception as e:
+                print(f"Bar store SAVE error: {e}")
+
+        return frame[frame.index >= pd.Timestamp(start)]
+
+    def iter_bars(self, symbols, start):
+        """
+        逐只股票生成 (symbol, frame, error)，处理完一只再读取下一只，
+        多股票长区间回补时内存占用只取决于单只股票
+        """
+        for symbol in symbols:
+            try:
+                yield symbol, self.get_bars(symbol, start), None
+            except Exception as e:
+                yield symbol, None, e
@@ -0,0 +1,147 @@
+"""
+收盘价矩阵 - 多只股票按同一日期轴对齐、停牌日沿用前值的收盘价
+每只股票的 (日期, 收盘价) 存为一个 .npy 文件，读取时以内存映射打开：按日期区间切片不复制数据，
+也不重新解析JSON；只有文件过期（超过报价TTL）或覆盖范围不够时才经日线存储同步并重写
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from _metrics import incr, timer
+from _quote_cache import quote_ttl
+from _symbol_meta import check_symbol
+
+CLOSE_ARRAY_DIR = os.environ.get('CLOSE_ARRAY_DIR', '/tmp/close_arrays')
+DTYPE = np.dtype([('date', 'datetime64[D]'), ('close', 'float64')])
+# 多取几天，区间第一天停牌时也能沿用之前的收盘价
+LOOKBACK_DAYS = 10
+MAX_FETCH_WORKERS = 8
+
+
+class CloseArrays:
+    """
+    load_bars(symbol, start) 返回从start开始的日线 DataFrame（至少包含Close列）
+
+    每只股票两个文件：{symbol}.npy（结构化数组，按日期升序）和 {symbol}.json（覆盖起点、同步时间）
+    """
+
+    def __init__(self, load_bars, directory=CLOSE_ARRAY_DIR):
+        self.load_bars = load_bars
+        self.directory = directory
+        self._mapped = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, ext):
+        return os.path.join(self.directory, f'{check_symbol(symbol)}.{ext}')
+
+    def _replace(self, path, write):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def _is_fresh(self, meta, start):
+        return meta['start'] <= start.isoformat() and time.time() - meta['synced_at'] < quote_ttl()
+
+    def _open(self, symbol):
+        """打开磁盘上已有的数组（内存映射），不存在时返回None"""
+        try:
+            with open(self._path(symbol, 'json')) as f:
+                meta = json.load(f)
+            return meta, np.load(self._path(symbol, 'npy'), mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _refresh(self, symbol, start):
+        """经日线存储同步后重写数组；先替换数组再替换元数据，读到的元数据不会超出数组的覆盖范围"""
+        with timer('store_seconds', store='close_arrays', backend='mmap', op='refresh'):
+            frame = self.load_bars(symbol, start)
+            closes = frame['Close'].dropna()
+            if closes.empty:
+                raise ValueError(f'无法获取 {symbol} 的历史数据')
+
+            array = np.empty(len(closes), dtype=DTYPE)
+            array['date'] = closes.index.values.astype('datetime64[D]')
+            array['close'] = closes.to_numpy(dtype='float64')
+            meta = {'start': start.isoformat(), 'synced_at': time.time()}
+
+            os.makedirs(self.directory, exist_ok=True)
+            self._replace(self._path(symbol, 'npy'), lambda f: np.save(f, array))
+            self._replace(self._path(symbol, 'json'), lambda f: f.write(json.dumps(meta).encode()))
+            return meta, np.load(self._path(symbol, 'npy'), mmap_mode='r')
+
+    def get(self, symbol, start):
+        """返回覆盖start（date）之后的结构化数组（内存映射，只读）"""
+        with self._lock:
+            entry = self._mapped.get(symbol)
+        if entry is None or not self._is_fresh(entry[0], start):
+            # 进程内没有或已过期时先看磁盘上的文件（可能由其他线程刚写入）
+            entry = self._open(symbol)
+            if entry is None or not self._is_fresh(entry[0], start):
+                incr('cache_requests_total', cache='close_arrays', result='miss')
+                if entry is not None:
+                    start = min(start, date.fromisoformat(entry[0]['start']))
+                entry = self._refresh(symbol, start)
+            else:
+                incr('cache_requests_total', cache='close_arrays', result='hit')
+            with self._lock:
+                self._mapped[symbol] = entry
+        else:
+            incr('cache_requests_total', cache='close_arrays', result='hit')
+        return entry[1]
+
+    def _get_all(self, symbols, start):
+        """并发读取各股票的数组，返回 [(array, error), ...]；已映射且新鲜的不会请求上游"""
+        def load(symbol):
+            try:
+                return self.get(symbol, start), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as pool:
+            return list(pool.map(load, symbols))
+
+    def matrix(self, symbols, start, end):
+        """
+        返回 (dates, matrix, errors)
+
+        dates: 区间内任一股票有交易的日期（datetime64[D]，升序）
+        matrix: float64[len(dates) x len(symbols)]，某日没有交易时沿用之前的收盘价，区间开始前没有数据为NaN
+        errors: {symbol: 错误信息}，对应列全为NaN
+        """
+        lo = np.datetime64(start, 'D')
+        hi = np.datetime64(end, 'D')
+        arrays = self._get_all(symbols, start - timedelta(days=LOOKBACK_DAYS))
+
+        errors = {}
+        windows = []
+        for symbol, (array, error) in zip(symbols, arrays):
+            if error is not None:
+                errors[symbol] = str(error)
+                continue
+            dates = array['date']
+            windows.append(dates[np.searchsorted(dates, lo):np.searchsorted(dates, hi, side='right')])
+
+        axis = np.unique(np.concatenate(windows)) if windows else np.array([], dtype='datetime64[D]')
+        matrix = np.full((len(axis), len(symbols)), np.nan)
+        for j, (array, error) in enumerate(arrays):
+            if error is not None:
+                continue
+            # 每个日期取不晚于它的最后一个交易日，即向前填充
+            idx = np.searchsorted(array['date'], axis, side='right') - 1
+            valid = idx >= 0
+            matrix[valid, j] = array['close'][idx[valid]]
+        return axis, matrix, errors
+
+
+def matrix_to_rows(matrix):
+    """float矩阵 -> 嵌套列表，NaN转为None（JSON中为null）"""
+    rows = matrix.astype(object)
+    rows[np.isnan(matrix)] = None
+    return rows.tolist()
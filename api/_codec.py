@@ -0,0 +1,53 @@
+"""
+存储编码 - 紧凑二进制编码 + 压缩
+格式: MAGIC(3字节) + 编码方式(1字节) + zlib压缩后的数据
+没有MAGIC前缀的值视为旧版纯JSON，读取时透明兼容
+"""
+
+import json
+import zlib
+
+from _metrics import timed
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+MAGIC = b'\x00PT'
+FORMAT_MSGPACK = b'm'
+FORMAT_JSON = b'j'
+COMPRESS_LEVEL = 6
+
+
+@timed('codec_seconds')
+def encode(value):
+    """对象 -> 压缩后的bytes（有msgpack时用msgpack，否则用紧凑JSON）"""
+    if MSGPACK_AVAILABLE:
+        fmt, payload = FORMAT_MSGPACK, msgpack.packb(value, use_bin_type=True)
+    else:
+        fmt, payload = FORMAT_JSON, json.dumps(value, separators=(',', ':')).encode('utf-8')
+    return MAGIC + fmt + zlib.compress(payload, COMPRESS_LEVEL)
+
+
+@timed('codec_seconds')
+def decode(raw):
+    """bytes/str -> 对象，兼容旧版纯JSON值"""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    if not raw.startswith(MAGIC):
+        return json.loads(raw)
+
+    fmt = raw[len(MAGIC):len(MAGIC) + 1]
+    payload = zlib.decompress(raw[len(MAGIC) + 1:])
+    if fmt == FORMAT_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise Exception("读取数据需要msgpack库")
+        return msgpack.unpackb(payload, raw=False)
+    if fmt == FORMAT_JSON:
+        return json.loads(payload)
+    raise ValueError(f'未知的存储编码: {fmt!r}')
+
@@ -0,0 +1,118 @@
+"""
+HTTP响应辅助 - ETag条件请求（304）与gzip/brotli压缩
+"""
+
+import gzip
+import hashlib
+import json
+
+from _metrics import SIZE_BUCKETS, current_route, observe, timer
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+MIN_COMPRESS_SIZE = 1024
+
+
+def content_etag(body):
+    """根据响应内容生成弱ETag（压缩与否内容语义相同）"""
+    return f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 弱比较"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择压缩方式"""
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+    if BROTLI_AVAILABLE and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+
+def dump_json(payload):
+    """编码JSON响应正文，记录编码耗时和正文大小（压缩前）"""
+    route = current_route.get()
+    with timer('json_encode_seconds', route=route):
+        body = json.dumps(payload).encode()
+    observe('response_bytes', len(body), buckets=SIZE_BUCKETS, route=route)
+    return body
+
+
+def send_cors_headers(handler, methods):
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    handler.send_header('Access-Control-Allow-Methods', methods)
+    handler.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match')
+    handler.send_header('Access-Control-Expose-Headers', 'ETag')
+
+
+def send_not_modified(handler, etag, methods='GET, OPTIONS', cache_control=None):
+    """发送304响应（无正文）"""
+    handler.send_response(304)
+    send_cors_headers(handler, methods)
+    handler.send_header('ETag', etag)
+    if cache_control:
+        handler.send_header('Cache-Control', cache_control)
+    handler.end_headers()
+
+
+def send_json(handler, payload, methods='GET, OPTIONS', etag=None, cache_control=None, conditional=True):
+    """
+    发送JSON响应
+
+    conditional 为真时带ETag（默认按内容计算），
+    请求的 If-None-Match 匹配时返回304且不发送正文；
+    客户端支持时对较大的正文做gzip/brotli压缩
+    """
+    body = dump_json(payload)
+
+    if conditional:
+        etag = etag or content_etag(body)
+        if etag_matches(handler.headers.get('If-None-Match'), etag):
+            send_not_modified(handler, etag, methods, cache_control)
+            return
+
+    encoding = None
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoding = choose_encoding(handler.headers.get('Accept-Encoding'))
+        if encoding:
+            with timer('compress_seconds', encoding=encoding):
+                body = compress(body, encoding)
+
+    handler.send_response(200)
+    handler.send_header('Content-type', 'application/json')
+    send_cors_headers(handler, methods)
+    if conditional:
+        handler.send_header('ETag', etag)
+    if cache_control:
+        handler.send_header('Cache-Control', cache_control)
+    if encoding:
+        handler.send_header('Content-Encoding', encoding)
+    handler.send_header('Vary', 'Accept-Encoding')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
@@ -0,0 +1,22 @@
+"""
+共享Redis连接
+供各个Serverless Function复用同一套连接配置（模块级，热启动时复用）
+"""
+
+import os
+
+# 尝试导入redis库
+try:
+    import redis
+    REDIS_URL = os.environ.get('REDIS_URL', '')
+    if REDIS_URL:
+        # 返回bytes：投资组合等数据以压缩二进制编码存储（见_codec）
+        redis_client = redis.from_url(REDIS_URL, decode_responses=False)
+        REDIS_AVAILABLE = True
+    else:
+        REDIS_AVAILABLE = False
+        redis_client = None
+except Exception:
+    REDIS_AVAILABLE = False
+    redis_client = None
+
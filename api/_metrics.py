@@ -0,0 +1,310 @@
+"""
+运行指标 - 计数器和直方图（计时、响应大小）
+各函数实例在进程内累加，并定期把增量合并到Redis哈希（key: metrics），
+/api/stats 读取合并后的结果，输出JSON摘要（含p50/p95/p99）或Prometheus文本格式
+
+指标名和标签都是固定的少量取值（路由、后端、操作），不要把股票代码、用户ID等作为标签
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from urllib.parse import urlparse
+
+from _kv import redis_client, REDIS_AVAILABLE
+
+REDIS_KEY = 'metrics'
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '10'))
+
+# 直方图分桶上界
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# 当前请求的路由（由 instrument 设置，供响应大小等指标打标签）
+current_route = ContextVar('current_route', default='')
+
+
+def _format_labels(labels):
+    return ','.join(
+        f'{name}="{str(value).replace(chr(34), "_").replace(",", "_")}"'
+        for name, value in sorted(labels.items())
+    )
+
+
+def series_key(name, labels):
+    """指标名 + 标签 -> 'name{a="x",b="y"}'（同时作为Redis哈希字段名）"""
+    return f'{name}{{{_format_labels(labels)}}}' if labels else name
+
+
+def parse_series(key):
+    """series_key 的逆操作，返回 (name, labels)"""
+    if not key.endswith('}'):
+        return key, {}
+    name, _, body = key[:-1].partition('{')
+    labels = {}
+    for part in body.split(','):
+        label, _, value = part.partition('=')
+        labels[label] = value.strip('"')
+    return name, labels
+
+
+class Registry:
+    """
+    指标值以 {series_key: float} 存放：计数器直接累加；
+    直方图拆成 name_bucket{le=上界}（不累计的分桶计数）、name_sum、name_count 三类字段
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.started_at = time.time()
+
+    def _add(self, fields):
+        with self._lock:
+            for field, delta in fields:
+                self._values[field] = self._values.get(field, 0.0) + delta
+                self._pending[field] = self._pending.get(field, 0.0) + delta
+
+    def incr(self, name, value=1, **labels):
+        if value:
+            self._add([(series_key(name, labels), value)])
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        index = bisect.bisect_left(buckets, value)
+        le = buckets[index] if index < len(buckets) else '+Inf'
+        self._add([
+            (series_key(name + '_bucket', dict(labels, le=le)), 1),
+            (series_key(name + '_sum', labels), value),
+            (series_key(name + '_count', labels), 1)
+        ])
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录代码块耗时（秒），异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def flush(self, force=False):
+        """把距上次合并以来的增量写入Redis（默认最多每FLUSH_INTERVAL秒一次，一次管道往返）"""
+        if not REDIS_AVAILABLE:
+            return
+        with self._lock:
+            if not self._pending or (not force and time.monotonic() - self._last_flush < FLUSH_INTERVAL):
+                return
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for field, delta in pending.items():
+                pipe.hincrbyfloat(REDIS_KEY, field, delta)
+            pipe.execute()
+        except Exception as e:
+            print(f"Redis metrics flush error: {e}")
+            # 写入失败的增量留到下次合并
+            self._add_pending(pending)
+
+    def _add_pending(self, fields):
+        with self._lock:
+            for field, delta in fields.items():
+                self._pending[field] = self._pending.get(field, 0.0) + delta
+
+    def load_shared(self):
+        """读取所有实例合并后的指标（没有Redis时返回本进程的值）"""
+        if not REDIS_AVAILABLE:
+            return self.snapshot()
+        self.flush(force=True)
+        raw = redis_client.hgetall(REDIS_KEY)
+        return {
+            (k.decode() if isinstance(k, bytes) else k): float(v)
+            for k, v in raw.items()
+        }
+
+
+metrics = Registry()
+incr = metrics.incr
+observe = metrics.observe
+timer = metrics.timer
+flush = metrics.flush
+
+
+def timed(name, **labels):
+    """函数计时装饰器，op 标签默认取函数名（去掉前导下划线）"""
+    def decorator(fn):
+        series_labels = dict(labels)
+        series_labels.setdefault('op', fn.__name__.lstrip('_'))
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **series_labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument(depth=1):
+    """
+    请求处理方法装饰器：记录 handler_seconds{route, method}，并在请求结束后按间隔合并到Redis
+
+    route 取路径 /api/ 之后的前 depth 段（如 depth=2 时 /api/portfolio/save -> portfolio/save）
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            route = _route(urlparse(self.path).path, depth)
+            token = current_route.set(route)
+            try:
+                with timer('handler_seconds', route=route, method=self.command):
+                    return method(self, *args, **kwargs)
+            finally:
+                current_route.reset(token)
+                flush()
+        return wrapper
+    return decorator
+
+
+def instrument_asgi(depth=1):
+    """ASGI应用装饰器：与 instrument 相同，只统计HTTP请求（lifespan等直接交给应用）"""
+    def decorator(app):
+        @wraps(app)
+        async def wrapper(scope, receive, send):
+            if scope['type'] != 'http':
+                return await app(scope, receive, send)
+            route = _route(scope['path'], depth)
+            token = current_route.set(route)
+            try:
+                with timer('handler_seconds', route=route, method=scope['method']):
+                    return await app(scope, receive, send)
+            finally:
+                current_route.reset(token)
+                flush()
+        return wrapper
+    return decorator
+
+
+def _route(path, depth):
+    parts = path.strip('/').split('/')
+    return '/'.join(parts[1:1 + depth]) or 'root'
+
+
+# ---- 输出 ----
+
+def _group(values):
+    """把扁平的字段拆成计数器和直方图: ({key: value}, {key: {'buckets': {le: n}, 'sum', 'count'}})"""
+    counters = {}
+    histograms = {}
+    for key, value in values.items():
+        name, labels = parse_series(key)
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix):
+                le = labels.pop('le', None)
+                entry = histograms.setdefault(series_key(name[:-len(suffix)], labels), {
+                    'buckets': {}, 'sum': 0.0, 'count': 0.0
+                })
+                if suffix == '_bucket':
+                    entry['buckets'][le] = value
+                else:
+                    entry[suffix[1:]] = value
+                break
+        else:
+            counters[key] = value
+    return counters, histograms
+
+
+def _bucket_bounds(buckets):
+    """按上界排序的 [(上界, 计数)]，+Inf 排在最后"""
+    return sorted(
+        ((float('inf') if le == '+Inf' else float(le), n) for le, n in buckets.items()),
+        key=lambda item: item[0]
+    )
+
+
+def quantile(buckets, count, q):
+    """由分桶计数估算分位数（桶内线性插值；落在+Inf桶时返回最后一个有限上界）"""
+    if count <= 0:
+        return None
+    target = q * count
+    lower = 0.0
+    seen = 0.0
+    for upper, n in _bucket_bounds(buckets):
+        if seen + n >= target and n > 0:
+            if upper == float('inf'):
+                return lower
+            return lower + (upper - lower) * (target - seen) / n
+        seen += n
+        if upper != float('inf'):
+            lower = upper
+    return lower
+
+
+def summarize(values):
+    """JSON摘要: 计数器原样输出，直方图输出次数、合计、均值和p50/p95/p99"""
+    counters, histograms = _group(values)
+    summary = {}
+    for key, entry in sorted(histograms.items()):
+        count = entry['count']
+        summary[key] = {
+            'count': int(count),
+            'sum': round(entry['sum'], 6),
+            'avg': round(entry['sum'] / count, 6) if count else None,
+            'p50': _round(quantile(entry['buckets'], count, 0.5)),
+            'p95': _round(quantile(entry['buckets'], count, 0.95)),
+            'p99': _round(quantile(entry['buckets'], count, 0.99))
+        }
+    return {
+        'counters': {key: value for key, value in sorted(counters.items())},
+        'histograms': summary
+    }
+
+
+def _round(value):
+    return round(value, 6) if value is not None else None
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def prometheus_text(values):
+    """Prometheus文本格式（直方图分桶输出为累计值）"""
+    counters, histograms = _group(values)
+    lines = []
+    typed = set()
+
+    for key, value in sorted(counters.items()):
+        name, _ = parse_series(key)
+        if name not in typed:
+            lines.append(f'# TYPE {name} counter')
+            typed.add(name)
+        lines.append(f'{key} {_number(value)}')
+
+    for key, entry in sorted(histograms.items()):
+        name, labels = parse_series(key)
+        if name not in typed:
+            lines.append(f'# TYPE {name} histogram')
+            typed.add(name)
+        cumulative = 0.0
+        bounds = _bucket_bounds(entry['buckets'])
+        if not bounds or bounds[-1][0] != float('inf'):
+            bounds.append((float('inf'), 0.0))
+        for upper, n in bounds:
+            cumulative += n
+            le = '+Inf' if upper == float('inf') else _number(upper)
+            lines.append(f'{series_key(name + "_bucket", dict(labels, le=le))} {_number(cumulative)}')
+        lines.append(f'{series_key(name + "_sum", labels)} {_number(entry["sum"])}')
+        lines.append(f'{series_key(name + "_count", labels)} {_number(entry["count"])}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,43 @@
+"""
+共享MongoDB连接
+模块级客户端：热启动时复用连接池，避免每个请求重新TLS握手和选择服务器
+"""
+
+import os
+
+# 使用pymongo连接MongoDB Atlas
+try:
+    from pymongo import MongoClient
+    MONGODB_AVAILABLE = True
+except ImportError:
+    MONGODB_AVAILABLE = False
+
+_mongo_client = None
+
+
+def get_database():
+    """获取（必要时创建）共享的MongoDB数据库连接"""
+    global _mongo_client
+    if not MONGODB_AVAILABLE:
+        return None
+
+    mongodb_uri = os.environ.get('MONGODB_URI', '')
+    if not mongodb_uri:
+        return None
+
+    if _mongo_client is None:
+        try:
+            # Vercel兼容的MongoDB连接配置
+            _mongo_client = MongoClient(
+                mongodb_uri,
+                serverSelectionTimeoutMS=5000,
+                tlsAllowInvalidCertificates=True,  # 允许自签名证书
+                retryWrites=True,
+                w='majority',
+                maxPoolSize=10
+            )
+        except Exception as e:
+            print(f"MongoDB连接失败: {e}")
+            return None
+
+    return _mongo_client.portfolio_tracker
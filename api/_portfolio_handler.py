@@ -0,0 +1,130 @@
+"""
+投资组合数据管理 - 共享请求处理
+各入口（portfolio_kv / portfolio）只需指定存储后端和用户ID的获取方式
+"""
+
+from http.server import BaseHTTPRequestHandler
+import json
+
+from _portfolio_store import DEFAULT_CASH, VersionConflict, document_etag
+from _http import etag_matches, send_cors_headers, send_json, send_not_modified
+from _metrics import SIZE_BUCKETS, current_route, instrument, observe, timer
+
+METHODS = 'GET, POST, DELETE, OPTIONS'
+
+
+class PortfolioHandler(BaseHTTPRequestHandler):
+    # 子类设置: 存储后端（见 _portfolio_store.get_store）
+    store = None
+
+    # 云端还没有数据时返回的内容
+    empty_document = {
+        'portfolio': {},
+        'cashBalance': DEFAULT_CASH,
+        'transactionHistory': []
+    }
+
+    def get_user_id(self):
+        raise NotImplementedError
+
+    def send_result(self, result):
+        send_json(self, result, methods=METHODS, conditional=False)
+
+    @instrument(depth=2)
+    def do_GET(self):
+        """处理GET请求 - 加载投资组合（支持ETag条件请求和gzip压缩）"""
+        try:
+            # 只读取一次：load 先读文档头，版本未变化时交易记录直接来自进程内缓存；
+            # ETag 由读到的同一份文档计算，不会与正文不一致
+            data = self.store.load(self.get_user_id())
+
+            if data:
+                etag = document_etag(data)
+                if etag and etag_matches(self.headers.get('If-None-Match'), etag):
+                    send_not_modified(self, etag, METHODS, cache_control='no-cache')
+                    return
+                send_json(self, {
+                    'success': True,
+                    'data': data
+                }, methods=METHODS, etag=etag, cache_control='no-cache')
+            else:
+                # 返回默认空数据
+                self.send_result({
+                    'success': True,
+                    'data': self.empty_document
+                })
+
+        except Exception as e:
+            self.send_result({
+                'success': False,
+                'error': str(e)
+            })
+
+    @instrument(depth=2)
+    def do_POST(self):
+        """处理POST请求 - 保存投资组合（/save 整份保存，/patch 增量修改）"""
+        try:
+            user_id = self.get_user_id()
+
+            # 读取请求体
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length)
+            route = current_route.get()
+            observe('request_bytes', len(body), buckets=SIZE_BUCKETS, route=route)
+            with timer('json_decode_seconds', route=route):
+                request_data = json.loads(body.decode('utf-8'))
+
+            if self.path.split('?')[0].rstrip('/').endswith('/patch'):
+                # 增量修改: {'base_version': n, 'ops': [...]}
+                version = self.store.apply_patch(
+                    user_id,
+                    request_data.get('ops', []),
+                    request_data.get('base_version')
+                )
+            else:
+                # 整份保存（时间戳和版本号由存储层添加）；带 base_version 时只在云端未被其他客户端修改时覆盖
+                base_version = request_data.pop('base_version', None)
+                version = self.store.save(user_id, request_data, base_version)
+
+            self.send_result({
+                'success': True,
+                'message': '保存成功',
+                'version': version
+            })
+
+        except VersionConflict as e:
+            self.send_result({
+                'success': False,
+                'error': str(e),
+                'conflict': True,
+                'version': e.current_version
+            })
+
+        except Exception as e:
+            self.send_result({
+                'success': False,
+                'error': str(e)
+            })
+
+    @instrument(depth=2)
+    def do_DELETE(self):
+        """处理DELETE请求 - 删除投资组合"""
+        try:
+            self.store.delete(self.get_user_id())
+
+            self.send_result({
+                'success': True,
+                'message': '删除成功'
+            })
+
+        except Exception as e:
+            self.send_result({
+                'success': False,
+                'error': str(e)
+            })
+
+    def do_OPTIONS(self):
+        """处理OPTIONS请求 - CORS预检"""
+        self.send_response(200)
+        send_cors_headers(self, METHODS)
+        self.end_headers()
@@ -0,0 +1,626 @@
+"""
+投资组合存储
+文档头（持仓、现金等）与交易记录分开存放：交易记录按固定大小分段，每段经压缩编码（见_codec）；
+新增交易只改写最后一段，保存开销不随历史增长；文档带版本号，防止并发写入互相覆盖
+
+分段、压缩、版本检查和读缓存在 PortfolioStore 中实现，
+各后端（Redis / MongoDB / SQLite / 内存）只需实现少量读写原语
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from _kv import redis_client
+from _codec import encode, decode
+from _metrics import incr, timed
+
+TX_SEGMENTS = 'segments'        # 当前布局：交易记录分段编码存储
+TX_LIST = 'list'                # 旧布局（仅Redis）：每个列表元素是一条JSON交易记录
+SEGMENT_SIZE = 256
+MAX_RETRIES = 5
+DOC_CACHE_SIZE = 32
+# 新用户的初始现金（与页面的初始状态一致）
+DEFAULT_CASH = 100000
+
+# 不能通过 set 操作修改的字段
+RESERVED_FIELDS = ('transactionHistory', 'version', 'tx_storage', 'tx_count', 'tx_epoch', 'updated_at')
+
+
+class VersionConflict(Exception):
+    """客户端基于的版本已不是最新"""
+
+    def __init__(self, current_version):
+        super().__init__(f'版本冲突：云端已更新到版本 {current_version}，请重新加载')
+        self.current_version = current_version
+
+
+def portfolio_key(user_id):
+    return f"portfolio:{user_id}"
+
+
+def apply_ops(head, ops):
+    """
+    把补丁操作应用到文档头上，返回需要追加的交易记录
+
+    支持的操作:
+    {'op': 'add_transaction', 'transaction': {...}}
+    {'op': 'set_holding', 'holding': {...}}      按 holding['id'] 更新或新增持仓
+    {'op': 'remove_holding', 'id': ...}
+    {'op': 'set_cash', 'cashBalance': 1000}
+    {'op': 'set', 'field': 'totalRealizedProfit', 'value': ...}
+    """
+    new_transactions = []
+    for op in ops:
+        name = op.get('op')
+        if name == 'add_transaction':
+            new_transactions.append(op['transaction'])
+        elif name == 'set_holding':
+            holding = op['holding']
+            positions = [p for p in head.get('positions', []) if p.get('id') != holding.get('id')]
+            positions.append(holding)
+            head['positions'] = positions
+        elif name == 'remove_holding':
+            head['positions'] = [p for p in head.get('positions', []) if p.get('id') != op['id']]
+        elif name == 'set_cash':
+            head['cashBalance'] = op['cashBalance']
+        elif name == 'set':
+            if op['field'] in RESERVED_FIELDS:
+                raise ValueError(f"字段 {op['field']} 不能直接修改")
+            head[op['field']] = op['value']
+        else:
+            raise ValueError(f'不支持的操作: {name}')
+    return new_transactions
+
+
+def empty_document():
+    """云端还没有数据时的文档（第一次打补丁时以此为基础）"""
+    return {'positions': [], 'cashBalance': DEFAULT_CASH, 'transactionHistory': []}
+
+
+def document_etag(doc):
+    """
+    由版本号和更新时间生成ETag（删除后重建会从版本1重新开始，所以带上更新时间）；
+    旧数据没有版本信息时返回None，由调用方按内容计算
+    """
+    if not doc or not doc.get('version') or not doc.get('updated_at'):
+        return None
+    digest = hashlib.sha1(f"{doc['version']}:{doc['updated_at']}".encode()).hexdigest()[:16]
+    return f'W/"v{doc["version"]}-{digest}"'
+
+
+def new_epoch():
+    """交易记录被整体重写（整份保存、迁移、删除后重建）时更换的标识，只追加时保持不变"""
+    return secrets.token_hex(8)
+
+
+def encode_segments(transactions):
+    """交易记录 -> 编码后的分段列表"""
+    return [
+        encode(transactions[i:i + SEGMENT_SIZE])
+        for i in range(0, len(transactions), SEGMENT_SIZE)
+    ]
+
+
+class PortfolioStore:
+    """
+    存储后端接口
+
+    后端需要实现:
+    load_head(user_id)                       -> 解码后的文档头，不存在时返回None
+    _load_segments(user_id)                  -> 全部编码分段（按顺序）
+    _load_segment(user_id, index)            -> 第index个编码分段，不存在时返回None
+    _commit(user_id, head, expected_version, start, segments)
+        原子地写入文档头；segments 不为None时保留前start段，其余替换为segments；
+        当前版本不等于expected_version时抛出 VersionConflict
+    _delete(user_id)
+    user_ids()                               -> 所有有数据的用户ID
+    """
+
+    def __init__(self):
+        self._doc_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    # ---- 后端原语 ----
+
+    def load_head(self, user_id):
+        raise NotImplementedError
+
+    def _load_segments(self, user_id):
+        raise NotImplementedError
+
+    def _load_segment(self, user_id, index):
+        raise NotImplementedError
+
+    def _commit(self, user_id, head, expected_version, start, segments):
+        raise NotImplementedError
+
+    def _delete(self, user_id):
+        raise NotImplementedError
+
+    def user_ids(self):
+        raise NotImplementedError
+
+    def _legacy_transactions(self, user_id, head, layout):
+        """旧格式文档：交易记录内嵌在文档中"""
+        return head.pop('transactionHistory', None) or []
+
+    # ---- 公共逻辑 ----
+
+    def _cache_get(self, user_id, cache_key):
+        with self._cache_lock:
+            cached = self._doc_cache.get(user_id)
+            if cached and cached[0] == cache_key:
+                self._doc_cache.move_to_end(user_id)
+                return cached[1]
+        return None
+
+    def _cache_put(self, user_id, cache_key, doc):
+        with self._cache_lock:
+            self._doc_cache[user_id] = (cache_key, doc)
+            self._doc_cache.move_to_end(user_id)
+            while len(self._doc_cache) > DOC_CACHE_SIZE:
+                self._doc_cache.popitem(last=False)
+
+    def load(self, user_id):
+        """读取完整文档（文档头 + 交易记录），不存在时返回None；版本未变时直接用进程内缓存"""
+        head = self.load_head(user_id)
+        if head is None:
+            return None
+
+        cache_key = document_etag(head)
+        doc = self._cache_get(user_id, cache_key) if cache_key else None
+        incr('cache_requests_total', cache='document', result='hit' if doc is not None else 'miss')
+        if doc is None:
+            doc = dict(head)
+            layout = doc.pop('tx_storage', None)
+            count = doc.pop('tx_count', 0)
+            doc.pop('tx_epoch', None)
+            if layout == TX_SEGMENTS:
+                transactions = []
+                for segment in self._load_segments(user_id):
+                    transactions.extend(decode(segment))
+                # 只取文档头记录的条数，忽略并发写入中尚未提交的部分
+                doc['transactionHistory'] = transactions[:count]
+            else:
+                doc['transactionHistory'] = self._legacy_transactions(user_id, doc, layout)
+            doc.setdefault('version', 0)
+            if cache_key:
+                self._cache_put(user_id, cache_key, doc)
+
+        # 浅拷贝，调用方修改顶层字段不影响缓存
+        doc = dict(doc)
+        doc['transactionHistory'] = list(doc['transactionHistory'])
+        return doc
+
+    def save(self, user_id, doc, base_version=None):
+        """
+        整份覆盖保存，返回新版本号
+
+        base_version 不为空时必须等于当前版本，否则抛出 VersionConflict（不覆盖其他客户端刚写入的数据）
+        """
+        base = {k: v for k, v in doc.items() if k not in RESERVED_FIELDS}
+        transactions = doc.get('transactionHistory') or []
+        segments = encode_segments(transactions)
+
+        for _ in range(MAX_RETRIES):
+            current = self.load_head(user_id)
+            version = current.get('version', 0) if current else 0
+            if base_version is not None and base_version != version:
+                raise VersionConflict(version)
+            head = dict(
+                base,
+                version=version + 1,
+                tx_storage=TX_SEGMENTS,
+                tx_count=len(transactions),
+                tx_epoch=new_epoch(),
+                updated_at=datetime.now().isoformat()
+            )
+            try:
+                self._commit(user_id, head, version, 0, segments)
+                return version + 1
+            except VersionConflict:
+                continue
+        raise Exception("保存失败：并发写入过多，请稍后重试")
+
+    def apply_patch(self, user_id, ops, base_version=None):
+        """
+        应用补丁操作，返回新版本号
+
+        base_version 不为空时必须等于当前版本，否则抛出 VersionConflict；
+        旧格式文档在第一次打补丁时迁移为分段编码存储
+        """
+        for _ in range(MAX_RETRIES):
+            head = self.load_head(user_id) or empty_document()
+            version = head.get('version', 0)
+            if base_version is not None and base_version != version:
+                raise VersionConflict(version)
+
+            head = dict(head)
+            layout = head.pop('tx_storage', None)
+            if layout == TX_SEGMENTS:
+                count = head.get('tx_count', 0)
+                filled = count % SEGMENT_SIZE
+                start = count // SEGMENT_SIZE
+                # 最后一段未满时读出来，把新交易补进去
+                tail = decode(self._load_segment(user_id, start))[:filled] if filled else []
+            else:
+                start = 0
+                tail = self._legacy_transactions(user_id, head, layout)
+                head['tx_epoch'] = new_epoch()
+            head.setdefault('tx_epoch', new_epoch())
+
+            new_transactions = apply_ops(head, ops)
+            rewrite = layout != TX_SEGMENTS or new_transactions
+            head.update(
+                version=version + 1,
+                tx_storage=TX_SEGMENTS,
+                tx_count=start * SEGMENT_SIZE + len(tail) + len(new_transactions),
+                updated_at=datetime.now().isoformat()
+            )
+            segments = encode_segments(tail + new_transactions) if rewrite else None
+            try:
+                self._commit(user_id, head, version, start, segments)
+                return version + 1
+            except VersionConflict:
+                continue
+        raise Exception("保存失败：并发写入过多，请稍后重试")
+
+    def load_transactions(self, user_id, positions):
+        """按位置读取交易记录（分段布局），只读取涉及的分段"""
+        segments = {}
+        result = []
+        for position in positions:
+            index = position // SEGMENT_SIZE
+            if index not in segments:
+                segments[index] = decode(self._load_segment(user_id, index)) or []
+            result.append(segments[index][position % SEGMENT_SIZE])
+        return result
+
+    def load_transactions_from(self, user_id, start, count):
+        """读取位置 [start, count) 的交易记录（分段布局），用于增量构建索引"""
+        result = []
+        for index in range(start // SEGMENT_SIZE, (count + SEGMENT_SIZE - 1) // SEGMENT_SIZE):
+            result.extend(decode(self._load_segment(user_id, index)) or [])
+        offset = start - start // SEGMENT_SIZE * SEGMENT_SIZE
+        return result[offset:offset + count - start]
+
+    def iter_transaction_batches(self, user_id):
+        """
+        逐段生成交易记录列表（分段布局每次只解码一段），用于导出；
+        条数以开始时的文档头为准，导出过程中追加的交易不包含在内
+        """
+        head = self.load_head(user_id)
+        if head is None:
+            return
+        if head.get('tx_storage') != TX_SEGMENTS:
+            yield (self.load(user_id) or {}).get('transactionHistory', [])
+            return
+
+        count = head.get('tx_count', 0)
+        for index in range((count + SEGMENT_SIZE - 1) // SEGMENT_SIZE):
+            segment = decode(self._load_segment(user_id, index)) or []
+            yield segment[:count - index * SEGMENT_SIZE]
+
+    def delete(self, user_id):
+        self._delete(user_id)
+        with self._cache_lock:
+            self._doc_cache.pop(user_id, None)
+
+
+class RedisPortfolioStore(PortfolioStore):
+    """
+    key 布局:
+    portfolio:{user_id}     编码后的文档头（旧数据为内嵌交易记录的纯JSON）
+    portfolio:{user_id}:tx  交易记录分段列表
+    """
+
+    TX_SUFFIX = ':tx'
+
+    def __init__(self, client=None):
+        super().__init__()
+        self.client = client or redis_client
+
+    def _require_client(self):
+        if self.client is None:
+            raise Exception("Redis未配置")
+
+    @timed('store_seconds', store='portfolio', backend='redis')
+    def load_head(self, user_id):
+        """只读取文档头（版本号、更新时间等），不读取交易记录"""
+        if self.client is None:
+            return None
+        return decode(self.client.get(portfolio_key(user_id)))
+
+    @timed('store_seconds', store='portfolio', backend='redis')
+    def _load_segments(self, user_id):
+        return self.client.lrange(portfolio_key(user_id) + self.TX_SUFFIX, 0, -1)
+
+    @timed('store_seconds', store='portfolio', backend='redis')
+    def _load_segment(self, user_id, index):
+        return self.client.lindex(portfolio_key(user_id) + self.TX_SUFFIX, index)
+
+    def _legacy_transactions(self, user_id, head, layout):
+        if layout == TX_LIST:
+            return [json.loads(t) for t in self._load_segments(user_id)]
+        return super()._legacy_transactions(user_id, head, layout)
+
+    @timed('store_seconds', store='portfolio', backend='redis')
+    def _commit(self, user_id, head, expected_version, start, segments):
+        from redis.exceptions import WatchError
+
+        self._require_client()
+        key = portfolio_key(user_id)
+        tx_key = key + self.TX_SUFFIX
+
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = decode(pipe.get(key))
+                version = current.get('version', 0) if current else 0
+                if version != expected_version:
+                    raise VersionConflict(version)
+
+                pipe.multi()
+                pipe.set(key, encode(head))
+                if segments is not None:
+                    if start == 0:
+                        pipe.delete(tx_key)
+                    else:
+                        pipe.ltrim(tx_key, 0, start - 1)
+                    if segments:
+                        pipe.rpush(tx_key, *segments)
+                pipe.execute()
+            except WatchError:
+                raise VersionConflict(expected_version)
+
+    @timed('store_seconds', store='portfolio', backend='redis')
+    def _delete(self, user_id):
+        self._require_client()
+        key = portfolio_key(user_id)
+        self.client.delete(key, key + self.TX_SUFFIX)
+
+    @timed('store_seconds', store='portfolio', backend='redis')
+    def user_ids(self):
+        """用SCAN遍历 portfolio:* （跳过交易记录key），不阻塞Redis"""
+        if self.client is None:
+            return
+        prefix = portfolio_key('')
+        for key in self.client.scan_iter(match=prefix + '*', count=500):
+            key = key.decode() if isinstance(key, bytes) else key
+            if not key.endswith(self.TX_SUFFIX):
+                yield key[len(prefix):]
+
+
+class MongoPortfolioStore(PortfolioStore):
+    """
+    集合布局:
+    portfolios          {user_id, version, tx_count, head: 编码后的文档头}
+                        （旧数据为普通文档，交易记录内嵌）
+    portfolio_segments  {user_id, seq, data: 编码后的分段}
+
+    写入在多文档事务中完成（需要副本集，MongoDB Atlas满足）
+    """
+
+    def __init__(self, get_database):
+        super().__init__()
+        self._get_database = get_database
+        self._indexed = False
+
+    def _db(self):
+        db = self._get_database()
+        if db is None:
+            raise Exception("Database not configured")
+        if not self._indexed:
+            db.portfolios.create_index('user_id', unique=True)
+            db.portfolio_segments.create_index([('user_id', 1), ('seq', 1)], unique=True)
+            self._indexed = True
+        return db
+
+    def _decode_document(self, doc):
+        if doc is None:
+            return None
+        if 'head' in doc:
+            return decode(bytes(doc['head']))
+        # 旧格式：整个文档就是投资组合数据
+        doc.pop('_id', None)
+        doc.pop('user_id', None)
+        return doc
+
+    @timed('store_seconds', store='portfolio', backend='mongo')
+    def load_head(self, user_id):
+        return self._decode_document(self._db().portfolios.find_one({'user_id': user_id}))
+
+    @timed('store_seconds', store='portfolio', backend='mongo')
+    def _load_segments(self, user_id):
+        cursor = self._db().portfolio_segments.find({'user_id': user_id}).sort('seq', 1)
+        return [bytes(doc['data']) for doc in cursor]
+
+    @timed('store_seconds', store='portfolio', backend='mongo')
+    def _load_segment(self, user_id, index):
+        doc = self._db().portfolio_segments.find_one({'user_id': user_id, 'seq': index})
+        return bytes(doc['data']) if doc else None
+
+    @timed('store_seconds', store='portfolio', backend='mongo')
+    def _commit(self, user_id, head, expected_version, start, segments):
+        from bson.binary import Binary
+
+        db = self._db()
+
+        def write(session):
+            current = self._decode_document(db.portfolios.find_one({'user_id': user_id}, session=session))
+            version = current.get('version', 0) if current else 0
+            if version != expected_version:
+                raise VersionConflict(version)
+
+            db.portfolios.replace_one(
+                {'user_id': user_id},
+                {
+                    'user_id': user_id,
+                    'version': head['version'],
+                    'tx_count': head['tx_count'],
+                    'head': Binary(encode(head))
+                },
+                upsert=True,
+                session=session
+            )
+            if segments is not None:
+                db.portfolio_segments.delete_many({'user_id': user_id, 'seq': {'$gte': start}}, session=session)
+                if segments:
+                    db.portfolio_segments.insert_many([
+                        {'user_id': user_id, 'seq': start + i, 'data': Binary(segment)}
+                        for i, segment in enumerate(segments)
+                    ], session=session)
+
+        with db.client.start_session() as session:
+            session.with_transaction(write)
+
+    @timed('store_seconds', store='portfolio', backend='mongo')
+    def _delete(self, user_id):
+        db = self._db()
+        db.portfolios.delete_one({'user_id': user_id})
+        db.portfolio_segments.delete_many({'user_id': user_id})
+
+    @timed('store_seconds', store='portfolio', backend='mongo')
+    def user_ids(self):
+        return self._db().portfolios.distinct('user_id')
+
+
+class SQLitePortfolioStore(PortfolioStore):
+    """本地SQLite文件存储（适合单机部署和基准测试）"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS portfolios '
+            '(user_id TEXT PRIMARY KEY, version INTEGER NOT NULL, head BLOB NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS portfolio_segments '
+            '(user_id TEXT NOT NULL, seq INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (user_id, seq))'
+        )
+
+    @timed('store_seconds', store='portfolio', backend='sqlite')
+    def load_head(self, user_id):
+        with self._lock:
+            row = self._conn.execute('SELECT head FROM portfolios WHERE user_id = ?', (user_id,)).fetchone()
+        return decode(row[0]) if row else None
+
+    @timed('store_seconds', store='portfolio', backend='sqlite')
+    def _load_segments(self, user_id):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT data FROM portfolio_segments WHERE user_id = ? ORDER BY seq', (user_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    @timed('store_seconds', store='portfolio', backend='sqlite')
+    def _load_segment(self, user_id, index):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM portfolio_segments WHERE user_id = ? AND seq = ?', (user_id, index)
+            ).fetchone()
+        return row[0] if row else None
+
+    @timed('store_seconds', store='portfolio', backend='sqlite')
+    def _commit(self, user_id, head, expected_version, start, segments):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT version FROM portfolios WHERE user_id = ?', (user_id,)).fetchone()
+                version = row[0] if row else 0
+                if version != expected_version:
+                    raise VersionConflict(version)
+
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO portfolios (user_id, version, head) VALUES (?, ?, ?)',
+                    (user_id, head['version'], encode(head))
+                )
+                if segments is not None:
+                    self._conn.execute(
+                        'DELETE FROM portfolio_segments WHERE user_id = ? AND seq >= ?', (user_id, start)
+                    )
+                    self._conn.executemany(
+                        'INSERT INTO portfolio_segments (user_id, seq, data) VALUES (?, ?, ?)',
+                        [(user_id, start + i, segment) for i, segment in enumerate(segments)]
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    @timed('store_seconds', store='portfolio', backend='sqlite')
+    def _delete(self, user_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM portfolios WHERE user_id = ?', (user_id,))
+            self._conn.execute('DELETE FROM portfolio_segments WHERE user_id = ?', (user_id,))
+
+    @timed('store_seconds', store='portfolio', backend='sqlite')
+    def user_ids(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT user_id FROM portfolios').fetchall()
+        return [row[0] for row in rows]
+
+
+class MemoryPortfolioStore(PortfolioStore):
+    """进程内存储（本地开发、测试和基准对照用，进程退出即丢失）"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._heads = {}
+        self._segments = {}
+
+    def load_head(self, user_id):
+        raw = self._heads.get(user_id)
+        return decode(raw) if raw else None
+
+    def _load_segments(self, user_id):
+        return list(self._segments.get(user_id, []))
+
+    def _load_segment(self, user_id, index):
+        segments = self._segments.get(user_id, [])
+        return segments[index] if 0 <= index < len(segments) else None
+
+    def _commit(self, user_id, head, expected_version, start, segments):
+        with self._lock:
+            current = self._heads.get(user_id)
+            version = decode(current).get('version', 0) if current else 0
+            if version != expected_version:
+                raise VersionConflict(version)
+
+            self._heads[user_id] = encode(head)
+            if segments is not None:
+                self._segments[user_id] = self._segments.get(user_id, [])[:start] + list(segments)
+
+    def _delete(self, user_id):
+        with self._lock:
+            self._heads.pop(user_id, None)
+            self._segments.pop(user_id, None)
+
+    def user_ids(self):
+        return list(self._heads)
+
+
+def get_store(backend=None):
+    """按名称（默认取环境变量 PORTFOLIO_STORE，未设置时为redis）创建存储后端"""
+    backend = backend or os.environ.get('PORTFOLIO_STORE', 'redis')
+    if backend == 'redis':
+        return RedisPortfolioStore()
+    if backend == 'mongo':
+        from _mongo import get_database
+        return MongoPortfolioStore(get_database)
+    if backend == 'sqlite':
+        return SQLitePortfolioStore(os.environ.get('PORTFOLIO_SQLITE_PATH', '/tmp/portfolio.db'))
+    if backend == 'memory':
+        return MemoryPortfolioStore()
+    raise ValueError(f'不支持的存储后端: {backend}')
@@ -0,0 +1,287 @@
+"""
+价格服务 - 报价、批量报价和历史数据的业务逻辑
+同步入口（price.py）和异步入口（price_asgi.py）共用
+
+pandas/numpy（日线存储、聚合）和yfinance只在需要时导入：
+健康检查和命中缓存的报价请求不加载它们，冷启动更快
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+
+from _quote_cache import QuoteCache
+from _symbol_meta import check_symbol, fallback_meta, symbol_meta
+from _upstream import fetch_history, fetch_quote, fetch_quotes
+from _scheduler import UpstreamUnavailable
+
+# 批量报价单次请求最多支持的股票数量
+MAX_BATCH_SYMBOLS = 100
+
+# 根据时间范围设置获取的天数
+PERIOD_DAYS = {
+    '1D': 20,
+    '1W': 65,
+    '1M': 250,
+    '3M': 750,
+    '6M': 1500,
+    'YTD': 365
+}
+
+USAGE = {
+    'price': '/api/price/{symbol}',
+    'prices': '/api/prices?symbols=AAPL,MSFT',
+    'history': '/api/history/{symbol}?period=1M&format=rows|columnar&interval=1d|1w|1mo|1q&max_points=N',
+    'history_matrix': '/api/history/matrix?symbols=AAPL,MSFT&start=YYYY-MM-DD&end=YYYY-MM-DD（或period=1M）',
+    'history_stream': '/api/history/{symbol}?stream=1&start=YYYY-MM-DD 或 /api/histories?symbols=AAPL,MSFT&stream=1',
+    'stream': '/api/stream/prices?symbols=AAPL,MSFT（Server-Sent Events，仅异步版本）',
+    'health': '/api/health'
+}
+
+# 模块级报价缓存，热启动时跨请求复用
+quote_cache = QuoteCache()
+
+# 本地持久化的日线数据，只增量请求缺失的日期（第一次使用时创建）
+_bar_history = None
+_bar_history_lock = threading.Lock()
+
+# 内存映射的收盘价数组，用于多股票对齐（第一次使用时创建）
+_close_arrays = None
+
+
+def get_bar_history():
+    global _bar_history
+    if _bar_history is None:
+        with _bar_history_lock:
+            if _bar_history is None:
+                from _bar_store import BarHistory, get_bar_store
+                _bar_history = BarHistory(get_bar_store(), fetch_history)
+    return _bar_history
+
+
+def get_close_arrays():
+    global _close_arrays
+    if _close_arrays is None:
+        bar_history = get_bar_history()
+        with _bar_history_lock:
+            if _close_arrays is None:
+                from _close_matrix import CloseArrays
+                _close_arrays = CloseArrays(bar_history.get_bars)
+    return _close_arrays
+
+
+def parse_symbols(raw):
+    """解析逗号分隔的股票代码列表（去重并保持顺序）；含不合法的代码时抛出 ValueError"""
+    symbols = []
+    for part in raw.split(','):
+        if not part.strip():
+            continue
+        symbol = check_symbol(part)
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def health():
+    return {
+        'status': 'ok',
+        'message': '股票追踪API服务正常运行',
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def check_batch_symbols(symbols):
+    """校验批量查询的股票列表，不合法时返回错误响应"""
+    if not symbols:
+        return {'success': False, 'error': '请提供symbols参数'}
+
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return {
+            'success': False,
+            'error': f'单次最多查询 {MAX_BATCH_SYMBOLS} 支股票'
+        }
+    return None
+
+
+def history_start(period, start=None):
+    """历史数据的起始日期：优先使用start（YYYY-MM-DD），否则按period换算"""
+    if start:
+        return date.fromisoformat(start)
+    days = PERIOD_DAYS.get(period, 250)
+    return (datetime.now() - timedelta(days=days)).date()
+
+
+def iter_history_lines(symbols, start_date, interval='1d', max_points=None):
+    """
+    流式历史数据：逐只股票、逐块生成NDJSON行
+
+    {"type": "meta", "symbol": ..., "interval": ...}
+    {"type": "bar", "symbol": ..., "date": ..., "open": ..., ...}   每根K线一行
+    {"type": "end", "symbol": ..., "count": n}
+    {"type": "error", "symbol": ..., "error": ...}
+    """
+    from _bar_store import iter_rows
+    from _resample import downsample, resample_bars
+
+    for symbol, hist, error in get_bar_history().iter_bars(symbols, start_date):
+        if error is None and hist.empty:
+            error = f'无法获取 {symbol} 的历史数据'
+        if error is not None:
+            yield {'type': 'error', 'symbol': symbol, 'error': str(error)}
+            continue
+
+        yield {'type': 'meta', 'symbol': symbol, 'interval': interval}
+        hist = downsample(resample_bars(hist, interval), 'Close', max_points)
+        for row in iter_rows(hist):
+            row['type'] = 'bar'
+            row['symbol'] = symbol
+            yield row
+        yield {'type': 'end', 'symbol': symbol, 'count': len(hist)}
+
+
+def attach_meta(quotes, metas):
+    """
+    把元数据（名称、币种、交易所）合并到成功的报价中；元数据尚未缓存时用占位值，
+    写入报价缓存的报价始终带 company_name 和 currency
+    """
+    for symbol, quote in quotes.items():
+        if quote.get('success'):
+            meta = metas.get(symbol) or fallback_meta(symbol)
+            quote.update(company_name=meta['name'], currency=meta['currency'], exchange=meta['exchange'])
+    return quotes
+
+
+def fetch_quote_with_meta(symbol):
+    """上游报价 + 缓存的元数据，一起写入报价缓存"""
+    quote = fetch_quote(symbol)
+    if quote.get('success'):
+        attach_meta({symbol: quote}, {symbol: symbol_meta.get(symbol)})
+    return quote
+
+
+def fetch_quotes_with_meta(symbols):
+    """批量上游报价 + 已缓存的元数据（批量路径不为缺失的元数据单独请求上游，由定时任务补齐）"""
+    return attach_meta(fetch_quotes(symbols), symbol_meta.cached(symbols))
+
+
+def get_current_price(symbol):
+    """获取当前股价（优先读取缓存）"""
+    return quote_cache.get(symbol, fetch_quote_with_meta)
+
+
+def get_batch_prices(symbols):
+    """批量获取当前股价（一次上游批量下载，yfinance内部并发拉取）"""
+    error = check_batch_symbols(symbols)
+    if error:
+        return error
+
+    try:
+        prices = quote_cache.get_many(symbols, fetch_quotes_with_meta)
+    except UpstreamUnavailable as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'批量获取股价失败: {str(e)}'
+        }
+
+    return {
+        'success': True,
+        'prices': prices,
+        'count': len(symbols)
+    }
+
+
+def get_historical_data(symbol, period, data_format='rows', interval='1d', max_points=None):
+    """获取历史股价数据（可按周期聚合、降采样，format=columnar 时返回并行数组）"""
+    from _bar_store import frame_to_columns, frame_to_rows
+    from _resample import downsample, resample_bars
+
+    try:
+        start_date = history_start(period)
+
+        hist = get_bar_history().get_bars(symbol, start_date)
+
+        if hist.empty:
+            return {
+                'success': False,
+                'error': f'无法获取 {symbol} 的历史数据'
+            }
+
+        # 按周期聚合并降采样到图表需要的点数
+        hist = downsample(resample_bars(hist, interval), 'Close', max_points)
+
+        # 转换数据格式（整列转换）
+        if data_format == 'columnar':
+            data = frame_to_columns(hist)
+        else:
+            data = frame_to_rows(hist)
+
+        return {
+            'success': True,
+            'symbol': symbol,
+            'period': period,
+            'format': 'columnar' if data_format == 'columnar' else 'rows',
+            'interval': interval,
+            'data': data,
+            'count': len(hist)
+        }
+
+    except UpstreamUnavailable as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'获取历史数据失败: {str(e)}'
+        }
+
+
+def get_close_matrix(symbols, period='1M', start=None, end=None):
+    """多只股票按同一日期轴对齐的收盘价矩阵（停牌日沿用前值）：closes[i][j] 为 dates[i] 当日 symbols[j] 的收盘价"""
+    from _close_matrix import matrix_to_rows
+
+    error = check_batch_symbols(symbols)
+    if error:
+        return error
+
+    try:
+        start_date = history_start(period, start)
+        end_date = date.fromisoformat(end) if end else date.today()
+        if start_date > end_date:
+            return {'success': False, 'error': 'start不能晚于end'}
+
+        dates, matrix, errors = get_close_arrays().matrix(symbols, start_date, end_date)
+        if len(errors) == len(symbols):
+            return {'success': False, 'error': '无法获取历史数据', 'errors': errors}
+
+        result = {
+            'success': True,
+            'symbols': symbols,
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'dates': dates.astype(str).tolist(),
+            'closes': matrix_to_rows(matrix),
+            'count': len(dates)
+        }
+        if errors:
+            result['errors'] = errors
+        return result
+
+    except UpstreamUnavailable as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'获取收盘价矩阵失败: {str(e)}'
+        }
@@ -0,0 +1,116 @@
+"""
+实时价格推送 - 进程内共享轮询
+同一函数实例中的SSE连接向同一个 PriceHub 订阅股票；轮询任务每个周期把所有被订阅的股票合并成一次批量获取
+（经报价缓存，缓存新鲜时不请求上游），价格变化的股票才推送给订阅了它的连接。
+同一实例上的多个连接看同一只股票时每个周期只获取一次；不同实例各自轮询，
+实例之间只通过报价缓存（配置Redis时）共享结果。没有订阅者时轮询任务退出
+"""
+
+import asyncio
+import os
+
+POLL_INTERVAL = float(os.environ.get('PRICE_STREAM_INTERVAL', '15'))
+QUEUE_SIZE = 32
+
+
+class PriceHub:
+    """
+    fetch_many: async (symbols) -> {symbol: quote}
+
+    每个订阅者是一个队列，队列元素为 {symbol: 报价增量}；
+    消费太慢导致队列满时丢弃最旧的一批（后续批次包含更新的价格）
+    """
+
+    def __init__(self, fetch_many, interval=POLL_INTERVAL):
+        self.fetch_many = fetch_many
+        self.interval = interval
+        self._subscribers = {}
+        self._latest = {}
+        self._task = None
+        self._wake = None
+        self.polls = 0
+
+    def subscribe(self, symbols):
+        """订阅股票，返回队列；已有价格的股票立即放入一批快照"""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        new_symbols = False
+        for symbol in symbols:
+            if symbol not in self._subscribers:
+                self._subscribers[symbol] = set()
+                new_symbols = True
+            self._subscribers[symbol].add(queue)
+
+        snapshot = {s: self._latest[s] for s in symbols if s in self._latest}
+        if snapshot:
+            queue.put_nowait(snapshot)
+
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        elif new_symbols:
+            # 新股票不必等到下一个周期
+            self._wake.set()
+        return queue
+
+    def unsubscribe(self, queue, symbols):
+        for symbol in symbols:
+            queues = self._subscribers.get(symbol)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[symbol]
+                self._latest.pop(symbol, None)
+
+    def _publish(self, changes):
+        batches = {}
+        for symbol, quote in changes.items():
+            for queue in self._subscribers.get(symbol, ()):
+                batches.setdefault(queue, {})[symbol] = quote
+
+        for queue, batch in batches.items():
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(batch)
+
+    async def poll_once(self):
+        symbols = sorted(self._subscribers)
+        if not symbols:
+            return
+        self.polls += 1
+        quotes = await self.fetch_many(symbols)
+
+        changes = {}
+        for symbol, quote in quotes.items():
+            if not quote.get('success') or symbol not in self._subscribers:
+                continue
+            delta = {
+                'price': quote['price'],
+                'previous_close': quote.get('previous_close'),
+                'timestamp': quote.get('timestamp')
+            }
+            last = self._latest.get(symbol)
+            if last is None or last['price'] != delta['price']:
+                self._latest[symbol] = delta
+                changes[symbol] = delta
+        if changes:
+            self._publish(changes)
+
+    async def _run(self):
+        while self._subscribers:
+            self._wake.clear()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Price stream poll error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            'symbols': len(self._subscribers),
+            'connections': len({q for queues in self._subscribers.values() for q in queues}),
+            'polls': self.polls
+        }
@@ -0,0 +1,185 @@
+"""
+报价缓存 - 进程内LRU + Redis共享缓存
+TTL随美股交易时段变化；过期数据在后台刷新期间继续返回（stale-while-revalidate）
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, time as dt_time
+from zoneinfo import ZoneInfo
+
+from _kv import redis_client, REDIS_AVAILABLE
+from _metrics import incr, timer
+from _scheduler import REFRESH, priority
+
+MARKET_TZ = ZoneInfo('America/New_York')
+MARKET_OPEN = dt_time(9, 30)
+MARKET_CLOSE = dt_time(16, 0)
+
+TTL_MARKET_OPEN = 60            # 交易时段内报价保鲜60秒
+TTL_MARKET_CLOSED = 30 * 60     # 休市时价格基本不变，保鲜30分钟
+STALE_TTL = 24 * 3600           # 过期后最多继续返回旧值24小时（同时后台刷新）
+LRU_SIZE = 512
+KEY_PREFIX = 'quote:'
+
+
+def is_market_open(now=None):
+    """美股常规交易时段（周一至周五 9:30-16:00 美东时间，不含节假日）"""
+    now = now or datetime.now(MARKET_TZ)
+    now = now.astimezone(MARKET_TZ)
+    if now.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def quote_ttl(now=None):
+    """根据交易时段返回报价的保鲜时间（秒）"""
+    return TTL_MARKET_OPEN if is_market_open(now) else TTL_MARKET_CLOSED
+
+
+class QuoteCache:
+    """按股票代码缓存报价，进程内LRU在前，Redis在后"""
+
+    def __init__(self, max_size=LRU_SIZE):
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def _lru_get(self, symbol):
+        with self._lock:
+            entry = self._lru.get(symbol)
+            if entry is not None:
+                self._lru.move_to_end(symbol)
+            return entry
+
+    def _lru_put(self, symbol, entry):
+        with self._lock:
+            self._lru[symbol] = entry
+            self._lru.move_to_end(symbol)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def get_entries(self, symbols):
+        """批量读取缓存条目：先查LRU，未命中的一次MGET查Redis"""
+        entries = {}
+        missing = []
+        for symbol in symbols:
+            entry = self._lru_get(symbol)
+            if entry is not None:
+                entries[symbol] = entry
+            else:
+                missing.append(symbol)
+
+        if missing and REDIS_AVAILABLE:
+            try:
+                with timer('store_seconds', store='quotes', backend='redis', op='mget'):
+                    values = redis_client.mget([KEY_PREFIX + s for s in missing])
+                for symbol, value in zip(missing, values):
+                    if value:
+                        entry = json.loads(value)
+                        entries[symbol] = entry
+                        self._lru_put(symbol, entry)
+            except Exception as e:
+                print(f"Redis quote cache GET error: {e}")
+
+        return entries
+
+    def put_many(self, quotes):
+        """写入成功的报价（失败结果不缓存）"""
+        now = time.time()
+        ttl = quote_ttl()
+        entries = {}
+        for symbol, quote in quotes.items():
+            if quote.get('success'):
+                entries[symbol] = {'quote': quote, 'fetched_at': now, 'ttl': ttl}
+                self._lru_put(symbol, entries[symbol])
+
+        if entries and REDIS_AVAILABLE:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for symbol, entry in entries.items():
+                    pipe.set(KEY_PREFIX + symbol, json.dumps(entry), ex=STALE_TTL)
+                with timer('store_seconds', store='quotes', backend='redis', op='set_many'):
+                    pipe.execute()
+            except Exception as e:
+                print(f"Redis quote cache SET error: {e}")
+
+    def get(self, symbol, fetch):
+        """获取单只股票报价，fetch(symbol) 为上游获取函数"""
+        return self.get_many([symbol], lambda symbols: {s: fetch(s) for s in symbols})[symbol]
+
+    def lookup(self, symbols):
+        """
+        按缓存状态分类，返回 (quotes, stale, missing)
+
+        新鲜条目和过期但未超过STALE_TTL的条目都放入quotes，后者同时列入stale；
+        没有缓存或已超过STALE_TTL的列入missing
+        """
+        now = time.time()
+        entries = self.get_entries(symbols)
+
+        quotes = {}
+        stale = []
+        missing = []
+        for symbol in symbols:
+            entry = entries.get(symbol)
+            if entry is None:
+                missing.append(symbol)
+                continue
+
+            age = now - entry['fetched_at']
+            if age < entry['ttl']:
+                quotes[symbol] = entry['quote']
+            elif age < STALE_TTL:
+                quotes[symbol] = entry['quote']
+                stale.append(symbol)
+            else:
+                missing.append(symbol)
+
+        incr('cache_requests_total', len(quotes) - len(stale), cache='quote', result='hit')
+        incr('cache_requests_total', len(stale), cache='quote', result='stale')
+        incr('cache_requests_total', len(missing), cache='quote', result='miss')
+        return quotes, stale, missing
+
+    def get_many(self, symbols, fetch_many):
+        """
+        批量获取报价，fetch_many(symbols) 返回 {symbol: quote}
+
+        新鲜条目直接返回；过期但未超过STALE_TTL的条目先返回旧值，
+        并在后台线程中刷新；其余的同步向上游获取。
+        """
+        quotes, stale, missing = self.lookup(symbols)
+
+        if stale:
+            self.refresh_async(stale, fetch_many)
+
+        if missing:
+            fetched = fetch_many(missing)
+            self.put_many(fetched)
+            quotes.update(fetched)
+
+        return quotes
+
+    def refresh_async(self, symbols, fetch_many):
+        """后台刷新过期报价，同一股票同时只有一个刷新任务"""
+        with self._lock:
+            symbols = [s for s in symbols if s not in self._refreshing]
+            self._refreshing.update(symbols)
+        if not symbols:
+            return
+
+        def refresh():
+            try:
+                # 后台刷新排在用户请求之后
+                with priority(REFRESH):
+                    self.put_many(fetch_many(symbols))
+            except Exception as e:
+                print(f"Quote refresh error: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(symbols)
+
+        threading.Thread(target=refresh, daemon=True).start()
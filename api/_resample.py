@@ -0,0 +1,115 @@
+"""
+图表序列聚合与降采样
+按周/月/季/半年聚合日线，并用LTTB算法把序列压缩到图表能画出的点数
+"""
+
+import numpy as np
+
+INTERVALS = ('1d', '1w', '1mo', '1q', '6mo')
+MIN_POINTS = 3
+
+
+def interval_keys(index, interval):
+    """每个日期所属聚合区间的编号（相同编号的日期聚合为一个点）"""
+    if interval == '1w':
+        return index.to_period('W-FRI').asi8
+    months = index.year.to_numpy() * 12 + index.month.to_numpy() - 1
+    if interval == '1mo':
+        return months
+    if interval == '1q':
+        return months // 3
+    if interval == '6mo':
+        return months // 6
+    raise ValueError(f'不支持的interval: {interval}')
+
+
+def resample_bars(frame, interval):
+    """
+    OHLCV日线 -> 周期K线
+
+    开盘取首日、收盘取末日、最高/最低取极值、成交量求和；
+    每个点的日期为该区间内最后一个交易日
+    """
+    if interval == '1d' or frame.empty:
+        return frame
+
+    keys = interval_keys(frame.index, interval)
+    result = frame.groupby(keys).agg({
+        'Open': 'first',
+        'High': 'max',
+        'Low': 'min',
+        'Close': 'last',
+        'Volume': 'sum'
+    })
+    result.index = frame.index.to_series().groupby(keys).last().to_numpy()
+    result.index.name = frame.index.name
+    return result
+
+
+def resample_last(frame, interval):
+    """时间序列 -> 每个区间取最后一个值（适用于市值、现金等余额类序列）"""
+    if interval == '1d' or frame.empty:
+        return frame
+
+    keys = interval_keys(frame.index, interval)
+    last_positions = frame.reset_index(drop=True).groupby(keys).tail(1).index
+    return frame.iloc[last_positions]
+
+
+def lttb_indices(values, max_points):
+    """
+    Largest-Triangle-Three-Buckets 降采样
+
+    保留首尾两点，中间每个桶选出与前一选中点、后一桶均值构成三角形面积最大的点，
+    返回被选中点的下标
+    """
+    n = len(values)
+    if max_points >= n or max_points < MIN_POINTS:
+        return np.arange(n)
+
+    y = np.asarray(values, dtype=float)
+    x = np.arange(n, dtype=float)
+    every = (n - 2) / (max_points - 2)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(max_points - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample(frame, column, max_points):
+    """按某一列的形状把DataFrame降采样到最多max_points行"""
+    if not max_points or len(frame) <= max_points:
+        return frame
+    return frame.iloc[lttb_indices(frame[column].to_numpy(), max_points)]
+
+
+def parse_chart_params(query_params):
+    """解析 interval / max_points 查询参数"""
+    interval = query_params.get('interval', ['1d'])[0]
+    if interval not in INTERVALS:
+        raise ValueError(f'interval 必须是 {"|".join(INTERVALS)} 之一')
+
+    max_points = query_params.get('max_points', [None])[0]
+    max_points = int(max_points) if max_points else None
+    if max_points is not None and max_points < MIN_POINTS:
+        raise ValueError(f'max_points 不能小于 {MIN_POINTS}')
+
+    return interval, max_points
@@ -0,0 +1,204 @@
+"""
+风险收益指标
+把各股票和基准的日线收盘价对齐成价格矩阵，一次向量化计算波动率、滚动波动率、最大回撤、
+Beta、Sharpe/Sortino和相关系数矩阵；结果按 (股票集合, 基准, 日期, 参数) 缓存
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+DEFAULT_BENCHMARK = 'SPY'
+DEFAULT_WINDOW = 21
+MAX_FETCH_WORKERS = 8
+CACHE_SIZE = 64
+
+
+def price_matrix(symbols, start, load_closes):
+    """
+    并发读取收盘价并按交易日对齐（停牌沿用前值），返回 (DataFrame[日期 x 股票], missing)
+
+    读取失败或区间内没有收盘价的股票（退市、新上市、代码无效）不放进矩阵，
+    记录在 missing={symbol: 原因} 中，不影响其他股票
+    """
+    def load(symbol):
+        try:
+            return load_closes(symbol, start).dropna(), None
+        except Exception as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as pool:
+        results = list(pool.map(load, symbols))
+
+    available = []
+    closes = []
+    missing = {}
+    for symbol, (series, error) in zip(symbols, results):
+        if error is None and series.empty:
+            error = '区间内没有历史数据'
+        if error is not None:
+            missing[symbol] = error
+            continue
+        available.append(symbol)
+        closes.append(series)
+
+    if not closes:
+        return pd.DataFrame(), missing
+    prices = pd.concat(closes, axis=1, keys=available).sort_index().ffill()
+    # 从所有股票都有价格的第一天开始
+    return prices.dropna(), missing
+
+
+def rolling_std(returns, window):
+    """按列的滚动标准差（累加和实现，一次计算所有列）"""
+    n = returns.shape[0]
+    if n < window:
+        return np.full(returns.shape, np.nan)
+    zeros = np.zeros((1, returns.shape[1]))
+    s1 = np.vstack([zeros, np.cumsum(returns, axis=0)])
+    s2 = np.vstack([zeros, np.cumsum(returns ** 2, axis=0)])
+    total = s1[window:] - s1[:-window]
+    squares = s2[window:] - s2[:-window]
+    variance = np.maximum((squares - total ** 2 / window) / (window - 1), 0.0)
+    result = np.full(returns.shape, np.nan)
+    result[window - 1:] = np.sqrt(variance)
+    return result
+
+
+def column_metrics(prices, returns, benchmark_returns, window, risk_free):
+    """对价格矩阵的每一列计算指标，返回 {指标名: 数组}"""
+    daily_rf = risk_free / TRADING_DAYS
+    excess = returns - daily_rf
+
+    std = returns.std(axis=0, ddof=1)
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2, axis=0))
+    mean_excess = excess.mean(axis=0)
+
+    bench = benchmark_returns - benchmark_returns.mean()
+    bench_var = bench @ bench / (len(bench) - 1)
+    covariance = (returns - returns.mean(axis=0)).T @ bench / (len(bench) - 1)
+
+    drawdown = prices / np.maximum.accumulate(prices, axis=0) - 1.0
+    rolling = rolling_std(returns, window) * np.sqrt(TRADING_DAYS)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'total_return': prices[-1] / prices[0] - 1.0,
+            'volatility': std * np.sqrt(TRADING_DAYS),
+            'rolling_volatility': rolling[-1],
+            'max_drawdown': drawdown.min(axis=0),
+            'beta': covariance / bench_var if bench_var > 0 else np.full(returns.shape[1], np.nan),
+            'sharpe': mean_excess / std * np.sqrt(TRADING_DAYS),
+            'sortino': mean_excess / downside * np.sqrt(TRADING_DAYS)
+        }
+
+
+def _clean(value):
+    """numpy数值 -> 可JSON序列化的float（NaN/Inf -> None）"""
+    value = float(value)
+    return round(value, 6) if np.isfinite(value) else None
+
+
+class RiskEngine:
+    """
+    load_closes(symbol, start) 返回以日期为索引的收盘价Series
+    """
+
+    def __init__(self, load_closes, max_size=CACHE_SIZE):
+        self.load_closes = load_closes
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _matrix(self, symbols, benchmark, days):
+        """价格矩阵和收益率矩阵（同一天内按股票集合缓存）"""
+        key = (tuple(sorted(symbols)), benchmark, days, date.today())
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        columns = sorted(set(symbols)) + ([benchmark] if benchmark not in symbols else [])
+        start = date.today() - timedelta(days=days)
+        prices, missing = price_matrix(columns, start, self.load_closes)
+        if benchmark in missing:
+            raise ValueError(f'无法获取基准 {benchmark} 的历史数据: {missing[benchmark]}')
+        values = prices.to_numpy(dtype=float)
+        cached = {
+            'symbols': list(prices.columns),
+            'missing': missing,
+            'dates': prices.index,
+            'prices': values,
+            'returns': values[1:] / values[:-1] - 1.0,
+            'metrics': {}
+        }
+
+        with self._lock:
+            self._cache[key] = cached
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return cached
+
+    def compute(self, symbols, benchmark=DEFAULT_BENCHMARK, days=365, window=DEFAULT_WINDOW,
+                risk_free=0.0, holdings=None):
+        """
+        计算各股票（含基准）的指标、相关系数矩阵；
+        holdings={symbol: 股数} 时按最新收盘价的市值加权，同时计算组合指标
+        """
+        matrix = self._matrix(symbols, benchmark, days)
+        columns = matrix['symbols']
+        prices = matrix['prices']
+        returns = matrix['returns']
+        if returns.shape[0] < 2:
+            raise ValueError('历史数据不足，无法计算风险指标')
+
+        bench_returns = returns[:, columns.index(benchmark)]
+
+        metrics_key = (window, risk_free)
+        cached = matrix['metrics'].get(metrics_key)
+        if cached is None:
+            metrics = column_metrics(prices, returns, bench_returns, window, risk_free)
+            with np.errstate(invalid='ignore'):
+                correlation = np.atleast_2d(np.corrcoef(returns, rowvar=False))
+            cached = {
+                'symbols': {
+                    symbol: {name: _clean(values[i]) for name, values in metrics.items()}
+                    for i, symbol in enumerate(columns)
+                },
+                'correlation': [[_clean(v) for v in row] for row in correlation]
+            }
+            matrix['metrics'][metrics_key] = cached
+
+        result = {
+            'benchmark': benchmark,
+            'start': matrix['dates'][0].strftime('%Y-%m-%d'),
+            'end': matrix['dates'][-1].strftime('%Y-%m-%d'),
+            'observations': int(returns.shape[0]),
+            'window': window,
+            'columns': columns,
+            'symbols': cached['symbols'],
+            'correlation': cached['correlation'],
+            # 没有历史数据、未参与计算的股票
+            'missing': matrix['missing']
+        }
+
+        if holdings:
+            w = np.array([holdings.get(symbol, 0.0) for symbol in columns], dtype=float) * prices[-1]
+            if w.sum() > 0:
+                w = w / w.sum()
+                # 按权重每日再平衡的组合净值
+                portfolio_returns = returns @ w
+                portfolio_prices = np.concatenate([[1.0], np.cumprod(1.0 + portfolio_returns)])
+                metrics = column_metrics(portfolio_prices[:, None], portfolio_returns[:, None],
+                                         bench_returns, window, risk_free)
+                result['portfolio'] = {name: _clean(values[0]) for name, values in metrics.items()}
+                result['weights'] = {symbol: _clean(w[i]) for i, symbol in enumerate(columns) if w[i] > 0}
+
+        return result
@@ -0,0 +1,244 @@
+"""
+上游请求调度 - 令牌桶限速 + 优先级排队 + 指数退避 + 熔断
+所有上游调用经过同一个调度器，在不触发上游封禁的前提下尽量提高吞吐
+
+优先级（数字越小越优先）: 用户请求的报价 > 后台刷新 > 历史数据回填
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from _metrics import incr, observe, timer
+
+INTERACTIVE = 0
+REFRESH = 1
+BACKFILL = 2
+
+PRIORITY_NAMES = {
+    INTERACTIVE: 'interactive',
+    REFRESH: 'refresh',
+    BACKFILL: 'backfill',
+}
+
+# 各优先级最多排队等待的时间（秒），超过后放弃
+MAX_WAIT = {
+    INTERACTIVE: 10.0,
+    REFRESH: 30.0,
+    BACKFILL: 30.0,
+}
+
+# 调用方可以用 with priority(...) 覆盖上游函数的默认优先级（后台任务用）
+current_priority = ContextVar('current_priority', default=None)
+
+
+@contextmanager
+def priority(level):
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class UpstreamUnavailable(Exception):
+    """上游限流、熔断或排队超时"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(error):
+    """上游限流错误（yfinance的YFRateLimitError或HTTP 429）"""
+    text = str(error)
+    return type(error).__name__ == 'YFRateLimitError' or '429' in text or 'Too Many Requests' in text
+
+
+def is_retryable(error):
+    """限流和网络错误可以重试；其余错误（如股票代码无效）直接抛出"""
+    return is_rate_limited(error) or isinstance(error, (ConnectionError, TimeoutError))
+
+
+class TokenBucket:
+    """令牌桶（由调度器加锁调用）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, cost=1):
+        """取到令牌返回0，否则返回还需等待的秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return max(self.updated - now, 0) + (cost - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        """被上游限流后清空令牌，seconds秒后才重新开始补充"""
+        self.tokens = 0
+        self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，reset_timeout秒后放行一个试探请求"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def check(self):
+        """
+        熔断中抛出 UpstreamUnavailable；半开状态下第一个调用方取得试探资格并返回True，
+        调用方必须在结束时调用 record_success / record_failure 或 release_probe
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                raise UpstreamUnavailable('上游暂时不可用（熔断中），请稍后重试', self.reset_timeout - elapsed)
+            if self._probing:
+                raise UpstreamUnavailable('上游暂时不可用（恢复检测中），请稍后重试', 1.0)
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        """试探请求没有得到上游结果（排队超时、调用方异常等）时放弃试探资格，让下一个请求试探"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class FetchScheduler:
+    """
+    单个上游的调度器
+
+    调用方线程按优先级排队，轮到自己且有令牌时在本线程执行请求；
+    限流/网络错误按带抖动的指数退避重试，并暂停令牌补充
+    """
+
+    def __init__(self, name, rate, burst, max_retries=3, base_delay=1.0, max_delay=30.0, breaker=None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+
+    def backoff_delay(self, attempt):
+        """第attempt次重试前的等待时间（指数增长，±50%抖动）"""
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    def _acquire(self, level, cost, deadline):
+        ticket = (level, next(self._seq))
+        cost = min(cost, self.bucket.capacity)
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == ticket:
+                        wait = self.bucket.try_take(cost)
+                        if wait == 0:
+                            return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise UpstreamUnavailable(f'{self.name} 请求排队超时，请稍后重试', wait)
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def call(self, fn, *args, priority=INTERACTIVE, cost=1, **kwargs):
+        """按调度执行 fn(*args, **kwargs)；with priority(...) 设置的优先级优先于参数"""
+        level = current_priority.get()
+        if level is None:
+            level = priority
+        deadline = time.monotonic() + MAX_WAIT[level]
+
+        labels = {'provider': self.name, 'priority': PRIORITY_NAMES[level]}
+        for attempt in range(self.max_retries + 1):
+            probing = self.breaker.check()
+            try:
+                waited = time.perf_counter()
+                self._acquire(level, cost, deadline)
+                observe('upstream_wait_seconds', time.perf_counter() - waited, **labels)
+                try:
+                    with timer('upstream_seconds', **labels):
+                        result = fn(*args, **kwargs)
+                except Exception as e:
+                    incr('upstream_errors_total', provider=self.name,
+                         kind='rate_limited' if is_rate_limited(e) else 'retryable' if is_retryable(e) else 'other')
+                    if not is_retryable(e):
+                        # 上游有响应，只是请求本身有问题
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+
+                    delay = self.backoff_delay(attempt)
+                    if is_rate_limited(e):
+                        with self._cond:
+                            self.bucket.pause(delay)
+                    if attempt == self.max_retries or time.monotonic() + delay > deadline:
+                        raise UpstreamUnavailable(f'{self.name} 请求被限流或失败，请稍后重试', delay) from e
+                    time.sleep(delay)
+                else:
+                    self.breaker.record_success()
+                    return result
+            finally:
+                # 排队超时等没有记录结果就离开时放弃试探资格，否则半开状态会一直拒绝请求
+                if probing:
+                    self.breaker.release_probe()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'name': self.name,
+                'queued': len(self._queue),
+                'tokens': round(self.bucket.tokens, 2),
+                'breaker': self.breaker.state,
+                'failures': self.breaker.failures
+            }
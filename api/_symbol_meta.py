@@ -0,0 +1,149 @@
+"""
+股票元数据 - 名称、币种、交易所、行业
+这些信息几乎不变，与实时报价分开缓存：进程内LRU + Redis（key: meta:{symbol}），保鲜以天计；
+只有元数据缺失或过期时才读取完整的 ticker.info，报价刷新不再为此付出代价
+"""
+
+import contextvars
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from _kv import redis_client, REDIS_AVAILABLE
+from _metrics import incr, timer
+from _upstream import fetch_profile
+
+META_TTL = 7 * 24 * 3600        # 元数据保鲜7天
+FALLBACK_TTL = 3600             # 获取失败时的占位数据保留1小时，避免反复请求
+LRU_SIZE = 2048
+KEY_PREFIX = 'meta:'
+MAX_FETCH_WORKERS = 4
+# 合法的股票代码（如 BRK.B、^GSPC、EURUSD=X）；股票代码会作为日线和收盘价数组的文件名
+SYMBOL_PATTERN = re.compile(r'[A-Z0-9.^=-]{1,15}')
+
+
+def check_symbol(symbol):
+    """返回去空白、转大写后的股票代码，不合法时抛出 ValueError"""
+    normalized = str(symbol).strip().upper()
+    if not SYMBOL_PATTERN.fullmatch(normalized):
+        raise ValueError(f'无效的股票代码: {str(symbol)[:32]}')
+    return normalized
+
+
+def fallback_meta(symbol):
+    return {'symbol': symbol, 'name': symbol, 'currency': 'USD', 'exchange': None, 'sector': None}
+
+
+class SymbolMetaStore:
+    """fetch(symbol) 返回 {'symbol', 'name', 'currency', 'exchange', 'sector'}"""
+
+    def __init__(self, fetch, max_size=LRU_SIZE):
+        self.fetch = fetch
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lru_get(self, symbol):
+        with self._lock:
+            entry = self._lru.get(symbol)
+            if entry is None:
+                return None
+            if time.time() >= entry['expires_at']:
+                del self._lru[symbol]
+                return None
+            self._lru.move_to_end(symbol)
+            return entry
+
+    def _lru_put(self, symbol, entry):
+        with self._lock:
+            self._lru[symbol] = entry
+            self._lru.move_to_end(symbol)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def cached(self, symbols):
+        """只读缓存：先查LRU，未命中的一次MGET查Redis；返回 {symbol: meta}"""
+        result = {}
+        missing = []
+        for symbol in symbols:
+            entry = self._lru_get(symbol)
+            if entry is not None:
+                result[symbol] = entry['meta']
+            else:
+                missing.append(symbol)
+
+        if missing and REDIS_AVAILABLE:
+            try:
+                with timer('store_seconds', store='meta', backend='redis', op='mget'):
+                    values = redis_client.mget([KEY_PREFIX + s for s in missing])
+                for symbol, value in zip(missing, values):
+                    if value:
+                        entry = json.loads(value)
+                        result[symbol] = entry['meta']
+                        self._lru_put(symbol, entry)
+            except Exception as e:
+                print(f"Redis meta cache GET error: {e}")
+
+        incr('cache_requests_total', len(result), cache='meta', result='hit')
+        incr('cache_requests_total', len(symbols) - len(result), cache='meta', result='miss')
+        return result
+
+    def put_many(self, metas, ttl=META_TTL):
+        expires_at = time.time() + ttl
+        entries = {symbol: {'meta': meta, 'expires_at': expires_at} for symbol, meta in metas.items()}
+        for symbol, entry in entries.items():
+            self._lru_put(symbol, entry)
+
+        if entries and REDIS_AVAILABLE:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for symbol, entry in entries.items():
+                    pipe.set(KEY_PREFIX + symbol, json.dumps(entry), ex=ttl)
+                pipe.execute()
+            except Exception as e:
+                print(f"Redis meta cache SET error: {e}")
+
+    def _fetch_one(self, symbol):
+        try:
+            return self.fetch(symbol), None
+        except Exception as e:
+            return fallback_meta(symbol), e
+
+    def _fetch_missing(self, symbols):
+        """并发向上游读取元数据并写回缓存；失败的股票返回占位数据（短时间缓存）"""
+        with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as pool:
+            # 每个任务带上调用方的上下文，with priority(...) 设置的优先级在线程中同样生效
+            futures = [pool.submit(contextvars.copy_context().run, self._fetch_one, s) for s in symbols]
+            fetched = {s: future.result() for s, future in zip(symbols, futures)}
+
+        self.put_many({s: meta for s, (meta, error) in fetched.items() if error is None})
+        failed = {s: meta for s, (meta, error) in fetched.items() if error is not None}
+        if failed:
+            self.put_many(failed, ttl=FALLBACK_TTL)
+        return {s: meta for s, (meta, _) in fetched.items()}
+
+    def get_many(self, symbols):
+        """批量获取元数据：一次读缓存，未命中的才请求上游"""
+        result = self.cached(symbols)
+        missing = [s for s in symbols if s not in result]
+        if missing:
+            result.update(self._fetch_missing(missing))
+        return result
+
+    def get(self, symbol):
+        return self.get_many([symbol])[symbol]
+
+    def populate(self, symbols):
+        """批量预热（定时任务用），返回新获取的股票数"""
+        cached = self.cached(symbols)
+        missing = [s for s in symbols if s not in cached]
+        if missing:
+            self._fetch_missing(missing)
+        return len(missing)
+
+
+# 模块级元数据缓存，热启动时跨请求复用
+symbol_meta = SymbolMetaStore(fetch_profile)
@@ -0,0 +1,119 @@
+"""
+投资组合价值时间序列
+用pandas向量化回放交易记录，计算每日持仓、现金和市值
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+CASH_TYPES = ('cash_deposit', 'cash_withdrawal')
+MAX_FETCH_WORKERS = 8
+
+
+def transactions_frame(transactions):
+    """
+    交易记录 -> DataFrame[date, symbol, share_delta, cash_delta, deposit_delta]
+
+    买入: 股数增加，现金减少 成交额+手续费
+    卖出: 股数减少，现金增加 成交额-手续费
+    资金转入/转出: amount 已带正负号
+    """
+    frame = pd.DataFrame(transactions)
+    if frame.empty:
+        return pd.DataFrame(columns=['date', 'symbol', 'share_delta', 'cash_delta', 'deposit_delta'])
+
+    for column in ('stockSymbol', 'shares', 'price', 'totalFee', 'totalValue', 'amount'):
+        if column not in frame:
+            frame[column] = np.nan
+
+    tx_type = frame['type'].astype(str)
+    shares = pd.to_numeric(frame['shares'], errors='coerce').fillna(0.0)
+    price = pd.to_numeric(frame['price'], errors='coerce').fillna(0.0)
+    fee = pd.to_numeric(frame['totalFee'], errors='coerce').fillna(0.0)
+    value = pd.to_numeric(frame['totalValue'], errors='coerce').fillna(shares * price)
+    amount = pd.to_numeric(frame['amount'], errors='coerce').fillna(0.0)
+
+    is_buy = (tx_type == 'buy').to_numpy()
+    is_sell = (tx_type == 'sell').to_numpy()
+    is_cash = tx_type.isin(CASH_TYPES).to_numpy()
+
+    dates = pd.to_datetime(frame['date'], format='ISO8601', errors='coerce', utc=True).dt.tz_localize(None).dt.normalize()
+
+    result = pd.DataFrame({
+        'date': dates,
+        'symbol': frame['stockSymbol'].fillna('').astype(str).str.upper(),
+        'share_delta': np.select([is_buy, is_sell], [shares, -shares], 0.0),
+        'cash_delta': np.select([is_buy, is_sell, is_cash], [-(value + fee), value - fee, amount], 0.0),
+        'deposit_delta': np.where(is_cash, amount, 0.0)
+    })
+    return result.dropna(subset=['date'])
+
+
+def compute_timeseries(transactions, load_closes, start=None, end=None):
+    """
+    计算投资组合每日价值
+
+    load_closes(symbol, start) 返回以日期为索引的收盘价Series
+    返回 DataFrame[market_value, cash, total_value, net_deposits]（按交易日索引）
+    """
+    tx = transactions_frame(transactions)
+    if tx.empty:
+        return pd.DataFrame(columns=['market_value', 'cash', 'total_value', 'net_deposits'])
+
+    first_date = tx['date'].min()
+    end = pd.Timestamp(end or date.today())
+    calendar = pd.bdate_range(first_date, end)
+    # 交易日期可能落在周末，先并入日历再累加，最后只保留工作日
+    full_calendar = calendar.union(pd.DatetimeIndex(tx['date'].unique()))
+
+    stock_tx = tx[tx['symbol'] != '']
+    if stock_tx.empty:
+        holdings = pd.DataFrame(index=calendar)
+    else:
+        holdings = (
+            stock_tx.pivot_table(index='date', columns='symbol', values='share_delta', aggfunc='sum')
+            .reindex(full_calendar, fill_value=0.0)
+            .fillna(0.0)
+            .cumsum()
+            .reindex(calendar)
+        )
+
+    daily = tx.groupby('date')[['cash_delta', 'deposit_delta']].sum().reindex(full_calendar, fill_value=0.0)
+    cash = daily['cash_delta'].cumsum().reindex(calendar)
+    net_deposits = daily['deposit_delta'].cumsum().reindex(calendar)
+
+    symbols = list(holdings.columns)
+    if symbols:
+        with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as pool:
+            closes = list(pool.map(lambda s: load_closes(s, first_date.date()), symbols))
+        # 收盘价对齐到日历：停牌/节假日沿用前值，首根K线之前沿用首个价格
+        prices = pd.concat(closes, axis=1, keys=symbols)
+        prices = prices.reindex(prices.index.union(calendar)).ffill().bfill().reindex(calendar).fillna(0.0)
+        market_value = (holdings.to_numpy() * prices[symbols].to_numpy()).sum(axis=1)
+    else:
+        market_value = np.zeros(len(calendar))
+
+    result = pd.DataFrame({
+        'market_value': market_value,
+        'cash': cash.to_numpy(),
+        'net_deposits': net_deposits.to_numpy()
+    }, index=calendar)
+    result['total_value'] = result['market_value'] + result['cash']
+
+    if start is not None:
+        result = result[result.index >= pd.Timestamp(start)]
+    return result
+
+
+def timeseries_to_columns(result):
+    """时间序列 -> 并行数组（便于前端直接绘图）"""
+    return {
+        'dates': result.index.strftime('%Y-%m-%d').tolist(),
+        'market_value': result['market_value'].round(2).tolist(),
+        'cash': result['cash'].round(2).tolist(),
+        'total_value': result['total_value'].round(2).tolist(),
+        'net_deposits': result['net_deposits'].round(2).tolist()
+    }
@@ -0,0 +1,348 @@
+"""
+交易记录二级索引 - 按日期、股票、类型筛选和游标分页
+索引是列式的小数组（日期、股票、类型、ID）加上按 (日期, 位置) 排序的位置列表：
+全部交易一个列表，每只股票、每种类型各一个列表。查询选最小的候选列表，
+日期区间和游标用二分查找定位，只遍历本页需要的记录，再按位置读取命中的交易所在的分段
+
+索引随文档版本增量更新：只追加交易时从上次的位置继续构建，整体重写（tx_epoch变化）时重建；
+进程内LRU在前，Redis在后（key: txindex:{user_id}，列表，每次追加只RPUSH新位置的列，
+条目过多时合并为一条）；排序列表由列在进程内构建
+"""
+
+import base64
+import heapq
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+
+from _kv import redis_client, REDIS_AVAILABLE
+from _codec import encode, decode
+from _portfolio_store import TX_SEGMENTS
+
+KEY_PREFIX = 'txindex:'
+LRU_SIZE = 32
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+INSERT_THRESHOLD = 64
+# Redis列表中的条目超过该数量时合并为一条
+MAX_CHUNKS = 64
+
+
+class TransactionIndex:
+    """
+    列（按位置排列）: dates, symbols, types, ids
+    有序位置列表（按 (日期, 位置) 升序）: order（全部）, by_symbol[股票], by_type[类型]
+    """
+
+    def __init__(self, epoch=None):
+        self.epoch = epoch
+        self.count = 0
+        self.dates = []
+        self.symbols = []
+        self.types = []
+        self.ids = []
+        self.id_set = set()
+        self.order = []
+        self.by_symbol = {}
+        self.by_type = {}
+        # 已从Redis列表读取或写入的条目数
+        self.chunks = 0
+        self.lock = threading.RLock()
+
+    def _key(self, position):
+        return self.dates[position], position
+
+    def _append_columns(self, dates, symbols, types, ids):
+        with self.lock:
+            start = self.count
+            self.dates.extend(dates)
+            self.symbols.extend(symbols)
+            self.types.extend(types)
+            self.ids.extend(ids)
+            self.id_set.update(i for i in ids if i is not None)
+            self.count += len(dates)
+
+            if self.count - start > INSERT_THRESHOLD:
+                self._rebuild()
+                return
+
+            # 少量新交易（通常日期最新）逐个插入到各有序列表
+            for position in range(start, self.count):
+                insort(self.order, position, key=self._key)
+                insort(self.by_symbol.setdefault(self.symbols[position], []), position, key=self._key)
+                insort(self.by_type.setdefault(self.types[position], []), position, key=self._key)
+
+    def _rebuild(self):
+        self.order = sorted(range(self.count), key=self._key)
+        self.by_symbol = {}
+        self.by_type = {}
+        for position in self.order:
+            self.by_symbol.setdefault(self.symbols[position], []).append(position)
+            self.by_type.setdefault(self.types[position], []).append(position)
+
+    def extend(self, transactions):
+        """追加交易记录（位置从count开始）"""
+        self._append_columns(
+            [str(t.get('date') or '') for t in transactions],
+            [str(t.get('stockSymbol') or '').upper() for t in transactions],
+            [str(t.get('type') or '') for t in transactions],
+            [t.get('id') for t in transactions]
+        )
+
+    def to_chunk(self, start):
+        """位置 [start, count) 的列，作为Redis列表的一个条目"""
+        return {
+            'epoch': self.epoch,
+            'start': start,
+            'dates': self.dates[start:],
+            'symbols': self.symbols[start:],
+            'types': self.types[start:],
+            'ids': self.ids[start:]
+        }
+
+    def apply_chunk(self, chunk):
+        """追加一个条目中尚未包含的位置；条目与当前位置之间有空缺时返回False"""
+        skip = self.count - chunk['start']
+        if skip < 0:
+            return False
+        if skip < len(chunk['dates']):
+            self._append_columns(
+                chunk['dates'][skip:], chunk['symbols'][skip:], chunk['types'][skip:], chunk['ids'][skip:]
+            )
+        return True
+
+    def _bounds(self, positions, date_from, date_to):
+        """有序位置列表中日期在 [date_from, date_to] 内的下标范围"""
+        lo = bisect_left(positions, (date_from, -1), key=self._key) if date_from else 0
+        # 日期带时间部分，比date_to当天的任何时间都大的键
+        hi = bisect_left(positions, (date_to + '\uffff', -1), key=self._key) if date_to else len(positions)
+        return lo, max(lo, hi)
+
+    def query(self, symbols=None, types=None, date_from=None, date_to=None, descending=True,
+              after=None, limit=DEFAULT_LIMIT):
+        """
+        返回 (本页位置列表, 下一页游标键, 命中总数)
+
+        after 为上一页最后一条的 (日期, 位置)，按排序方向取其后的记录；
+        只按股票或只按类型筛选时耗时与总条数无关，两者同时筛选时遍历较小的候选集
+        """
+        with self.lock:
+            if symbols and types:
+                symbol_size = sum(len(self.by_symbol.get(s, ())) for s in symbols)
+                type_size = sum(len(self.by_type.get(t, ())) for t in types)
+                if symbol_size <= type_size:
+                    lists = [self.by_symbol.get(s, []) for s in symbols]
+                    residual = lambda p: self.types[p] in types
+                else:
+                    lists = [self.by_type.get(t, []) for t in types]
+                    residual = lambda p: self.symbols[p] in symbols
+            elif symbols:
+                lists, residual = [self.by_symbol.get(s, []) for s in symbols], None
+            elif types:
+                lists, residual = [self.by_type.get(t, []) for t in types], None
+            else:
+                lists, residual = [self.order], None
+
+            ranges = []
+            total = 0
+            for positions in lists:
+                lo, hi = self._bounds(positions, date_from, date_to)
+                if residual is None:
+                    total += hi - lo
+                else:
+                    total += sum(1 for i in range(lo, hi) if residual(positions[i]))
+                # 游标：升序取大于after的键，降序取小于after的键
+                if after is not None:
+                    if descending:
+                        hi = min(hi, bisect_left(positions, after, key=self._key))
+                    else:
+                        lo = max(lo, bisect_right(positions, after, key=self._key))
+                if lo < hi:
+                    ranges.append((positions, lo, hi))
+
+            streams = [iter_range(positions, lo, hi, descending) for positions, lo, hi in ranges]
+            merged = heapq.merge(*streams, key=self._key, reverse=descending)
+
+            matched = []
+            for position in merged:
+                if residual is None or residual(position):
+                    matched.append(position)
+                    if len(matched) > limit:
+                        break
+
+            page = matched[:limit]
+            next_key = self._key(page[-1]) if len(matched) > limit else None
+            return page, next_key, total
+
+
+def iter_range(positions, lo, hi, descending):
+    """按方向逐个生成 positions[lo:hi]，不复制列表"""
+    indices = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+    for i in indices:
+        yield positions[i]
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, position = json.loads(base64.urlsafe_b64decode(padded))
+        return str(date), int(position)
+    except Exception:
+        raise ValueError('无效的cursor参数')
+
+
+class TransactionQuery:
+    """在 PortfolioStore 之上提供基于索引的交易查询"""
+
+    def __init__(self, store, max_size=LRU_SIZE):
+        self.store = store
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lru_get(self, user_id):
+        with self._lock:
+            index = self._lru.get(user_id)
+            if index is not None:
+                self._lru.move_to_end(user_id)
+            return index
+
+    def _lru_put(self, user_id, index):
+        with self._lock:
+            self._lru[user_id] = index
+            self._lru.move_to_end(user_id)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def _pull(self, user_id, index):
+        """读取Redis列表中 index.chunks 之后的条目（其他实例追加的部分）"""
+        if not REDIS_AVAILABLE:
+            return
+        try:
+            for raw in redis_client.lrange(KEY_PREFIX + user_id, index.chunks, -1):
+                chunk = decode(raw)
+                if chunk['epoch'] != index.epoch or not index.apply_chunk(chunk):
+                    # 列表中有旧版本或不连续的条目，下次写入时整体重写
+                    index.chunks = 0
+                    return
+                index.chunks += 1
+        except Exception as e:
+            print(f"Redis txindex GET error: {e}")
+
+    def _push(self, user_id, index, start):
+        """把位置 [start, count) 追加到Redis列表；首次写入或条目过多时整体重写为一条"""
+        if not REDIS_AVAILABLE:
+            return
+        key = KEY_PREFIX + user_id
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            if index.chunks == 0 or index.chunks >= MAX_CHUNKS:
+                pipe.delete(key)
+                pipe.rpush(key, encode(index.to_chunk(0)))
+                index.chunks = 1
+            else:
+                pipe.rpush(key, encode(index.to_chunk(start)))
+                index.chunks += 1
+            pipe.execute()
+        except Exception as e:
+            print(f"Redis txindex SET error: {e}")
+
+    def get_index(self, user_id, head):
+        """返回与文档头一致的索引（必要时增量更新或重建）"""
+        epoch = head.get('tx_epoch')
+        count = head.get('tx_count', 0)
+
+        index = self._lru_get(user_id)
+        if index is None or index.epoch != epoch:
+            index = TransactionIndex(epoch)
+            self._lru_put(user_id, index)
+
+        # 同一epoch内只追加，索引可能比读到的文档头新（其他请求刚提交），直接使用
+        with index.lock:
+            if index.count < count:
+                self._pull(user_id, index)
+            if index.count < count:
+                start = index.count
+                index.extend(self.store.load_transactions_from(user_id, start, count))
+                self._push(user_id, index, start)
+        return index
+
+    def existing_ids(self, user_id):
+        """已有交易记录的ID集合（副本），用于导入去重"""
+        head = self.store.load_head(user_id)
+        if head is None:
+            return set()
+        if head.get('tx_storage') == TX_SEGMENTS:
+            index = self.get_index(user_id, head)
+            with index.lock:
+                return set(index.id_set)
+        transactions = (self.store.load(user_id) or {}).get('transactionHistory', [])
+        return {t.get('id') for t in transactions if t.get('id') is not None}
+
+    def appended(self, user_id, since, limit=DEFAULT_LIMIT):
+        """
+        按存储顺序读取位置 since 之后的交易记录（导入后只补齐页面副本中缺少的部分），
+        返回 {'data', 'next_since', 'total', 'version'}
+        """
+        if since < 0:
+            raise ValueError('since 不能为负数')
+        head = self.store.load_head(user_id)
+        if head is None:
+            return {'data': [], 'next_since': None, 'total': 0, 'version': 0}
+
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        if head.get('tx_storage') == TX_SEGMENTS:
+            count = head.get('tx_count', 0)
+            end = min(count, since + limit)
+            data = self.store.load_transactions_from(user_id, since, end) if since < end else []
+        else:
+            transactions = (self.store.load(user_id) or {}).get('transactionHistory', [])
+            count = len(transactions)
+            end = min(count, since + limit)
+            data = transactions[since:end]
+
+        return {
+            'data': data,
+            'next_since': end if end < count else None,
+            'total': count,
+            'version': head.get('version', 0)
+        }
+
+    def query(self, user_id, **filters):
+        """
+        查询交易记录，返回 {'data', 'next_cursor', 'total', 'version'}
+
+        filters: symbols, types, date_from, date_to, descending, cursor, limit
+        """
+        head = self.store.load_head(user_id)
+        if head is None:
+            return {'data': [], 'next_cursor': None, 'total': 0, 'version': 0}
+
+        cursor = filters.pop('cursor', None)
+        limit = max(1, min(int(filters.pop('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+
+        if head.get('tx_storage') == TX_SEGMENTS:
+            index = self.get_index(user_id, head)
+            positions, next_key, total = index.query(after=decode_cursor(cursor), limit=limit, **filters)
+            data = self.store.load_transactions(user_id, positions)
+        else:
+            # 旧格式文档没有分段，读取完整文档后在内存中建临时索引
+            transactions = (self.store.load(user_id) or {}).get('transactionHistory', [])
+            index = TransactionIndex()
+            index.extend(transactions)
+            positions, next_key, total = index.query(after=decode_cursor(cursor), limit=limit, **filters)
+            data = [transactions[p] for p in positions]
+
+        return {
+            'data': data,
+            'next_cursor': encode_cursor(next_key) if next_key else None,
+            'total': total,
+            'version': head.get('version', 0)
+        }
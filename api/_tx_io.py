@@ -0,0 +1,279 @@
+"""
+交易记录批量导入导出
+导出逐段读取、逐段编码成 CSV / NDJSON 块，任一时刻内存中只有一段交易记录；
+导入边读请求体边解析、校验，每攒够一批就追加写入（增量补丁，只改写最后一段），
+几十万条的券商历史不需要在服务端或浏览器中整体载入
+"""
+
+import csv
+import io
+import json
+import math
+import time
+from datetime import date
+
+from _portfolio_store import SEGMENT_SIZE
+from _symbol_meta import check_symbol
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+# CSV 的列（NDJSON 原样输出每条记录的全部字段）
+FIELDS = (
+    'id', 'date', 'type', 'stockSymbol', 'shares', 'price', 'feePerShare', 'totalFee',
+    'totalValue', 'realizedProfit', 'amount', 'note', 'description', 'timestamp'
+)
+NUMERIC_FIELDS = ('shares', 'price', 'feePerShare', 'totalFee', 'totalValue', 'realizedProfit', 'amount')
+STOCK_TYPES = ('buy', 'sell')
+CASH_TYPES = ('cash_deposit', 'cash_withdrawal')
+
+READ_CHUNK = 64 * 1024
+IMPORT_BATCH = 8 * SEGMENT_SIZE     # 每批写入的条数
+MAX_REPORTED_ERRORS = 100
+
+
+# ---- 导出 ----
+
+def matches(t, symbols=None, types=None, date_from=None, date_to=None):
+    """与 /api/transactions 查询相同的筛选条件"""
+    day = str(t.get('date') or '')[:10]
+    if symbols and str(t.get('stockSymbol') or '').upper() not in symbols:
+        return False
+    if types and str(t.get('type') or '') not in types:
+        return False
+    if date_from and day < date_from:
+        return False
+    if date_to and day > date_to:
+        return False
+    return True
+
+
+def iter_csv(batches):
+    """带BOM（Excel能正确识别UTF-8），第一块是表头，之后每段交易一块"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS, extrasaction='ignore', lineterminator='\n')
+    buffer.write('\ufeff')
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_ndjson(batches):
+    for batch in batches:
+        if batch:
+            yield ''.join(json.dumps(t, ensure_ascii=False) + '\n' for t in batch).encode()
+
+
+def iter_export(store, user_id, data_format, **filters):
+    """按格式生成导出内容的字节块"""
+    batches = (
+        [t for t in batch if matches(t, **filters)]
+        for batch in store.iter_transaction_batches(user_id)
+    )
+    if data_format == 'csv':
+        return iter_csv(batches)
+    return iter_ndjson(batches)
+
+
+# ---- 导入 ----
+
+def iter_body(rfile, headers):
+    """按块读取请求体：支持 Content-Length 和 Transfer-Encoding: chunked"""
+    if 'chunked' in (headers.get('Transfer-Encoding') or '').lower():
+        while True:
+            size = int(rfile.readline().split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                # 跳过可能存在的trailer，直到空行
+                while rfile.readline().strip():
+                    pass
+                return
+            remaining = size
+            while remaining:
+                data = rfile.read(min(READ_CHUNK, remaining))
+                if not data:
+                    raise ValueError('请求体不完整')
+                remaining -= len(data)
+                yield data
+            rfile.readline()
+    else:
+        remaining = int(headers.get('Content-Length') or 0)
+        while remaining:
+            data = rfile.read(min(READ_CHUNK, remaining))
+            if not data:
+                raise ValueError('请求体不完整')
+            remaining -= len(data)
+            yield data
+
+
+def iter_lines(chunks):
+    """字节块 -> 文本行（保留换行符，CSV引号内的换行由csv模块拼接）"""
+    pending = b''
+    first = True
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            text = line.decode('utf-8') + '\n'
+            if first:
+                text = text.lstrip('\ufeff')
+                first = False
+            yield text
+    if pending:
+        text = pending.decode('utf-8')
+        yield text.lstrip('\ufeff') if first else text
+
+
+def iter_ndjson_records(lines):
+    """生成 (行号, 记录或None, 错误)"""
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'JSON格式错误: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, '每行应为一个JSON对象'
+            continue
+        yield line_no, record, None
+
+
+def iter_csv_records(lines):
+    """生成 (行号, 记录, None)；空单元格视为没有该字段"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        record = {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip()}
+        if record:
+            yield reader.line_num, record, None
+
+
+def to_number(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+
+def normalize_id(value, fallback):
+    """页面用数字ID（删除按钮直接拼进onclick），能转成数字的ID保持数字"""
+    if value is None or value == '':
+        return fallback
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        number = to_number(value)
+        return int(number) if number.is_integer() else number
+    except ValueError:
+        return str(value)
+
+
+def validate(record, fallback_id):
+    """校验并规范化一条交易记录，返回 (交易, 错误信息)"""
+    t = dict(record)
+    kind = str(t.get('type') or '').strip()
+    if kind not in STOCK_TYPES + CASH_TYPES:
+        return None, f'不支持的交易类型: {kind or "(空)"}'
+    t['type'] = kind
+
+    raw_date = str(t.get('date') or '').strip()
+    try:
+        date.fromisoformat(raw_date[:10])
+    except ValueError:
+        return None, f'日期格式错误: {raw_date or "(空)"}'
+    # 只有日期时按页面的约定补上时间
+    t['date'] = raw_date + 'T12:00:00.000Z' if len(raw_date) == 10 else raw_date
+
+    for name in NUMERIC_FIELDS:
+        try:
+            value = to_number(t.get(name))
+        except (TypeError, ValueError):
+            return None, f'{name} 不是数字: {t.get(name)}'
+        if value is None:
+            t.pop(name, None)
+        else:
+            t[name] = value
+
+    if kind in STOCK_TYPES:
+        if not str(t.get('stockSymbol') or '').strip():
+            return None, '买入/卖出记录缺少 stockSymbol'
+        # 股票代码会用作日线缓存的文件名，不合法的代码会让整个组合的走势计算失败
+        try:
+            symbol = check_symbol(t['stockSymbol'])
+        except ValueError as e:
+            return None, str(e)
+        if t.get('shares', 0) <= 0:
+            return None, 'shares 必须大于0'
+        if t.get('price') is None or t['price'] < 0:
+            return None, 'price 必须是非负数'
+        t['stockSymbol'] = symbol
+        t.setdefault('totalFee', 0.0)
+        t.setdefault('totalValue', t['shares'] * t['price'])
+        t.setdefault('realizedProfit', 0.0)
+    else:
+        if not t.get('amount'):
+            return None, '资金记录缺少 amount'
+        # 页面中转出金额记为负数
+        t['amount'] = abs(t['amount']) if kind == 'cash_deposit' else -abs(t['amount'])
+
+    t['id'] = normalize_id(t.get('id'), fallback_id)
+    return t, None
+
+
+def import_transactions(store, user_id, records, existing_ids=None, batch_size=IMPORT_BATCH, dry_run=False):
+    """
+    校验并分批追加交易记录；不合法的行跳过并报告（最多报告 MAX_REPORTED_ERRORS 条）
+
+    records: (行号, 记录或None, 解析错误) 的迭代器
+    existing_ids: 已有交易记录的ID集合；ID已存在（或在本次导入中重复）的行不再写入，
+    计入 duplicates，重复导入同一文件不会产生重复记录
+    返回 {'imported', 'skipped', 'duplicates', 'errors', 'batches', 'version'}
+    只追加交易记录，不重新计算持仓和现金
+    """
+    seen = set(existing_ids or ())
+    # 没有ID的记录按导入时间生成数字ID（与页面的 Date.now() 同一量级，乘1000留出序号）
+    id_base = int(time.time() * 1000) * 1000
+    summary = {'imported': 0, 'skipped': 0, 'duplicates': 0, 'errors': [], 'batches': 0, 'version': None}
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            summary['version'] = store.apply_patch(
+                user_id, [{'op': 'add_transaction', 'transaction': t} for t in batch]
+            )
+            summary['batches'] += 1
+        summary['imported'] += len(batch)
+        batch.clear()
+
+    for line_no, record, error in records:
+        transaction = None
+        if error is None:
+            transaction, error = validate(record, id_base + summary['imported'] + len(batch))
+        if error is not None:
+            summary['skipped'] += 1
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append({'line': line_no, 'error': error})
+            continue
+        if transaction['id'] in seen:
+            summary['duplicates'] += 1
+            continue
+        seen.add(transaction['id'])
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return summary
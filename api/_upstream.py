@@ -0,0 +1,153 @@
+"""
+上游行情数据访问（yfinance）
+所有请求经过 yahoo 调度器限速、排队和重试（见 _scheduler）
+
+数据提供方默认是yfinance模块，可用 set_provider 替换为接口相同的实现（基准测试回放固定数据用）
+"""
+
+import os
+from datetime import datetime
+
+from _scheduler import BACKFILL, INTERACTIVE, FetchScheduler, UpstreamUnavailable
+
+# Yahoo没有公开的限额，默认每秒1个请求、最多突发5个
+yahoo = FetchScheduler(
+    'yahoo',
+    rate=float(os.environ.get('YAHOO_RATE_PER_SEC', '1')),
+    burst=int(os.environ.get('YAHOO_BURST', '5'))
+)
+
+
+_provider = None
+
+
+def get_provider():
+    """当前数据提供方（第一次使用时才导入yfinance）"""
+    global _provider
+    if _provider is None:
+        import yfinance
+        _provider = yfinance
+    return _provider
+
+
+def set_provider(provider):
+    """替换数据提供方：需提供 Ticker(symbol)（.info / .history）和 download(...)，参数同yfinance"""
+    global _provider
+    _provider = provider
+
+
+def fetch_history(symbol, start, end):
+    """从上游获取 [start, end) 区间的日线"""
+    yf = get_provider()
+    return yahoo.call(lambda: yf.Ticker(symbol).history(start=start, end=end), priority=BACKFILL)
+
+
+def fetch_quote(symbol):
+    """
+    从上游获取当前股价
+
+    只读取最近几根日线（一次轻量的图表请求），不读取完整的 ticker.info；
+    名称、币种等元数据由 _symbol_meta 单独缓存
+    """
+    try:
+        hist = yahoo.call(
+            get_provider().Ticker(symbol).history,
+            period='5d',
+            auto_adjust=False,
+            priority=INTERACTIVE
+        )
+        closes = hist['Close'].dropna() if not hist.empty else hist
+
+        if closes.empty:
+            return {'error': f'无法获取 {symbol} 的股价数据'}
+
+        return {
+            'success': True,
+            'symbol': symbol,
+            'price': float(closes.iloc[-1]),
+            'previous_close': float(closes.iloc[-2]) if len(closes) > 1 else None,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    except UpstreamUnavailable as e:
+        # 与批量报价、历史数据相同的形式，调用方据此提示稍后重试
+        return {
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'获取股价失败: {str(e)}'
+        }
+
+
+def fetch_profile(symbol):
+    """从上游读取股票元数据（完整的 ticker.info，请求较慢，结果由 _symbol_meta 长期缓存）"""
+    info = yahoo.call(lambda: get_provider().Ticker(symbol).info, priority=INTERACTIVE)
+    if not info:
+        raise ValueError(f'无法获取 {symbol} 的元数据')
+    return {
+        'symbol': symbol,
+        'name': info.get('longName') or info.get('shortName') or symbol,
+        'currency': info.get('currency') or 'USD',
+        'exchange': info.get('fullExchangeName') or info.get('exchange'),
+        'sector': info.get('sector')
+    }
+
+
+def fetch_quotes(symbols):
+    """一次批量下载从上游获取多只股票的最新价格（yfinance内部按股票并发请求，按股票数计费）"""
+    hist = yahoo.call(
+        get_provider().download,
+        tickers=' '.join(symbols),
+        period='5d',
+        interval='1d',
+        group_by='ticker',
+        auto_adjust=False,
+        threads=True,
+        progress=False,
+        priority=INTERACTIVE,
+        cost=len(symbols)
+    )
+
+    timestamp = datetime.now().isoformat()
+    prices = {}
+    for symbol in symbols:
+        prices[symbol] = _extract_batch_quote(hist, symbol, len(symbols))
+        if prices[symbol].get('success'):
+            prices[symbol]['timestamp'] = timestamp
+
+    return prices
+
+
+def _extract_batch_quote(hist, symbol, symbol_count):
+    """从批量下载结果中取出单只股票的最新收盘价"""
+    try:
+        # 多只股票时列为 (symbol, field) 的MultiIndex；
+        # 旧版yfinance单只股票时返回普通列
+        if hist.columns.nlevels > 1:
+            if symbol not in hist.columns.get_level_values(0):
+                raise KeyError(symbol)
+            closes = hist[symbol]['Close'].dropna()
+        elif symbol_count == 1:
+            closes = hist['Close'].dropna()
+        else:
+            raise KeyError(symbol)
+
+        if closes.empty:
+            raise KeyError(symbol)
+
+        return {
+            'success': True,
+            'symbol': symbol,
+            'price': float(closes.iloc[-1]),
+            'previous_close': float(closes.iloc[-2]) if len(closes) > 1 else None
+        }
+
+    except KeyError:
+        return {
+            'success': False,
+            'error': f'无法获取 {symbol} 的股价数据'
+        }
@@ -0,0 +1,132 @@
+"""
+Vercel Serverless Function - 报价和日线预热
+定时扫描所有已存储的投资组合，收集持仓股票，批量刷新报价缓存和最新日线，
+并补齐缺失或过期的股票元数据，使用户请求基本都能命中缓存
+
+Vercel Cron 调用 /api/cron/prefetch（设置 CRON_SECRET 时校验 Authorization 头）
+本地运行: python api/cron_prefetch.py [回补天数]
+"""
+
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 允许导入api目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _portfolio_store import get_store
+from _price_service import MAX_BATCH_SYMBOLS, fetch_quotes_with_meta, get_bar_history, quote_cache
+from _symbol_meta import SYMBOL_PATTERN, symbol_meta
+from _scheduler import REFRESH, priority
+from _http import send_json
+
+# 日线预热的天数（与 /api/history 默认的 1M 周期一致）
+PREFETCH_DAYS = 250
+
+# 单次运行的时间预算（秒），超出后剩余股票留到下次
+TIME_BUDGET = float(os.environ.get('PREFETCH_TIME_BUDGET', '50'))
+
+
+def collect_symbols(store):
+    """所有投资组合持仓中的股票代码（只读文档头，不读交易记录）"""
+    symbols = set()
+    for user_id in store.user_ids():
+        try:
+            head = store.load_head(user_id) or {}
+        except Exception as e:
+            print(f"Prefetch load {user_id} error: {e}")
+            continue
+        for position in head.get('positions') or []:
+            symbol = (position.get('symbol') or '').strip().upper()
+            # 不合法的代码不能用作缓存文件名，也查不到行情
+            if SYMBOL_PATTERN.fullmatch(symbol):
+                symbols.add(symbol)
+    return sorted(symbols)
+
+
+def prefetch(store=None, days=PREFETCH_DAYS, time_budget=TIME_BUDGET):
+    """批量刷新报价和日线，返回运行摘要"""
+    started = time.monotonic()
+    symbols = collect_symbols(store or get_store())
+    start_date = (datetime.now() - timedelta(days=days)).date()
+
+    quotes_ok = 0
+    bars_ok = 0
+    errors = {}
+    skipped = []
+
+    # 预热是后台任务，排在用户请求之后
+    with priority(REFRESH):
+        for i in range(0, len(symbols), MAX_BATCH_SYMBOLS):
+            batch = symbols[i:i + MAX_BATCH_SYMBOLS]
+            try:
+                quotes = fetch_quotes_with_meta(batch)
+                quote_cache.put_many(quotes)
+                quotes_ok += sum(1 for q in quotes.values() if q.get('success'))
+            except Exception as e:
+                for symbol in batch:
+                    errors[symbol] = f'报价: {str(e)}'
+
+        for symbol in symbols:
+            if time.monotonic() - started > time_budget:
+                skipped.append(symbol)
+                continue
+            try:
+                get_bar_history().get_bars(symbol, start_date)
+                bars_ok += 1
+            except Exception as e:
+                errors[symbol] = f'日线: {str(e)}'
+
+        # 元数据按天过期，通常全部命中缓存；放在报价和日线之后，同样受时间预算限制，
+        # 本次没来得及获取的留到下次运行（报价先用占位元数据）
+        meta_fetched = 0
+        meta_skipped = 0
+        for i in range(0, len(symbols), MAX_BATCH_SYMBOLS):
+            batch = symbols[i:i + MAX_BATCH_SYMBOLS]
+            if time.monotonic() - started > time_budget:
+                meta_skipped += len(batch)
+                continue
+            try:
+                meta_fetched += symbol_meta.populate(batch)
+            except Exception as e:
+                for symbol in batch:
+                    errors.setdefault(symbol, f'元数据: {str(e)}')
+
+    return {
+        'success': True,
+        'symbols': len(symbols),
+        'quotes': quotes_ok,
+        'metadata_fetched': meta_fetched,
+        'metadata_skipped': meta_skipped,
+        'bars': bars_ok,
+        'skipped': skipped,
+        'errors': errors,
+        'elapsed': round(time.monotonic() - started, 2),
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+class handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        secret = os.environ.get('CRON_SECRET')
+        if secret and self.headers.get('Authorization') != f'Bearer {secret}':
+            send_json(self, {'success': False, 'error': 'Unauthorized'}, conditional=False)
+            return
+
+        try:
+            result = prefetch()
+        except Exception as e:
+            result = {
+                'success': False,
+                'error': str(e)
+            }
+        send_json(self, result, cache_control='no-store', conditional=False)
+
+
+if __name__ == '__main__':
+    result = prefetch(days=int(sys.argv[1]) if len(sys.argv) > 1 else PREFETCH_DAYS, time_budget=float('inf'))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -3,174 +3,24 @@ Vercel Serverless Function - 投资组合数据管理
 使用MongoDB Atlas存储数据
 """
 
-from http.server import BaseHTTPRequestHandler
-import json
+import hashlib
 import os
-from datetime import datetime
-from urllib.parse import parse_qs
+import sys
 
-# 使用pymongo连接MongoDB Atlas
-try:
-    from pymongo import MongoClient
-    from bson import ObjectId
-    import hashlib
-    MONGODB_AVAILABLE = True
-except ImportError:
-    MONGODB_AVAILABLE = False
+# 允许导入api目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-class handler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        # 初始化MongoDB连接
-        if MONGODB_AVAILABLE:
-            mongodb_uri = os.environ.get('MONGODB_URI', '')
-            if mongodb_uri:
-                try:
-                    # Vercel兼容的MongoDB连接配置
-                    self.client = MongoClient(
-                        mongodb_uri,
-                        serverSelectionTimeoutMS=5000,
-                        tlsAllowInvalidCertificates=True,  # 允许自签名证书
-                        retryWrites=True,
-                        w='majority'
-                    )
-                    self.db = self.client.portfolio_tracker
-                    self.collection = self.db.portfolios
-                except Exception as e:
-                    print(f"MongoDB连接失败: {e}")
-                    self.db = None
-            else:
-                self.db = None
-        else:
-            self.db = None
+from _mongo import get_database
+from _portfolio_store import MongoPortfolioStore
+from _portfolio_handler import PortfolioHandler
 
-        super().__init__(*args, **kwargs)
 
-    def do_GET(self):
-        """处理GET请求 - 加载投资组合"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
+class handler(PortfolioHandler):
+    # 复用模块级MongoDB连接
+    store = MongoPortfolioStore(get_database)
 
-        try:
-            user_id = self.get_user_id()
-
-            if not self.db:
-                self.wfile.write(json.dumps({
-                    'success': False,
-                    'error': 'Database not configured'
-                }).encode())
-                return
-
-            # 从数据库加载数据
-            portfolio = self.collection.find_one({'user_id': user_id})
-
-            if portfolio:
-                # 移除MongoDB的_id字段
-                portfolio.pop('_id', None)
-                self.wfile.write(json.dumps({
-                    'success': True,
-                    'data': portfolio
-                }).encode())
-            else:
-                self.wfile.write(json.dumps({
-                    'success': True,
-                    'data': None
-                }).encode())
-
-        except Exception as e:
-            self.wfile.write(json.dumps({
-                'success': False,
-                'error': str(e)
-            }).encode())
-
-    def do_POST(self):
-        """处理POST请求 - 保存投资组合"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-
-        try:
-            user_id = self.get_user_id()
-
-            if not self.db:
-                self.wfile.write(json.dumps({
-                    'success': False,
-                    'error': 'Database not configured'
-                }).encode())
-                return
-
-            # 读取请求体
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
-            portfolio_data = json.loads(body.decode('utf-8'))
-
-            # 添加用户ID和时间戳
-            portfolio_data['user_id'] = user_id
-            portfolio_data['updated_at'] = datetime.now().isoformat()
-
-            # 更新或插入数据
-            self.collection.update_one(
-                {'user_id': user_id},
-                {'$set': portfolio_data},
-                upsert=True
-            )
-
-            self.wfile.write(json.dumps({
-                'success': True,
-                'message': '保存成功'
-            }).encode())
-
-        except Exception as e:
-            self.wfile.write(json.dumps({
-                'success': False,
-                'error': str(e)
-            }).encode())
-
-    def do_DELETE(self):
-        """处理DELETE请求 - 删除投资组合"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-
-        try:
-            user_id = self.get_user_id()
-
-            if not self.db:
-                self.wfile.write(json.dumps({
-                    'success': False,
-                    'error': 'Database not configured'
-                }).encode())
-                return
-
-            self.collection.delete_one({'user_id': user_id})
-
-            self.wfile.write(json.dumps({
-                'success': True,
-                'message': '删除成功'
-            }).encode())
-
-        except Exception as e:
-            self.wfile.write(json.dumps({
-                'success': False,
-                'error': str(e)
-            }).encode())
-
-    def do_OPTIONS(self):
-        """处理OPTIONS请求 - CORS预检"""
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
+    # 保持原有行为：没有数据时返回null
+    empty_document = None
 
     def get_user_id(self):
         """获取用户ID（基于IP的哈希）"""
@@ -0,0 +1,190 @@
+"""
+Vercel Serverless Function - 投资组合分析
+基于云端交易记录和缓存的日线数据，在服务端计算投资组合走势和交易统计
+"""
+
+from http.server import BaseHTTPRequestHandler
+import os
+import sys
+from datetime import date
+from urllib.parse import parse_qs, urlparse
+
+# 允许导入api目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+from _portfolio_store import get_store, document_etag
+from _http import send_cors_headers, send_json
+from _metrics import instrument
+from _analytics import AnalyticsCache, compute_analytics, with_market_prices
+from _risk import DEFAULT_BENCHMARK, DEFAULT_WINDOW, RiskEngine
+from _price_service import fetch_quotes_with_meta, get_bar_history, parse_symbols, quote_cache
+from _symbol_meta import check_symbol
+from _timeseries import compute_timeseries, timeseries_to_columns
+from _resample import downsample, parse_chart_params, resample_last
+
+store = get_store()
+
+# 交易统计按文档版本缓存，版本不变时不重新计算
+analytics_cache = AnalyticsCache()
+
+USAGE = {
+    'timeseries': '/api/portfolio/timeseries?start=YYYY-MM-DD&interval=1d|1w|1mo|1q&max_points=N',
+    'analytics': '/api/portfolio/analytics?prices=1|0',
+    'risk': '/api/portfolio/risk?symbols=AAPL,MSFT&benchmark=SPY&days=365&window=21&risk_free=0.04'
+}
+
+
+def load_closes(symbol, start):
+    """读取某只股票从start开始的每日收盘价（与价格接口共用日线存储）；代码不合法时抛出 ValueError"""
+    return get_bar_history().get_bars(check_symbol(symbol), start)['Close']
+
+
+# 风险指标按 (股票集合, 日期) 缓存
+risk_engine = RiskEngine(load_closes)
+
+
+class handler(BaseHTTPRequestHandler):
+
+    def get_user_id(self):
+        """获取用户ID（使用固定ID，与portfolio_kv保持一致）"""
+        return "default_user"
+
+    @instrument(depth=2)
+    def do_GET(self):
+        parsed_path = urlparse(self.path)
+        path_parts = parsed_path.path.strip('/').split('/')
+        query_params = parse_qs(parsed_path.query)
+
+        try:
+            # 路由: /api/portfolio/timeseries
+            if path_parts[-1] == 'timeseries':
+                start = query_params.get('start', [None])[0]
+                interval, max_points = parse_chart_params(query_params)
+                result = self.get_timeseries(date.fromisoformat(start) if start else None, interval, max_points)
+
+            # 路由: /api/portfolio/risk
+            elif path_parts[-1] == 'risk':
+                result = self.get_risk(query_params)
+
+            # 路由: /api/portfolio/analytics
+            elif path_parts[-1] == 'analytics':
+                with_prices = query_params.get('prices', ['1'])[0] != '0'
+                result = self.get_analytics(with_prices)
+
+            else:
+                result = {'error': 'Invalid endpoint', 'usage': USAGE}
+
+        except Exception as e:
+            result = {
+                'success': False,
+                'error': str(e)
+            }
+
+        # 与其他接口相同的ETag（304）、压缩和CORS头；结果随云端数据变化，每次都要验证
+        if result.get('success'):
+            send_json(self, result, cache_control='no-cache')
+        else:
+            send_json(self, result, cache_control='no-store', conditional=False)
+
+    def do_OPTIONS(self):
+        """处理OPTIONS请求 - CORS预检"""
+        self.send_response(200)
+        send_cors_headers(self, 'GET, OPTIONS')
+        self.end_headers()
+
+    def get_timeseries(self, start=None, interval='1d', max_points=None):
+        """计算每日市值、现金、总资产和净投入（可按周期聚合、降采样）"""
+        data = store.load(self.get_user_id()) or {}
+        transactions = data.get('transactionHistory', [])
+
+        # 某只股票没有日线（代码不合法、退市等）时按0计市值并在 missing 中报告，不让整个组合的走势失败
+        missing = {}
+
+        def closes_or_empty(symbol, since):
+            try:
+                return load_closes(symbol, since)
+            except Exception as e:
+                missing[symbol] = str(e)
+                return pd.Series(dtype=float)
+
+        result = compute_timeseries(transactions, closes_or_empty, start=start)
+        result = downsample(resample_last(result, interval), 'total_value', max_points)
+
+        return {
+            'success': True,
+            'interval': interval,
+            'data': timeseries_to_columns(result),
+            'count': len(result),
+            'missing': missing,
+            # 客户端据此确认走势基于与本地相同的云端版本
+            'version': data.get('version', 0)
+        }
+
+    def get_analytics(self, with_prices=True):
+        """已实现/未实现盈亏、胜率、最大盈亏、FIFO持仓成本和换手"""
+        user_id = self.get_user_id()
+
+        # 先只读文档头：版本未变化时直接使用缓存的统计结果
+        version_key = document_etag(store.load_head(user_id))
+        analytics = analytics_cache.get(user_id, version_key) if version_key else None
+        if analytics is None:
+            data = store.load(user_id) or {}
+            analytics = compute_analytics(data.get('transactionHistory', []))
+            if version_key:
+                analytics_cache.put(user_id, version_key, analytics)
+
+        prices = {}
+        held = [s for s, p in analytics['symbols'].items() if p['shares'] > 1e-9]
+        if with_prices and held:
+            try:
+                quotes = quote_cache.get_many(held, fetch_quotes_with_meta)
+                prices = {s: q['price'] for s, q in quotes.items() if q.get('success')}
+            except Exception as e:
+                print(f"Analytics price error: {e}")
+
+        return {
+            'success': True,
+            'version': version_key,
+            'data': with_market_prices(analytics, prices)
+        }
+
+    def get_risk(self, query_params):
+        """波动率、最大回撤、Beta、Sharpe/Sortino和相关系数矩阵（默认使用当前持仓，按持仓市值加权）"""
+        symbols = parse_symbols(query_params.get('symbols', [''])[0])
+        benchmark = check_symbol(query_params.get('benchmark', [DEFAULT_BENCHMARK])[0])
+        days = int(query_params.get('days', ['365'])[0])
+        window = int(query_params.get('window', [DEFAULT_WINDOW])[0])
+        risk_free = float(query_params.get('risk_free', ['0'])[0])
+        # 滚动标准差按 (window - 1) 做无偏估计
+        if window < 2:
+            return {'success': False, 'error': 'window 不能小于2'}
+
+        shares = {}
+        invalid = {}
+        if not symbols:
+            head = store.load_head(self.get_user_id()) or {}
+            for position in head.get('positions') or []:
+                raw = (position.get('symbol') or '').strip()
+                if not raw:
+                    continue
+                # 不合法的代码不能进入日线存储（用作文件名），报告在 missing 中
+                try:
+                    symbol = check_symbol(raw)
+                except ValueError as e:
+                    invalid[raw] = str(e)
+                    continue
+                shares[symbol] = shares.get(symbol, 0.0) + float(position.get('shares') or 0)
+            symbols = sorted(shares)
+        if not symbols:
+            return {'success': False, 'error': '没有持仓，请提供symbols参数'}
+
+        result = risk_engine.compute(symbols, benchmark, days, window, risk_free, holdings=shares)
+        if invalid:
+            result = dict(result, missing=dict(result['missing'], **invalid))
+
+        return {
+            'success': True,
+            'data': result
+        }
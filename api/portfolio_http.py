@@ -9,13 +9,43 @@ import json
 import os
 from datetime import datetime
 import hashlib
-import urllib.request
+import http.client
+import threading
 import urllib.parse
 
 # MongoDB Atlas Data API配置
 MONGODB_DATA_API_URL = os.environ.get('MONGODB_DATA_API_URL', '')
 MONGODB_API_KEY = os.environ.get('MONGODB_API_KEY', '')
 
+# 模块级长连接：热启动时复用，避免每次请求重新建立TCP/TLS连接
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def data_api_post(path, body, headers):
+    """通过保持连接的HTTP(S)连接发送POST请求，连接失效时重连一次"""
+    global _connection
+    parsed = urllib.parse.urlparse(MONGODB_DATA_API_URL)
+
+    with _connection_lock:
+        for attempt in range(2):
+            if _connection is None:
+                connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+                _connection = connection_class(parsed.netloc, timeout=10)
+            try:
+                _connection.request('POST', parsed.path.rstrip('/') + path, body=body, headers=headers)
+                response = _connection.getresponse()
+                data = response.read()
+                if response.status >= 400:
+                    return {'error': f'HTTP {response.status}: {data.decode("utf-8", "replace")}'}
+                return json.loads(data.decode('utf-8'))
+            except (http.client.HTTPException, OSError):
+                # 服务端关闭了空闲连接等情况：丢弃连接后重试一次
+                _connection.close()
+                _connection = None
+                if attempt:
+                    raise
+
 class handler(BaseHTTPRequestHandler):
 
     def get_user_id(self):
@@ -27,7 +57,7 @@ class handler(BaseHTTPRequestHandler):
         user_string = f"{client_ip}_{user_agent}"
         return hashlib.md5(user_string.encode()).hexdigest()
 
-    def mongodb_request(self, action, filter_doc=None, document=None, update=None):
+    def mongodb_request(self, action, filter_doc=None, document=None, update=None, upsert=False):
         """
         使用MongoDB Data API发送请求
 
@@ -48,22 +78,20 @@ class handler(BaseHTTPRequestHandler):
             payload["document"] = document
         if update:
             payload["update"] = update
-
-        # 构建URL
-        url = f"{MONGODB_DATA_API_URL}/action/{action}"
+        if upsert:
+            payload["upsert"] = True
 
         # 构建请求
         headers = {
             'Content-Type': 'application/json',
-            'api-key': MONGODB_API_KEY
+            'api-key': MONGODB_API_KEY,
+            'Connection': 'keep-alive'
         }
 
         data = json.dumps(payload).encode('utf-8')
 
         try:
-            req = urllib.request.Request(url, data=data, headers=headers, method='POST')
-            with urllib.request.urlopen(req, timeout=10) as response:
-                return json.loads(response.read().decode('utf-8'))
+            return data_api_post(f"/action/{action}", data, headers)
         except Exception as e:
             return {'error': str(e)}
 
@@ -109,15 +137,18 @@ class handler(BaseHTTPRequestHandler):
                 'error': str(e)
             }).encode())
 
-    def do_POST(self):
-        """处理POST请求 - 保存投资组合"""
-        self.send_response(200)
+    def send_result(self, payload, status=200):
+        """发送JSON响应（写入结果确定后才发送状态码）"""
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
+        self.wfile.write(json.dumps(payload).encode())
 
+    def do_POST(self):
+        """处理POST请求 - 保存投资组合"""
         try:
             user_id = self.get_user_id()
 
@@ -130,55 +161,49 @@ class handler(BaseHTTPRequestHandler):
             portfolio_data['user_id'] = user_id
             portfolio_data['updated_at'] = datetime.now().isoformat()
 
-            # 使用Data API更新或插入
+            # 使用Data API更新或插入（一次upsert请求）
             result = self.mongodb_request(
                 'updateOne',
                 filter_doc={'user_id': user_id},
-                update={'$set': portfolio_data}
+                update={'$set': portfolio_data},
+                upsert=True
             )
 
-            # 如果没有匹配的文档，插入新文档
-            if result.get('matchedCount', 0) == 0:
-                result = self.mongodb_request(
-                    'insertOne',
-                    document=portfolio_data
-                )
-
-            self.wfile.write(json.dumps({
-                'success': True,
-                'message': '保存成功'
-            }).encode())
-
         except Exception as e:
-            self.wfile.write(json.dumps({
+            self.send_result({
                 'success': False,
                 'error': str(e)
-            }).encode())
+            }, 400)
+            return
 
-    def do_DELETE(self):
-        """处理DELETE请求 - 删除投资组合"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-
-        try:
-            user_id = self.get_user_id()
+        # Data API 未配置或写入失败
+        if 'error' in result:
+            self.send_result({
+                'success': False,
+                'error': result['error']
+            }, 502)
+            return
 
-            result = self.mongodb_request('deleteOne', filter_doc={'user_id': user_id})
+        self.send_result({
+            'success': True,
+            'message': '保存成功'
+        })
 
-            self.wfile.write(json.dumps({
-                'success': True,
-                'message': '删除成功'
-            }).encode())
+    def do_DELETE(self):
+        """处理DELETE请求 - 删除投资组合"""
+        result = self.mongodb_request('deleteOne', filter_doc={'user_id': self.get_user_id()})
 
-        except Exception as e:
-            self.wfile.write(json.dumps({
+        if 'error' in result:
+            self.send_result({
                 'success': False,
-                'error': str(e)
-            }).encode())
+                'error': result['error']
+            }, 502)
+            return
+
+        self.send_result({
+            'success': True,
+            'message': '删除成功'
+        })
 
     def do_OPTIONS(self):
         """处理OPTIONS请求 - CORS预检"""
@@ -1,20 +1,55 @@
 """
 Vercel Serverless Function - 获取股票价格
 使用 yfinance 获取Yahoo Finance数据
+历史数据相关的依赖（pandas/numpy）在对应路由中才导入，健康检查和命中缓存的报价不加载它们
 """
 
 from http.server import BaseHTTPRequestHandler
 import json
-import yfinance as yf
-from datetime import datetime, timedelta
+import os
+import sys
 from urllib.parse import parse_qs, urlparse
 
+# 允许导入api目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _quote_cache import quote_ttl
+from _http import dump_json, send_cors_headers, send_json
+from _metrics import SIZE_BUCKETS, current_route, instrument, observe
+from _price_service import (
+    USAGE, check_batch_symbols, get_batch_prices, get_close_matrix, get_current_price, get_historical_data,
+    health, history_start, iter_history_lines, parse_symbols
+)
+from _symbol_meta import check_symbol
+
+
 class handler(BaseHTTPRequestHandler):
+    @instrument()
     def do_GET(self):
         # 解析URL
         parsed_path = urlparse(self.path)
         path_parts = parsed_path.path.strip('/').split('/')
 
+        # 路由: /api/history/matrix?symbols=AAPL,MSFT（多股票对齐的收盘价矩阵，需在单只股票路由之前匹配）
+        if len(path_parts) >= 3 and path_parts[1] == 'history' and path_parts[2] == 'matrix':
+            self.send_matrix(parse_qs(parsed_path.query))
+            return
+
+        # 路由: /api/history/{symbol}（带ETag、缓存头和压缩，单独发送响应头；stream=1 时流式输出）
+        if len(path_parts) >= 3 and path_parts[1] == 'history':
+            query_params = parse_qs(parsed_path.query)
+            if query_params.get('stream', ['0'])[0] == '1':
+                self.send_history_stream(path_parts[2], query_params)
+            else:
+                self.send_history(path_parts[2], query_params)
+            return
+
+        # 路由: /api/histories?symbols=AAPL,MSFT（多只股票，流式输出）
+        if len(path_parts) >= 2 and path_parts[1] == 'histories':
+            query_params = parse_qs(parsed_path.query)
+            self.send_history_stream(query_params.get('symbols', [''])[0], query_params)
+            return
+
         # CORS headers
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
@@ -26,133 +61,126 @@ class handler(BaseHTTPRequestHandler):
         try:
             # 路由: /api/price/{symbol}
             if len(path_parts) >= 3 and path_parts[1] == 'price':
-                symbol = path_parts[2].upper()
-                result = self.get_current_price(symbol)
-                self.wfile.write(json.dumps(result).encode())
-
-            # 路由: /api/history/{symbol}
-            elif len(path_parts) >= 3 and path_parts[1] == 'history':
-                symbol = path_parts[2].upper()
-                # 解析查询参数
+                symbol = check_symbol(path_parts[2])
+                result = get_current_price(symbol)
+                self.wfile.write(dump_json(result))
+
+            # 路由: /api/prices?symbols=AAPL,MSFT
+            elif len(path_parts) >= 2 and path_parts[1] == 'prices':
                 query_params = parse_qs(parsed_path.query)
-                period = query_params.get('period', ['1M'])[0]
-                result = self.get_historical_data(symbol, period)
-                self.wfile.write(json.dumps(result).encode())
+                symbols = parse_symbols(query_params.get('symbols', [''])[0])
+                result = get_batch_prices(symbols)
+                self.wfile.write(dump_json(result))
 
             # 路由: /api/health
             elif len(path_parts) >= 2 and path_parts[1] == 'health':
-                result = {
-                    'status': 'ok',
-                    'message': '股票追踪API服务正常运行',
-                    'timestamp': datetime.now().isoformat()
-                }
-                self.wfile.write(json.dumps(result).encode())
+                result = health()
+                self.wfile.write(dump_json(result))
 
             else:
-                self.wfile.write(json.dumps({
+                self.wfile.write(dump_json({
                     'error': 'Invalid endpoint',
-                    'usage': {
-                        'price': '/api/price/{symbol}',
-                        'history': '/api/history/{symbol}?period=1M',
-                        'health': '/api/health'
-                    }
-                }).encode())
+                    'usage': USAGE
+                }))
 
         except Exception as e:
             error_response = {
                 'success': False,
                 'error': str(e)
             }
-            self.wfile.write(json.dumps(error_response).encode())
+            self.wfile.write(dump_json(error_response))
 
     def do_OPTIONS(self):
         # 处理CORS预检请求
         self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        send_cors_headers(self, 'GET, OPTIONS')
         self.end_headers()
 
-    def get_current_price(self, symbol):
-        """获取当前股价"""
-        try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-
-            current_price = info.get('currentPrice') or info.get('regularMarketPrice')
-            if current_price is None:
-                # 尝试从历史数据获取最新价格
-                hist = ticker.history(period="1d")
-                if not hist.empty:
-                    current_price = float(hist['Close'].iloc[-1])
-
-            if current_price is None:
-                return {'error': f'无法获取 {symbol} 的股价数据'}
-
-            return {
-                'success': True,
-                'symbol': symbol,
-                'price': float(current_price),
-                'company_name': info.get('longName', symbol),
-                'currency': info.get('currency', 'USD'),
-                'timestamp': datetime.now().isoformat()
-            }
+    def send_history(self, symbol, query_params):
+        """发送历史数据响应：支持If-None-Match条件请求和gzip压缩"""
+        from _resample import parse_chart_params
 
+        try:
+            period = query_params.get('period', ['1M'])[0]
+            data_format = query_params.get('format', ['rows'])[0]
+            interval, max_points = parse_chart_params(query_params)
+            result = get_historical_data(check_symbol(symbol), period, data_format, interval, max_points)
         except Exception as e:
-            return {
+            result = {
                 'success': False,
-                'error': f'获取股价失败: {str(e)}'
+                'error': str(e)
             }
 
-    def get_historical_data(self, symbol, period):
-        """获取历史股价数据"""
+        if result.get('success'):
+            # 日线在报价TTL内不会变化，允许浏览器缓存同样长的时间
+            send_json(self, result, cache_control=f'public, max-age={quote_ttl()}')
+        else:
+            send_json(self, result, cache_control='no-store', conditional=False)
+
+    def send_matrix(self, query_params):
+        """发送收盘价矩阵：与单只股票历史数据相同的缓存头、ETag和压缩"""
         try:
-            # 根据时间范围设置获取的天数
-            period_days = {
-                '1D': 20,
-                '1W': 65,
-                '1M': 250,
-                '3M': 750,
-                '6M': 1500,
-                'YTD': 365
+            result = get_close_matrix(
+                parse_symbols(query_params.get('symbols', [''])[0]),
+                query_params.get('period', ['1M'])[0],
+                query_params.get('start', [None])[0],
+                query_params.get('end', [None])[0]
+            )
+        except ValueError as e:
+            result = {
+                'success': False,
+                'error': str(e)
             }
+        if result.get('success'):
+            send_json(self, result, cache_control=f'public, max-age={quote_ttl()}')
+        else:
+            send_json(self, result, cache_control='no-store', conditional=False)
 
-            days = period_days.get(period, 250)
-
-            ticker = yf.Ticker(symbol)
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-
-            hist = ticker.history(start=start_date, end=end_date)
-
-            if hist.empty:
-                return {
-                    'success': False,
-                    'error': f'无法获取 {symbol} 的历史数据'
-                }
-
-            # 转换数据格式
-            data = []
-            for date_index, row in hist.iterrows():
-                data.append({
-                    'date': date_index.date().strftime('%Y-%m-%d'),
-                    'open': float(row['Open']),
-                    'high': float(row['High']),
-                    'low': float(row['Low']),
-                    'close': float(row['Close']),
-                    'volume': int(row['Volume'])
-                })
-
-            return {
-                'success': True,
-                'symbol': symbol,
-                'period': period,
-                'data': data,
-                'count': len(data)
-            }
+    def send_history_stream(self, raw_symbols, query_params):
+        """以NDJSON流式发送历史数据：边从日线存储读取边写出，不在内存中拼出完整响应"""
+        from _bar_store import ROW_CHUNK
+        from _resample import parse_chart_params
 
+        try:
+            symbols = parse_symbols(raw_symbols)
+            error = check_batch_symbols(symbols)
+            if error:
+                raise ValueError(error['error'])
+            interval, max_points = parse_chart_params(query_params)
+            start_date = history_start(
+                query_params.get('period', ['1M'])[0],
+                query_params.get('start', [None])[0]
+            )
         except Exception as e:
-            return {
+            send_json(self, {
                 'success': False,
-                'error': f'获取历史数据失败: {str(e)}'
-            }
+                'error': str(e)
+            }, cache_control='no-store', conditional=False)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        send_cors_headers(self, 'GET, OPTIONS')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+
+        # 攒够一块再写，避免每行一次系统调用
+        buffer = []
+        written = 0
+        try:
+            for line in iter_history_lines(symbols, start_date, interval, max_points):
+                buffer.append(json.dumps(line))
+                if len(buffer) >= ROW_CHUNK:
+                    written += self.write_lines(buffer)
+                    buffer = []
+        except Exception as e:
+            buffer.append(json.dumps({'type': 'error', 'error': str(e)}))
+        if buffer:
+            written += self.write_lines(buffer)
+        observe('response_bytes', written, buckets=SIZE_BUCKETS, route=current_route.get())
+
+    def write_lines(self, lines):
+        """写出一块NDJSON行，返回字节数"""
+        chunk = ('\n'.join(lines) + '\n').encode()
+        self.wfile.write(chunk)
+        return len(chunk)
@@ -0,0 +1,270 @@
+"""
+Vercel Serverless Function - 获取股票价格（异步ASGI版本）
+与 price.py 提供相同的接口；上游请求在事件循环中并发执行，
+并发数有上限，同一股票的并发请求只触发一次上游获取
+
+/api/stream/prices?symbols=AAPL,MSFT 以Server-Sent Events推送价格变化（所有连接共享轮询，见 _price_stream）
+
+本地运行: python api/price_asgi.py [端口]（需要安装uvicorn）
+"""
+
+import asyncio
+import json
+import os
+import sys
+from urllib.parse import parse_qs
+
+# 允许导入api目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _async_quotes import AsyncQuoteService
+from _price_stream import PriceHub
+from _quote_cache import quote_ttl
+from _metrics import instrument_asgi
+from _http import MIN_COMPRESS_SIZE, choose_encoding, compress, content_etag, etag_matches
+from _price_service import (
+    MAX_BATCH_SYMBOLS, USAGE, check_batch_symbols, fetch_quote_with_meta, fetch_quotes_with_meta, get_close_matrix,
+    get_historical_data, health, parse_symbols, quote_cache
+)
+from _scheduler import REFRESH, priority
+from _symbol_meta import check_symbol
+
+METHODS = 'GET, OPTIONS'
+
+# 与同步版本共用模块级报价缓存
+quotes = AsyncQuoteService(quote_cache, fetch_quote_with_meta)
+
+
+def poll_quotes(symbols):
+    """
+    价格推送的一次轮询：经报价缓存，缺失的股票用批量下载获取（按股票数计费的一次上游请求，
+    而不是每只股票一次），排在用户请求之后
+    """
+    result = {}
+    with priority(REFRESH):
+        for i in range(0, len(symbols), MAX_BATCH_SYMBOLS):
+            result.update(quote_cache.get_many(symbols[i:i + MAX_BATCH_SYMBOLS], fetch_quotes_with_meta))
+    return result
+
+
+async def poll_prices(symbols):
+    return await asyncio.to_thread(poll_quotes, symbols)
+
+
+# 同一进程内所有SSE连接共享的价格轮询
+price_hub = PriceHub(poll_prices)
+
+# SSE连接的心跳间隔和最长保持时间（秒）；超时后服务端关闭，浏览器的EventSource自动重连。
+# 最长保持时间必须低于函数的最长执行时间（vercel.json 未配置 maxDuration，与定时预热的预算一致取50秒），
+# 否则连接会被平台强制中断；调高函数时限后可用环境变量放宽
+STREAM_HEARTBEAT = 20
+STREAM_MAX_SECONDS = float(os.environ.get('PRICE_STREAM_MAX_SECONDS', '50'))
+
+
+def cors_headers():
+    return [
+        (b'access-control-allow-origin', b'*'),
+        (b'access-control-allow-methods', METHODS.encode()),
+        (b'access-control-allow-headers', b'Content-Type, If-None-Match'),
+        (b'access-control-expose-headers', b'ETag'),
+    ]
+
+
+async def send_json(send, request_headers, payload, cache_control=None, conditional=False):
+    """发送JSON响应（可选ETag条件请求，较大的正文按客户端支持压缩）"""
+    body = json.dumps(payload).encode()
+    headers = cors_headers()
+    if cache_control:
+        headers.append((b'cache-control', cache_control.encode()))
+
+    if conditional:
+        etag = content_etag(body)
+        headers.append((b'etag', etag.encode()))
+        if etag_matches(request_headers.get('if-none-match'), etag):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoding = choose_encoding(request_headers.get('accept-encoding'))
+        if encoding:
+            body = compress(body, encoding)
+            headers.append((b'content-encoding', encoding.encode()))
+
+    headers += [
+        (b'content-type', b'application/json'),
+        (b'vary', b'Accept-Encoding'),
+        (b'content-length', str(len(body)).encode()),
+    ]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def get_batch_prices(symbols):
+    """批量获取当前股价（每只股票并发获取）"""
+    error = check_batch_symbols(symbols)
+    if error:
+        return error
+
+    prices = await quotes.get_many(symbols)
+    return {
+        'success': True,
+        'prices': prices,
+        'count': len(symbols)
+    }
+
+
+async def get_history(symbol, query_params):
+    from _resample import parse_chart_params
+
+    period = query_params.get('period', ['1M'])[0]
+    data_format = query_params.get('format', ['rows'])[0]
+    interval, max_points = parse_chart_params(query_params)
+    # 相同参数的并发请求只计算一次
+    key = ('history', symbol, period, data_format, interval, max_points)
+    return await quotes.run_once(key, get_historical_data, symbol, period, data_format, interval, max_points)
+
+
+async def get_matrix(query_params):
+    symbols = parse_symbols(query_params.get('symbols', [''])[0])
+    args = (
+        query_params.get('period', ['1M'])[0],
+        query_params.get('start', [None])[0],
+        query_params.get('end', [None])[0]
+    )
+    key = ('matrix', tuple(symbols)) + args
+    return await quotes.run_once(key, get_close_matrix, symbols, *args)
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def stream_prices(receive, send, request_headers, symbols):
+    """SSE: 先推送已有价格的快照，之后每批价格变化推送一个 prices 事件"""
+    error = check_batch_symbols(symbols)
+    if error:
+        await send_json(send, request_headers, error)
+        return
+
+    headers = cors_headers() + [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-store'),
+        (b'x-accel-buffering', b'no'),
+    ]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+    queue = price_hub.subscribe(symbols)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    deadline = asyncio.get_running_loop().time() + STREAM_MAX_SECONDS
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        while not disconnected.done():
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            next_batch = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {next_batch, disconnected},
+                timeout=min(STREAM_HEARTBEAT, remaining),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_batch in done:
+                body = sse_event('prices', next_batch.result())
+            else:
+                next_batch.cancel()
+                body = b': ping\n\n'
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        price_hub.unsubscribe(queue, symbols)
+        if not disconnected.done():
+            disconnected.cancel()
+            await send({'type': 'http.response.body', 'body': b''})
+
+
+async def route(path, query_params):
+    """返回 (响应内容, 是否为历史数据)"""
+    path_parts = path.strip('/').split('/')
+    # 兼容 /api/async/... 前缀
+    if len(path_parts) >= 2 and path_parts[1] == 'async':
+        path_parts = path_parts[:1] + path_parts[2:]
+
+    if len(path_parts) >= 3 and path_parts[1] == 'history' and path_parts[2] == 'matrix':
+        return await get_matrix(query_params), True
+
+    if len(path_parts) >= 3 and path_parts[1] == 'history':
+        return await get_history(check_symbol(path_parts[2]), query_params), True
+
+    if len(path_parts) >= 3 and path_parts[1] == 'price':
+        return await quotes.get(check_symbol(path_parts[2])), False
+
+    if len(path_parts) >= 2 and path_parts[1] == 'prices':
+        symbols = parse_symbols(query_params.get('symbols', [''])[0])
+        return await get_batch_prices(symbols), False
+
+    if len(path_parts) >= 2 and path_parts[1] == 'health':
+        return health(), False
+
+    return {'error': 'Invalid endpoint', 'usage': USAGE}, False
+
+
+# /api/async/price/AAPL -> async/price，/api/stream/prices -> stream/prices
+@instrument_asgi(depth=2)
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    request_headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+
+    if scope['method'] == 'OPTIONS':
+        # 处理CORS预检请求
+        await send({'type': 'http.response.start', 'status': 200, 'headers': cors_headers()})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    query_params = parse_qs(scope.get('query_string', b'').decode())
+    if scope['path'].rstrip('/').endswith('/stream/prices'):
+        try:
+            symbols = parse_symbols(query_params.get('symbols', [''])[0])
+        except ValueError as e:
+            await send_json(send, request_headers, {'success': False, 'error': str(e)})
+            return
+        await stream_prices(receive, send, request_headers, symbols)
+        return
+
+    try:
+        result, is_history = await route(scope['path'], query_params)
+    except Exception as e:
+        result, is_history = {'success': False, 'error': str(e)}, False
+
+    if is_history and result.get('success'):
+        # 日线在报价TTL内不会变化，允许浏览器缓存同样长的时间
+        await send_json(send, request_headers, result,
+                        cache_control=f'public, max-age={quote_ttl()}', conditional=True)
+    elif is_history:
+        await send_json(send, request_headers, result, cache_control='no-store')
+    else:
+        await send_json(send, request_headers, result)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='127.0.0.1', port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
@@ -0,0 +1,58 @@
+"""
+Vercel Serverless Function - 运行指标
+访问: /api/stats                      JSON摘要（各接口、上游、存储耗时的p50/p95/p99，缓存命中，响应大小）
+      /api/stats?format=prometheus   Prometheus文本格式
+      /api/stats?scope=local         只看当前实例（默认为所有实例在Redis中合并后的结果）
+"""
+
+from http.server import BaseHTTPRequestHandler
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlparse
+
+# 允许导入api目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _metrics import metrics, prometheus_text, summarize
+from _http import send_cors_headers, send_json
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query_params = parse_qs(urlparse(self.path).query)
+        scope = query_params.get('scope', ['shared'])[0]
+        data_format = query_params.get('format', ['json'])[0]
+
+        try:
+            values = metrics.snapshot() if scope == 'local' else metrics.load_shared()
+        except Exception as e:
+            send_json(self, {
+                'success': False,
+                'error': str(e)
+            }, conditional=False)
+            return
+
+        if data_format == 'prometheus':
+            body = prometheus_text(values).encode()
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain; version=0.0.4')
+            send_cors_headers(self, 'GET, OPTIONS')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        result = summarize(values)
+        result.update(
+            success=True,
+            scope=scope,
+            instance_uptime=round(time.time() - metrics.started_at, 1)
+        )
+        send_json(self, result, cache_control='no-store', conditional=False)
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        send_cors_headers(self, 'GET, OPTIONS')
+        self.end_headers()
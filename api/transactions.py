@@ -0,0 +1,163 @@
+"""
+Vercel Serverless Function - 交易记录查询
+按股票、类型、日期筛选，按日期排序，游标分页；只读取当前页涉及的分段
+
+GET  /api/transactions?since=N&limit=M  按存储顺序读取位置N之后追加的交易记录（next_since 翻页）
+GET  /api/transactions/export?format=csv|ndjson  流式导出（筛选参数与查询相同）
+POST /api/transactions/import?format=csv|ndjson[&dry_run=1]  流式导入，分批追加写入，跳过ID已存在的记录
+"""
+
+from http.server import BaseHTTPRequestHandler
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+# 允许导入api目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _portfolio_store import get_store
+from _tx_index import DEFAULT_LIMIT, TransactionQuery
+from _tx_io import (
+    CONTENT_TYPES, EXPORT_FORMATS, IMPORT_FORMATS, import_transactions, iter_body, iter_csv_records,
+    iter_export, iter_lines, iter_ndjson_records
+)
+from _http import send_cors_headers, send_json
+from _metrics import SIZE_BUCKETS, current_route, instrument, observe
+
+METHODS = 'GET, POST, OPTIONS'
+
+store = get_store()
+
+# 模块级索引缓存，热启动时跨请求复用
+transaction_query = TransactionQuery(store)
+
+
+def parse_list(query_params, name, upper=False):
+    raw = query_params.get(name, [''])[0]
+    values = {v.strip().upper() if upper else v.strip() for v in raw.split(',')}
+    values.discard('')
+    return values or None
+
+
+class handler(BaseHTTPRequestHandler):
+
+    def get_user_id(self):
+        """获取用户ID（使用固定ID，与portfolio_kv保持一致）"""
+        return "default_user"
+
+    @instrument(depth=2)
+    def do_GET(self):
+        parsed_path = urlparse(self.path)
+        query_params = parse_qs(parsed_path.query)
+
+        if parsed_path.path.rstrip('/').endswith('/export'):
+            self.send_export(query_params)
+            return
+
+        try:
+            since = query_params.get('since', [None])[0]
+            if since is not None:
+                # 按存储顺序读取追加的交易记录（导入后补齐页面副本）
+                result = transaction_query.appended(
+                    self.get_user_id(), int(since), query_params.get('limit', [DEFAULT_LIMIT])[0]
+                )
+                result['success'] = True
+                send_json(self, result, cache_control='no-cache')
+                return
+
+            sort = query_params.get('sort', ['-date'])[0]
+            if sort not in ('date', '-date'):
+                raise ValueError('sort 只支持 date 或 -date')
+
+            result = transaction_query.query(
+                self.get_user_id(),
+                symbols=parse_list(query_params, 'symbol', upper=True),
+                types=parse_list(query_params, 'type'),
+                date_from=query_params.get('from', [None])[0],
+                date_to=query_params.get('to', [None])[0],
+                descending=sort == '-date',
+                cursor=query_params.get('cursor', [None])[0],
+                limit=query_params.get('limit', [DEFAULT_LIMIT])[0]
+            )
+            result['success'] = True
+            send_json(self, result, cache_control='no-cache')
+
+        except Exception as e:
+            send_json(self, {
+                'success': False,
+                'error': str(e)
+            }, conditional=False)
+
+    @instrument(depth=2)
+    def do_POST(self):
+        """导入交易记录：边读请求体边解析，校验后每批追加写入"""
+        parsed_path = urlparse(self.path)
+        query_params = parse_qs(parsed_path.query)
+
+        try:
+            if not parsed_path.path.rstrip('/').endswith('/import'):
+                raise ValueError('Invalid endpoint')
+            data_format = query_params.get('format', ['csv'])[0]
+            if data_format not in IMPORT_FORMATS:
+                raise ValueError(f'format 只支持 {", ".join(IMPORT_FORMATS)}')
+
+            lines = iter_lines(iter_body(self.rfile, self.headers))
+            records = iter_csv_records(lines) if data_format == 'csv' else iter_ndjson_records(lines)
+            user_id = self.get_user_id()
+            result = import_transactions(
+                store, user_id, records,
+                existing_ids=transaction_query.existing_ids(user_id),
+                dry_run=query_params.get('dry_run', ['0'])[0] == '1'
+            )
+            result['success'] = True
+            send_json(self, result, methods=METHODS, conditional=False)
+
+        except Exception as e:
+            send_json(self, {
+                'success': False,
+                'error': str(e)
+            }, methods=METHODS, conditional=False)
+
+    def do_OPTIONS(self):
+        """处理OPTIONS请求 - CORS预检"""
+        self.send_response(200)
+        send_cors_headers(self, METHODS)
+        self.end_headers()
+
+    def send_export(self, query_params):
+        """流式导出：逐段读取、编码、写出，不在内存中拼出完整文件"""
+        data_format = query_params.get('format', ['csv'])[0]
+        try:
+            if data_format not in EXPORT_FORMATS:
+                raise ValueError(f'format 只支持 {", ".join(EXPORT_FORMATS)}')
+            chunks = iter_export(
+                store, self.get_user_id(), data_format,
+                symbols=parse_list(query_params, 'symbol', upper=True),
+                types=parse_list(query_params, 'type'),
+                date_from=query_params.get('from', [None])[0],
+                date_to=query_params.get('to', [None])[0]
+            )
+        except Exception as e:
+            send_json(self, {
+                'success': False,
+                'error': str(e)
+            }, conditional=False)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', CONTENT_TYPES[data_format])
+        self.send_header('Content-Disposition', f'attachment; filename="transactions.{data_format}"')
+        send_cors_headers(self, METHODS)
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+
+        written = 0
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(chunk)
+                    written += len(chunk)
+        except Exception as e:
+            # 响应头已发出，只能记录错误并截断输出
+            print(f"Transaction export error: {e}")
+        observe('response_bytes', written, buckets=SIZE_BUCKETS, route=current_route.get())
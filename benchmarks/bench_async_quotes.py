@@ -0,0 +1,75 @@
+"""
+异步报价服务基准
+用固定延迟的模拟上游对比：逐只同步获取 vs 有上限的并发获取，
+以及同一股票的突发并发请求经single-flight合并后的上游调用次数
+
+运行: python benchmarks/bench_async_quotes.py [股票数量] [上游延迟ms]
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from _async_quotes import AsyncQuoteService, MAX_CONCURRENCY
+
+
+class NoCache:
+    """不读不写缓存，每次都走上游"""
+
+    def lookup(self, symbols):
+        return {}, [], list(symbols)
+
+    def put_many(self, quotes):
+        pass
+
+
+class FakeUpstream:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return {'success': True, 'symbol': symbol, 'price': 100.0}
+
+
+async def run(symbols, latency):
+    upstream = FakeUpstream(latency)
+    service = AsyncQuoteService(NoCache(), upstream)
+
+    start = time.perf_counter()
+    await service.get_many(symbols)
+    concurrent = time.perf_counter() - start
+    print(f'并发获取（上限 {MAX_CONCURRENCY}）  {concurrent * 1000:8.1f} ms')
+
+    upstream.calls = 0
+    start = time.perf_counter()
+    await asyncio.gather(*(service.get('AAPL') for _ in range(50)))
+    burst = time.perf_counter() - start
+    print(f'50个并发的相同请求        {burst * 1000:8.1f} ms，上游调用 {upstream.calls} 次')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+    symbols = [f'SYM{i}' for i in range(count)]
+    print(f'{count} 只股票，上游延迟 {latency * 1000:.0f} ms')
+
+    upstream = FakeUpstream(latency)
+    start = time.perf_counter()
+    for symbol in symbols:
+        upstream(symbol)
+    print(f'逐只同步获取              {(time.perf_counter() - start) * 1000:8.1f} ms')
+
+    asyncio.run(run(symbols, latency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+冷启动基准 - 每次在新的Python进程中导入各个函数入口，测量导入耗时（相当于冷启动时的模块加载开销），
+并检查轻量路径（健康检查、命中缓存的报价）没有加载pandas/numpy/yfinance
+
+轻量路径加载了重依赖时以状态码1退出；--save / --baseline 与 bench_handlers 相同，
+导入耗时的中位数变慢超过阈值时同样以状态码1退出。--profile 打印 -X importtime 中累计耗时最多的模块
+
+运行: python benchmarks/bench_cold_start.py [--runs 10] [--profile price] [--save 文件] [--baseline 文件]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..', 'api'))
+
+ENTRY_MODULES = ('price', 'price_asgi', 'portfolio_kv', 'transactions', 'portfolio_analytics', 'stats')
+HEAVY_MODULES = ('pandas', 'numpy', 'yfinance')
+
+# 在子进程中执行，输出导入耗时（秒）
+IMPORT_SCRIPT = '''
+import sys, time
+sys.path.insert(0, {api_dir!r})
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+'''
+
+# 在子进程中执行：导入price，请求健康检查和命中缓存的报价，输出已加载的重依赖
+LIGHT_PATH_SCRIPT = '''
+import json, sys
+sys.path.insert(0, {bench_dir!r})
+from bench_handlers import call, quiet
+import price
+from _price_service import quote_cache
+
+handler = quiet(price.handler)
+results = {{}}
+call(handler, 'GET', '/api/health')
+results['health'] = [m for m in {heavy!r} if m in sys.modules]
+quote_cache.put_many({{'COLD': {{'success': True, 'symbol': 'COLD', 'price': 1.0}}}})
+call(handler, 'GET', '/api/price/COLD')
+call(handler, 'GET', '/api/prices?symbols=COLD')
+results['cached-quote'] = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps(results))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='冷启动导入耗时基准')
+    parser.add_argument('--runs', type=int, default=10, help='每个入口的导入次数')
+    parser.add_argument('--profile', help='打印该模块 -X importtime 的耗时排行')
+    parser.add_argument('--save', help='把结果保存为JSON')
+    parser.add_argument('--baseline', help='与之前保存的结果对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='中位数允许变慢的比例')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='小于该差值的变化不算退化')
+    return parser.parse_args()
+
+
+def clean_env():
+    """不连接Redis、不写指标，只测模块加载本身"""
+    env = dict(os.environ)
+    env.pop('REDIS_URL', None)
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def time_import(module, runs):
+    times = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', IMPORT_SCRIPT.format(api_dir=API_DIR, module=module)],
+            capture_output=True, text=True, env=clean_env()
+        )
+        if result.returncode != 0:
+            return {'error': result.stderr.strip().splitlines()[-1]}
+        times.append(float(result.stdout.strip()) * 1000)
+    times.sort()
+    return {
+        'runs': runs,
+        'median_ms': round(statistics.median(times), 2),
+        'p95_ms': round(times[max(0, int(len(times) * 0.95 + 0.5) - 1)], 2)
+    }
+
+
+def check_light_paths():
+    result = subprocess.run(
+        [sys.executable, '-c', LIGHT_PATH_SCRIPT.format(bench_dir=BENCH_DIR, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, env=clean_env()
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def profile(module, top=15):
+    """-X importtime 输出中累计耗时最多的模块"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {API_DIR!r}); import {module}'],
+        capture_output=True, text=True, env=clean_env()
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split('|')]
+        rows.append((int(cumulative_us), int(self_us.split(':')[-1]), name))
+    rows.sort(reverse=True)
+    print(f'\n{module} 导入耗时排行（累计 / 自身，毫秒）')
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f'  {cumulative_us / 1000:9.1f} {self_us / 1000:9.1f}  {name}')
+
+
+def main():
+    args = parse_args()
+    failed = False
+
+    results = {}
+    for module in ENTRY_MODULES:
+        results[module] = time_import(module, args.runs)
+        result = results[module]
+        if 'error' in result:
+            print(f'{module:<22} 导入失败: {result["error"]}')
+        else:
+            print(f'{module:<22} 中位数 {result["median_ms"]:8.1f} ms   p95 {result["p95_ms"]:8.1f} ms')
+
+    light = check_light_paths()
+    print()
+    for path, loaded in light.items():
+        status = '加载了 ' + ', '.join(loaded) if loaded else '未加载重依赖'
+        print(f'轻量路径 {path:<14} {status}')
+        failed = failed or bool(loaded)
+
+    if args.profile:
+        profile(args.profile)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'results': results}, f, indent=2)
+        print(f'\n结果已保存到 {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        for module, result in results.items():
+            before = baseline.get(module, {}).get('median_ms')
+            after = result.get('median_ms')
+            if before is None or after is None:
+                continue
+            if after - before > args.min_delta_ms and after > before * (1 + args.threshold):
+                print(f'退化: {module} 导入中位数 {before:.1f} ms -> {after:.1f} ms')
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
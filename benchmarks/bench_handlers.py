@@ -0,0 +1,279 @@
+"""
+接口基准 - 在进程内直接调用 price.py 和 portfolio_kv.py 的请求处理器（不经过网络和HTTP服务器）
+
+上游换成回放固定日线的替身（见 fake_upstream），结果可重复；
+存储默认用内存（投资组合）和临时目录（日线），设置 REDIS_URL 时使用该Redis（建议本地实例），
+--fakeredis 时使用fakeredis。基准只读写 BENCH* 股票和 bench_handlers 用户的数据，结束后删除
+
+测量 quote / batch-quote / history / matrix 以及不同交易条数下 load / save / patch 的吞吐量和p50/p99延迟。
+--save 保存结果；--baseline 与保存的结果对比，任一项p50变慢超过阈值时以状态码1退出（部署前检查用）
+
+运行: python benchmarks/bench_handlers.py [--sizes 10,100,1000,10000,100000] [--iterations 200]
+          [--latency 毫秒] [--cold] [--fakeredis] [--save 文件] [--baseline 文件 --threshold 0.2]
+"""
+
+import argparse
+import email.message
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'api'))
+sys.path.insert(0, BENCH_DIR)
+
+USER_ID = 'bench_handlers'
+SYMBOL_PREFIX = 'BENCH'
+DEFAULT_SIZES = '10,100,1000,10000,100000'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='进程内接口基准')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='投资组合交易条数（逗号分隔）')
+    parser.add_argument('--iterations', type=int, default=200, help='每项最多测量次数')
+    parser.add_argument('--batch', type=int, default=20, help='批量报价的股票数')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟上游延迟（毫秒）')
+    parser.add_argument('--cold', action='store_true', help='每次请求前清空报价、日线和文档缓存')
+    parser.add_argument('--fakeredis', action='store_true', help='使用fakeredis代替REDIS_URL')
+    parser.add_argument('--save', help='把结果保存为JSON')
+    parser.add_argument('--baseline', help='与之前保存的结果对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50允许变慢的比例')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='小于该差值的变化不算退化')
+    return parser.parse_args()
+
+
+def configure(args):
+    """在导入api模块之前设置环境：不限速、指标不写Redis、日线存到临时目录、可选fakeredis"""
+    os.environ['YAHOO_RATE_PER_SEC'] = '1000000'
+    os.environ['YAHOO_BURST'] = '1000000'
+    os.environ['METRICS_FLUSH_INTERVAL'] = '1e9'
+    os.environ['BAR_STORE_DIR'] = tempfile.mkdtemp(prefix='bench_bars_')
+    os.environ['CLOSE_ARRAY_DIR'] = tempfile.mkdtemp(prefix='bench_closes_')
+
+    import _kv
+    if args.fakeredis:
+        import fakeredis
+        _kv.redis_client = fakeredis.FakeRedis()
+        _kv.REDIS_AVAILABLE = True
+    os.environ['PORTFOLIO_STORE'] = 'redis' if _kv.REDIS_AVAILABLE else 'memory'
+    return _kv
+
+
+def quiet(handler_cls, **overrides):
+    """不打印访问日志的处理器子类"""
+    attrs = {'log_message': lambda self, *args: None}
+    attrs.update(overrides)
+    return type(handler_cls.__name__, (handler_cls,), attrs)
+
+
+def call(handler_cls, method, path, body=b''):
+    """构造一个请求并调用 do_{method}，返回响应正文（解析后的JSON）"""
+    handler = handler_cls.__new__(handler_cls)
+    handler.command = method
+    handler.path = path
+    handler.request_version = 'HTTP/1.1'
+    handler.requestline = f'{method} {path} HTTP/1.1'
+    handler.client_address = ('127.0.0.1', 0)
+    handler.close_connection = True
+    handler.headers = email.message.Message()
+    handler.headers['Content-Length'] = str(len(body))
+    handler.rfile = io.BytesIO(body)
+    handler.wfile = io.BytesIO()
+    getattr(handler, 'do_' + method)()
+
+    raw = handler.wfile.getvalue()
+    return json.loads(raw[raw.index(b'\r\n\r\n') + 4:])
+
+
+def checked(handler_cls, method, path, body=b''):
+    result = call(handler_cls, method, path, body)
+    if not result.get('success'):
+        raise RuntimeError(f'{method} {path} 失败: {result}')
+    return result
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def measure(fn, iterations, setup=None):
+    """先调用一次预热并校验结果，再计时；setup 在每次计时前调用，不计入耗时"""
+    fn()
+    times = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / sum(times), 1),
+        'p50_ms': round(percentile(times, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(times, 0.99) * 1000, 3)
+    }
+
+
+def make_transaction(i):
+    symbol = f'{SYMBOL_PREFIX}{i % 50}'
+    shares = 10 + i % 7
+    price = 100.0 + i % 50
+    return {
+        'id': f'tx{i}',
+        'stockSymbol': symbol,
+        'type': 'buy' if i % 3 else 'sell',
+        'shares': shares,
+        'price': price,
+        'totalFee': 1.0,
+        'totalValue': shares * price,
+        'realizedProfit': 0.0 if i % 3 else (i % 11 - 5) * 10.0,
+        'date': f'{2000 + i // 4000 % 26}-{i // 330 % 12 + 1:02d}-{i % 28 + 1:02d}'
+    }
+
+
+def make_document(count):
+    return {
+        'positions': [
+            {'id': f'p{i}', 'symbol': f'{SYMBOL_PREFIX}{i}', 'shares': 100, 'avgPrice': 100.0}
+            for i in range(min(count, 50))
+        ],
+        'cashBalance': 100000,
+        'transactionHistory': [make_transaction(i) for i in range(count)]
+    }
+
+
+def cleanup(kv, bar_store):
+    if kv.REDIS_AVAILABLE:
+        for pattern in (f'quote:{SYMBOL_PREFIX}*', f'bars:{SYMBOL_PREFIX}*', f'portfolio:{USER_ID}*'):
+            for key in kv.redis_client.scan_iter(pattern):
+                kv.redis_client.delete(key)
+    for directory in (getattr(bar_store, 'directory', None), os.environ.get('CLOSE_ARRAY_DIR')):
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(args, kv):
+    from fake_upstream import FakeProvider
+    import _upstream
+    import _price_service
+    import price
+    import portfolio_kv
+
+    provider = FakeProvider(latency=args.latency / 1000)
+    _upstream.set_provider(provider)
+
+    price_handler = quiet(price.handler)
+    portfolio_handler = quiet(portfolio_kv.handler, get_user_id=lambda self: USER_ID)
+    store = portfolio_kv.handler.store
+    bar_store = _price_service.get_bar_history().store
+
+    def reset_price_caches():
+        _price_service.quote_cache._lru.clear()
+        _price_service.get_close_arrays()._mapped.clear()
+        cleanup(kv, bar_store)
+
+    def reset_document_cache():
+        store._doc_cache.clear()
+
+    price_setup = reset_price_caches if args.cold else None
+    batch_symbols = ','.join(f'{SYMBOL_PREFIX}{i}' for i in range(args.batch))
+    batch_path = '/api/prices?symbols=' + batch_symbols
+
+    results = {}
+    scenarios = [
+        ('quote', lambda: checked(price_handler, 'GET', f'/api/price/{SYMBOL_PREFIX}0')),
+        ('batch-quote', lambda: checked(price_handler, 'GET', batch_path)),
+        ('history', lambda: checked(price_handler, 'GET', f'/api/history/{SYMBOL_PREFIX}1?period=1Y')),
+        ('matrix', lambda: checked(price_handler, 'GET', f'/api/history/matrix?symbols={batch_symbols}&period=1Y')),
+    ]
+    for name, fn in scenarios:
+        results[name] = measure(fn, args.iterations, price_setup)
+        report(name, results[name])
+
+    for size in [int(s) for s in args.sizes.split(',') if s]:
+        # 交易条数多时相应减少次数，整体耗时大致与条数无关
+        iterations = max(5, min(args.iterations, 200_000 // size))
+        document = json.dumps(make_document(size)).encode()
+        checked(portfolio_handler, 'POST', '/api/portfolio/save', document)
+
+        patch_counter = iter(range(size, size + 10 ** 9))
+
+        def patch():
+            op = {'op': 'add_transaction', 'transaction': make_transaction(next(patch_counter))}
+            return checked(portfolio_handler, 'POST', '/api/portfolio/patch', json.dumps({'ops': [op]}).encode())
+
+        scenarios = [
+            ('load', lambda: checked(portfolio_handler, 'GET', '/api/portfolio/load'),
+             reset_document_cache if args.cold else None),
+            ('save', lambda: checked(portfolio_handler, 'POST', '/api/portfolio/save', document), None),
+            ('patch', patch, None),
+        ]
+        for name, fn, setup in scenarios:
+            key = f'{name}@{size}'
+            results[key] = measure(fn, iterations, setup)
+            report(key, results[key])
+
+        call(portfolio_handler, 'DELETE', '/api/portfolio/delete')
+
+    cleanup(kv, bar_store)
+    print(f'\n上游调用 {provider.calls} 次')
+    return results
+
+
+def report(name, result):
+    print(f'{name:<16} {result["ops_per_sec"]:>10.1f} ops/s   p50 {result["p50_ms"]:>9.3f} ms   '
+          f'p99 {result["p99_ms"]:>9.3f} ms   ({result["iterations"]} 次)')
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """返回p50变慢超过阈值的项目"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        delta = result['p50_ms'] - before['p50_ms']
+        if delta > min_delta_ms and result['p50_ms'] > before['p50_ms'] * (1 + threshold):
+            regressions.append((name, before['p50_ms'], result['p50_ms']))
+    return regressions
+
+
+def main():
+    args = parse_args()
+    kv = configure(args)
+    print(f'存储: {os.environ["PORTFOLIO_STORE"]}，模拟上游延迟 {args.latency:g} ms，'
+          f'{"冷缓存" if args.cold else "热缓存"}\n')
+
+    results = run(args, kv)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'store': os.environ['PORTFOLIO_STORE'],
+                'cold': args.cold,
+                'latency_ms': args.latency,
+                'results': results
+            }, f, indent=2)
+        print(f'结果已保存到 {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for name, before, after in regressions:
+            print(f'退化: {name} p50 {before:.3f} ms -> {after:.3f} ms')
+        if regressions:
+            sys.exit(1)
+        print(f'与基线相比没有超过 {args.threshold:.0%} 的退化')
+
+
+if __name__ == '__main__':
+    main()
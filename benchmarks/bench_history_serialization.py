@@ -0,0 +1,69 @@
+"""
+历史数据序列化微基准
+对比 iterrows 逐行转换与整列转换（rows / columnar）的耗时和JSON体积
+
+运行: python benchmarks/bench_history_serialization.py
+"""
+
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from _bar_store import frame_to_columns, frame_to_rows
+
+
+def make_frame(days):
+    """生成确定性的随机游走日线数据"""
+    rng = np.random.default_rng(42)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    index = pd.bdate_range(end='2024-12-31', periods=days, tz='America/New_York', name='Date')
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.002, days)),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 50_000_000, days).astype(float)
+    }, index=index)
+
+
+def iterrows_rows(hist):
+    """旧实现：逐行 float()/int()/strftime"""
+    data = []
+    for date_index, row in hist.iterrows():
+        data.append({
+            'date': date_index.date().strftime('%Y-%m-%d'),
+            'open': float(row['Open']),
+            'high': float(row['High']),
+            'low': float(row['Low']),
+            'close': float(row['Close']),
+            'volume': int(row['Volume'])
+        })
+    return data
+
+
+def bench(label, func, hist, number):
+    seconds = min(timeit.repeat(lambda: json.dumps(func(hist)), number=number, repeat=5)) / number
+    size = len(json.dumps(func(hist)))
+    print(f'  {label:<10} {seconds * 1000:9.2f} ms  {size / 1024:9.1f} KB')
+    return seconds
+
+
+def main():
+    for days in (250, 1500, 5000):
+        hist = make_frame(days)
+        number = max(1, 20000 // days)
+        print(f'{days} bars:')
+        baseline = bench('iterrows', iterrows_rows, hist, number)
+        rows = bench('rows', frame_to_rows, hist, number)
+        columnar = bench('columnar', frame_to_columns, hist, number)
+        print(f'  speedup    rows {baseline / rows:.1f}x, columnar {baseline / columnar:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+历史数据流式输出基准
+对比一次性构造完整响应再 json.dumps 与逐块生成NDJSON行的峰值内存和首字节时间
+
+运行: python benchmarks/bench_history_stream.py [股票数量] [每只股票的交易日数]
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from bench_history_serialization import make_frame
+from _bar_store import ROW_CHUNK, frame_to_rows, iter_rows
+
+
+class Sink:
+    """模拟wfile：只记录写入字节数和第一次写入的时间"""
+
+    def __init__(self):
+        self.size = 0
+        self.first_write = None
+
+    def write(self, data):
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        self.size += len(data)
+
+
+def load_frames(symbols, days):
+    """逐只生成（模拟从日线存储读取）"""
+    for symbol in symbols:
+        yield symbol, make_frame(days)
+
+
+def full_response(symbols, days, sink):
+    data = {symbol: frame_to_rows(frame) for symbol, frame in load_frames(symbols, days)}
+    sink.write(json.dumps({'success': True, 'data': data}).encode())
+
+
+def streamed(symbols, days, sink):
+    buffer = []
+    for symbol, frame in load_frames(symbols, days):
+        buffer.append(json.dumps({'type': 'meta', 'symbol': symbol}))
+        for row in iter_rows(frame):
+            row['type'] = 'bar'
+            row['symbol'] = symbol
+            buffer.append(json.dumps(row))
+            if len(buffer) >= ROW_CHUNK:
+                sink.write(('\n'.join(buffer) + '\n').encode())
+                buffer = []
+    if buffer:
+        sink.write(('\n'.join(buffer) + '\n').encode())
+
+
+def measure(label, func, symbols, days):
+    sink = Sink()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(symbols, days, sink)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'  {label:<10} 峰值内存 {peak / 1e6:8.1f} MB   首字节 {(sink.first_write - start) * 1000:8.1f} ms   '
+          f'总耗时 {total * 1000:8.1f} ms   输出 {sink.size / 1e6:6.1f} MB')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 2520
+    symbols = [f'SYM{i}' for i in range(count)]
+    print(f'{count} 只股票 x {days} 个交易日:')
+    measure('完整JSON', full_response, symbols, days)
+    measure('NDJSON流', streamed, symbols, days)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+MongoDB连接延迟基准
+对比"每个请求新建连接"（旧实现）与"复用模块级连接"（当前实现）
+
+需要环境变量:
+  MONGODB_URI                               测试pymongo
+  MONGODB_DATA_API_URL + MONGODB_API_KEY    测试Atlas Data API
+
+运行: python benchmarks/bench_mongo_connect.py [请求次数]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+
+def report(label, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f'  {label:<28} 首次 {samples[0] * 1000:8.1f} ms   '
+          f'p50 {statistics.median(ordered) * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms')
+
+
+def bench_pymongo(requests):
+    from pymongo import MongoClient
+    from _mongo import get_database
+
+    uri = os.environ['MONGODB_URI']
+    options = dict(serverSelectionTimeoutMS=5000, tlsAllowInvalidCertificates=True, retryWrites=True, w='majority')
+
+    fresh = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client = MongoClient(uri, **options)
+        client.portfolio_tracker.portfolios.find_one({'user_id': 'bench'})
+        fresh.append(time.perf_counter() - start)
+        client.close()
+
+    pooled = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        get_database().portfolios.find_one({'user_id': 'bench'})
+        pooled.append(time.perf_counter() - start)
+
+    print('pymongo findOne:')
+    report('每次新建MongoClient', fresh)
+    report('复用模块级连接池', pooled)
+
+
+def bench_data_api(requests):
+    import portfolio_http
+
+    url = os.environ['MONGODB_DATA_API_URL']
+    payload = json.dumps({
+        'dataSource': 'Cluster0',
+        'database': 'portfolio_tracker',
+        'collection': 'portfolios',
+        'filter': {'user_id': 'bench'}
+    }).encode('utf-8')
+    headers = {'Content-Type': 'application/json', 'api-key': os.environ['MONGODB_API_KEY']}
+
+    fresh = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        req = urllib.request.Request(f'{url}/action/findOne', data=payload, headers=headers, method='POST')
+        with urllib.request.urlopen(req, timeout=10) as response:
+            response.read()
+        fresh.append(time.perf_counter() - start)
+
+    kept = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        portfolio_http.data_api_post('/action/findOne', payload, headers)
+        kept.append(time.perf_counter() - start)
+
+    print('Data API findOne:')
+    report('每次新建urllib连接', fresh)
+    report('保持连接(keep-alive)', kept)
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    if os.environ.get('MONGODB_URI'):
+        bench_pymongo(requests)
+    else:
+        print('未设置 MONGODB_URI，跳过pymongo测试')
+
+    if os.environ.get('MONGODB_DATA_API_URL') and os.environ.get('MONGODB_API_KEY'):
+        bench_data_api(requests)
+    else:
+        print('未设置 MONGODB_DATA_API_URL / MONGODB_API_KEY，跳过Data API测试')
+
+
+if __name__ == '__main__':
+    main()
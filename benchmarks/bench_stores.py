@@ -0,0 +1,106 @@
+"""
+投资组合存储后端基准
+在同一工作负载下对比各后端：整份保存、逐条追加交易、完整读取、只读文档头
+
+默认测试 memory 和 sqlite；设置 REDIS_URL / MONGODB_URI 后同时测试 redis / mongo
+（会写入并删除 user_id 为 bench_store 的数据）
+
+运行: python benchmarks/bench_stores.py [交易条数] [追加次数]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from _portfolio_store import get_store, SQLitePortfolioStore
+
+USER_ID = 'bench_store'
+
+
+def make_transaction(i):
+    day = date(2020, 1, 1) + timedelta(days=i)
+    return {
+        'id': f'tx{i}',
+        'stockSymbol': ('AAPL', 'MSFT', 'NVDA', 'TSLA')[i % 4],
+        'type': 'buy' if i % 3 else 'sell',
+        'shares': 10 + i % 7,
+        'price': 100.0 + i % 50,
+        'totalFee': 1.0,
+        'totalValue': (10 + i % 7) * (100.0 + i % 50),
+        'date': day.isoformat()
+    }
+
+
+def make_document(count):
+    return {
+        'positions': [{'id': 'AAPL', 'stockSymbol': 'AAPL', 'shares': 100}],
+        'cashBalance': 100000,
+        'totalRealizedProfit': 0,
+        'transactionHistory': [make_transaction(i) for i in range(count)]
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def bench(name, store, count, appends):
+    store.delete(USER_ID)
+    doc = make_document(count)
+
+    save_ms = timed(lambda: store.save(USER_ID, doc), 5)
+
+    counter = iter(range(count, count + appends))
+    append_ms = timed(lambda: store.apply_patch(USER_ID, [
+        {'op': 'add_transaction', 'transaction': make_transaction(next(counter))}
+    ]), appends)
+
+    # 每次读取前清空进程内缓存，测量后端本身的读取开销
+    def cold_load():
+        store._doc_cache.clear()
+        store.load(USER_ID)
+
+    load_ms = timed(cold_load, 10)
+    cached_ms = timed(lambda: store.load(USER_ID), 10)
+    head_ms = timed(lambda: store.load_head(USER_ID), 10)
+
+    assert len(store.load(USER_ID)['transactionHistory']) == count + appends
+    store.delete(USER_ID)
+
+    print(f'{name:<8} 整份保存 {save_ms:8.2f}  追加 {append_ms:7.2f}  读取 {load_ms:8.2f}  '
+          f'缓存读取 {cached_ms:6.2f}  文档头 {head_ms:6.2f}  (ms, 中位数)')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    appends = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(f'{count} 条交易记录，追加 {appends} 次')
+
+    bench('memory', get_store('memory'), count, appends)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench('sqlite', SQLitePortfolioStore(os.path.join(tmp, 'portfolio.db')), count, appends)
+
+    if os.environ.get('REDIS_URL'):
+        bench('redis', get_store('redis'), count, appends)
+    else:
+        print('未设置 REDIS_URL，跳过redis')
+
+    if os.environ.get('MONGODB_URI'):
+        bench('mongo', get_store('mongo'), count, appends)
+    else:
+        print('未设置 MONGODB_URI，跳过mongo')
+
+
+if __name__ == '__main__':
+    main()
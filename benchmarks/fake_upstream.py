@@ -0,0 +1,164 @@
+"""
+回放固定日线数据的上游替身（实现基准测试用到的yfinance接口子集: Ticker(...).info / .history、download）
+
+数据来自 benchmarks/fixtures/*.json（可用 --record 从yfinance录制）；股票代码按CRC32固定对应到某个录制文件，
+没有录制文件时按股票代码做种子生成确定的随机游走。回放时日期轴换成截止今天的交易日，
+数值每次运行都相同，增量同步逻辑也能按真实情况工作
+
+录制: python benchmarks/fake_upstream.py --record AAPL MSFT NVDA [天数]
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+
+import pandas as pd
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SYNTHETIC_DAYS = 2520
+MARKET_TZ = 'America/New_York'
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def business_days(count, end=None):
+    """截止end（含）的最近count个工作日"""
+    day = end or date.today()
+    days = []
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    days.reverse()
+    return days
+
+
+def synthetic_record(symbol, count=SYNTHETIC_DAYS):
+    """以股票代码为种子的确定随机游走OHLCV"""
+    rng = random.Random(zlib.crc32(symbol.encode()))
+    price = 20 + rng.random() * 480
+    record = {field: [] for field in FIELDS}
+    for _ in range(count):
+        open_ = price
+        price = max(1.0, price * (1 + rng.gauss(0.0003, 0.02)))
+        record['open'].append(round(open_, 4))
+        record['high'].append(round(max(open_, price) * (1 + rng.random() * 0.01), 4))
+        record['low'].append(round(min(open_, price) * (1 - rng.random() * 0.01), 4))
+        record['close'].append(round(price, 4))
+        record['volume'].append(rng.randint(100_000, 50_000_000))
+    return record
+
+
+def load_fixtures(directory=FIXTURE_DIR):
+    """读取录制的日线，按文件名排序"""
+    if not os.path.isdir(directory):
+        return []
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                fixtures.append(json.load(f))
+    return fixtures
+
+
+class FakeTicker:
+    def __init__(self, provider, symbol):
+        self.provider = provider
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        self.provider.record_call()
+        frame = self.provider.frame(self.symbol)
+        return {
+            'currentPrice': float(frame['Close'].iloc[-1]),
+            'longName': f'{self.symbol} Inc.',
+            'currency': 'USD'
+        }
+
+    def history(self, period=None, start=None, end=None, **kwargs):
+        self.provider.record_call()
+        return self.provider.slice(self.symbol, period, start, end)
+
+
+class FakeProvider:
+    """
+    latency: 每次上游调用的模拟延迟（秒）
+    calls:   累计上游调用次数
+    """
+
+    def __init__(self, latency=0.0, fixture_dir=FIXTURE_DIR):
+        self.latency = latency
+        self.calls = 0
+        self.fixtures = load_fixtures(fixture_dir)
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def frame(self, symbol):
+        """股票代码 -> 截止今天的日线DataFrame（与yfinance一样带美东时区）"""
+        frame = self._frames.get(symbol)
+        if frame is None:
+            if self.fixtures:
+                record = self.fixtures[zlib.crc32(symbol.encode()) % len(self.fixtures)]
+            else:
+                record = synthetic_record(symbol)
+            days = business_days(len(record['close']))
+            frame = pd.DataFrame(
+                {field.capitalize(): record[field] for field in FIELDS},
+                index=pd.DatetimeIndex(pd.to_datetime(days), name='Date').tz_localize(MARKET_TZ)
+            )
+            self._frames[symbol] = frame
+        return frame
+
+    def slice(self, symbol, period=None, start=None, end=None):
+        frame = self.frame(symbol)
+        if period and period.endswith('d'):
+            return frame.iloc[-int(period[:-1]):].copy()
+        if start is not None:
+            frame = frame[frame.index >= pd.Timestamp(start).tz_localize(MARKET_TZ)]
+        if end is not None:
+            frame = frame[frame.index < pd.Timestamp(end).tz_localize(MARKET_TZ)]
+        return frame.copy()
+
+    def Ticker(self, symbol):
+        return FakeTicker(self, symbol)
+
+    def download(self, tickers, period='5d', **kwargs):
+        """批量下载：列为 (symbol, field) 的MultiIndex（同 group_by='ticker'）"""
+        self.record_call()
+        symbols = tickers.split()
+        return pd.concat({symbol: self.slice(symbol, period) for symbol in symbols}, axis=1)
+
+
+def record(symbols, days=SYNTHETIC_DAYS, directory=FIXTURE_DIR):
+    """从yfinance录制日线到 fixtures 目录（只保存数值，回放时重新生成日期轴）"""
+    import yfinance as yf
+
+    os.makedirs(directory, exist_ok=True)
+    start = date.today() - timedelta(days=int(days * 365 / 252) + 10)
+    for symbol in symbols:
+        hist = yf.Ticker(symbol).history(start=start).tail(days)
+        fixture = {field: hist[field.capitalize()].astype(float).round(4).tolist() for field in FIELDS}
+        fixture['volume'] = [int(v) for v in fixture['volume']]
+        with open(os.path.join(directory, f'{symbol}.json'), 'w') as f:
+            json.dump(fixture, f)
+        print(f'{symbol}: {len(hist)} 根日线')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != '--record':
+        print(__doc__)
+        sys.exit(1)
+    args = sys.argv[2:]
+    days = int(args.pop()) if args[-1].isdigit() else SYNTHETIC_DAYS
+    record(args, days)
@@ -11,6 +11,173 @@ class CloudSync {
         this.syncEnabled = true;
         this.lastSyncTime = null;
         this.syncInProgress = false;
+        // 云端文档版本及已同步的交易记录位置，用于增量保存
+        this.version = null;
+        this.syncedTxCount = 0;
+        this.syncedLastTxId = null;
+        // 保存时遇到的云端版本冲突（重新加载后清除）
+        this.conflictVersion = null;
+    }
+
+    /**
+     * 读取上次加载的云端数据及其ETag
+     */
+    getCachedLoad() {
+        try {
+            const cached = JSON.parse(localStorage.getItem('cloudLoadCache') || 'null');
+            return cached && cached.etag && cached.data ? cached : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    /**
+     * 缓存云端数据及ETag，供下次条件请求使用
+     */
+    setCachedLoad(etag, result) {
+        try {
+            if (etag && result.success && result.data) {
+                localStorage.setItem('cloudLoadCache', JSON.stringify({ etag: etag, data: result.data }));
+            } else {
+                localStorage.removeItem('cloudLoadCache');
+            }
+        } catch (error) {
+            // 超出localStorage容量时放弃缓存，下次完整下载
+            localStorage.removeItem('cloudLoadCache');
+        }
+    }
+
+    /**
+     * 记录已与云端一致的数据状态
+     */
+    markSynced(portfolioData, version) {
+        const transactions = (portfolioData && portfolioData.transactionHistory) || [];
+        this.version = (version === undefined) ? null : version;
+        this.syncedTxCount = transactions.length;
+        this.syncedLastTxId = transactions.length > 0 ? transactions[transactions.length - 1].id : null;
+        this.conflictVersion = null;
+    }
+
+    /**
+     * 本地交易记录是否与上次同步的云端副本一致（没有未保存的修改，保存也没有遇到版本冲突）
+     */
+    isInSync(transactions) {
+        if (this.version === null || this.conflictVersion !== null || transactions.length !== this.syncedTxCount) {
+            return false;
+        }
+        return transactions.length === 0 || transactions[transactions.length - 1].id === this.syncedLastTxId;
+    }
+
+    /**
+     * 构建增量保存操作；交易记录不是在已同步部分之后追加时返回null（需要整份保存）
+     */
+    buildPatchOps(portfolioData) {
+        if (this.version === null) {
+            return null;
+        }
+
+        const transactions = portfolioData.transactionHistory || [];
+        if (transactions.length < this.syncedTxCount) {
+            return null;
+        }
+        if (this.syncedTxCount > 0 && transactions[this.syncedTxCount - 1].id !== this.syncedLastTxId) {
+            return null;
+        }
+
+        const ops = Object.keys(portfolioData)
+            .filter(field => field !== 'transactionHistory')
+            .map(field => ({ op: 'set', field: field, value: portfolioData[field] }));
+        transactions.slice(this.syncedTxCount).forEach(transaction => {
+            ops.push({ op: 'add_transaction', transaction: transaction });
+        });
+        return ops;
+    }
+
+    /**
+     * 增量保存到云端（基于当前版本，版本冲突时返回false）
+     */
+    async patchCloud(ops) {
+        const response = await fetch(`${this.apiBaseUrl}/api/portfolio/patch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ base_version: this.version, ops: ops })
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const result = await response.json();
+        if (!result.success && !result.conflict) {
+            throw new Error(result.error || '保存失败');
+        }
+        return result;
+    }
+
+    /**
+     * 整份保存到云端（基于当前版本，云端已被修改时返回冲突而不是覆盖）
+     */
+    async saveWholeDocument(portfolioData) {
+        const response = await fetch(`${this.apiBaseUrl}/api/portfolio/save`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(Object.assign({}, portfolioData, { base_version: this.version }))
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const result = await response.json();
+        if (!result.success && !result.conflict) {
+            throw new Error(result.error || '保存失败');
+        }
+        return result;
+    }
+
+    /**
+     * 保存时发现云端版本已变化：记录冲突并通知页面（cloudsync-conflict 事件），由用户重新加载云端数据
+     */
+    reportConflict(version) {
+        this.conflictVersion = version;
+        console.warn(`云端已更新到版本 ${version}，本次修改未保存`);
+        window.dispatchEvent(new CustomEvent('cloudsync-conflict', { detail: { version: version } }));
+    }
+
+    /**
+     * 获取服务端计算的交易统计（按云端版本缓存）
+     */
+    async loadAnalytics(withPrices = false) {
+        const response = await fetch(`${this.apiBaseUrl}/api/portfolio/analytics?prices=${withPrices ? 1 : 0}`);
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || '获取统计失败');
+        }
+        return result.data;
+    }
+
+    /**
+     * 分页查询云端交易记录
+     * filters: { symbol, type, from, to, sort: 'date' | '-date', limit, cursor }
+     * 返回 { data, next_cursor, total, version }
+     */
+    async queryTransactions(filters = {}) {
+        const params = new URLSearchParams();
+        Object.entries(filters).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== '') {
+                params.set(key, value);
+            }
+        });
+        const response = await fetch(`${this.apiBaseUrl}/api/transactions?${params.toString()}`);
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || '查询交易记录失败');
+        }
+        return result;
     }
 
     /**
@@ -42,21 +209,37 @@ class CloudSync {
 
         try {
             console.log('正在从云端加载数据...');
+            // 带上次的ETag做条件请求，云端未变化时返回304，不重复下载
+            const cached = this.getCachedLoad();
+            const headers = {
+                'Content-Type': 'application/json'
+            };
+            if (cached) {
+                headers['If-None-Match'] = cached.etag;
+            }
+
             const response = await fetch(`${this.apiBaseUrl}/api/portfolio/load`, {
                 method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
+                headers: headers
             });
 
+            if (response.status === 304 && cached) {
+                this.lastSyncTime = new Date();
+                this.markSynced(cached.data, cached.data.version);
+                console.log('✅ 云端数据未变化，使用本地缓存');
+                return cached.data;
+            }
+
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
             const result = await response.json();
+            this.setCachedLoad(response.headers.get('ETag'), result);
 
             if (result.success && result.data) {
                 this.lastSyncTime = new Date();
+                this.markSynced(result.data, result.data.version);
                 console.log('✅ 云端数据加载成功', result.data);
                 return result.data;
             } else if (result.success && result.data === null) {
@@ -90,28 +273,32 @@ class CloudSync {
         this.syncInProgress = true;
 
         try {
-            console.log('正在保存到云端...', portfolioData);
-            const response = await fetch(`${this.apiBaseUrl}/api/portfolio/save`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify(portfolioData)
-            });
-
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+            // 只追加了交易记录时发送增量补丁，保存开销不随历史增长
+            const ops = this.buildPatchOps(portfolioData);
+            let result = null;
+            if (ops) {
+                try {
+                    result = await this.patchCloud(ops);
+                } catch (error) {
+                    console.warn('增量保存失败，改为整份保存:', error);
+                }
             }
 
-            const result = await response.json();
+            if (!result) {
+                console.log('正在保存到云端...', portfolioData);
+                result = await this.saveWholeDocument(portfolioData);
+            }
 
-            if (result.success) {
-                this.lastSyncTime = new Date();
-                console.log('✅ 数据已保存到云端');
-                return true;
-            } else {
-                throw new Error(result.error || '保存失败');
+            // 云端已被其他标签页、设备或导入修改：不覆盖，交给页面提示重新加载
+            if (result.conflict) {
+                this.reportConflict(result.version);
+                return false;
             }
+
+            this.lastSyncTime = new Date();
+            this.markSynced(portfolioData, result.version);
+            console.log(ops ? '✅ 数据已增量保存到云端' : '✅ 数据已保存到云端');
+            return true;
         } catch (error) {
             console.error('❌ 云端数据保存失败:', error);
             // 不抛出错误，允许本地继续使用
@@ -140,6 +327,7 @@ class CloudSync {
             const result = await response.json();
 
             if (result.success) {
+                this.markSynced(null, null);
                 console.log('✅ 云端数据已删除');
                 return true;
             } else {